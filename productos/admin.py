@@ -1,15 +1,29 @@
 # ======================================================
 # Imports necesarios para el admin de Django
 # ======================================================
+import datetime
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
 
 # Importación de modelos y formularios personalizados
 from .models import (
     Producto, Categoria, Carrito, CarritoProducto, 
-    ProductoImagen, Usuario, Pedido, PedidoProducto
+    ProductoImagen, Usuario, Pedido, PedidoProducto, VentaDiaria, centavos, precio_con_descuento_sql
 )
 from .forms import UsuarioCreationForm
+from . import ventas
+
+# ======================================================
+# Los listados (changelists) se arman con una sola consulta:
+# las relaciones que muestran las columnas van en select_related
+# y los conteos / totales se calculan en SQL con annotate
+# (así además se puede ordenar por ellos)
+# ======================================================
 
 # ======================================================
 # Admin de Categorías
@@ -20,9 +34,13 @@ class CategoriaAdmin(admin.ModelAdmin):
     list_display = ("nombre", "cantidad_productos")
     search_fields = ("nombre",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_productos=Count("productos"))
+
     def cantidad_productos(self, obj):
-        return obj.productos.count()
+        return obj.num_productos
     cantidad_productos.short_description = "Cantidad de productos"
+    cantidad_productos.admin_order_field = "num_productos"
 
 admin.site.register(Categoria, CategoriaAdmin)
 
@@ -41,17 +59,19 @@ class ProductoImagenInline(admin.TabularInline):
 # - Permite búsqueda, filtros y carga de imágenes adicionales
 # ======================================================
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ("nombre", "precio", "stock", "categoria")
-    search_fields = ("nombre", "descripcion")
+    list_display = ("nombre", "precio", "precio_final", "stock", "categoria")
+    search_fields = ("nombre", "descripcion", "sku")
+    readonly_fields = ("precio_final",)
     list_filter = ("categoria", "stock")
+    list_select_related = ("categoria",)
     inlines = [ProductoImagenInline]
 
     fieldsets = (
         ("Información básica", {
-            "fields": ("nombre", "descripcion", "categoria")
+            "fields": ("nombre", "sku", "descripcion", "categoria")
         }),
         ("Precio y stock", {
-            "fields": ("precio", "descuento", "stock")
+            "fields": ("precio", "descuento", "precio_final", "stock")
         }),
         ("Imagen principal", {
             "fields": ("imagen",)
@@ -75,6 +95,9 @@ class CarritoProductoInline(admin.TabularInline):
     readonly_fields = ("subtotal",)
     fields = ("producto", "cantidad", "subtotal")
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("producto")
+
     def subtotal(self, obj):
         return obj.subtotal()
     subtotal.short_description = "Subtotal"
@@ -83,15 +106,27 @@ class CarritoAdmin(admin.ModelAdmin):
     list_display = ("usuario", "total_carrito", "num_productos", "creado")
     search_fields = ("usuario__username", "usuario__email")
     list_filter = ("creado",)
+    list_select_related = ("usuario",)
     inlines = [CarritoProductoInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            cantidad_lineas=Count("carritoproducto"),
+            importe_total=Sum(
+                F("carritoproducto__cantidad") * precio_con_descuento_sql("carritoproducto__producto__"),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
     def total_carrito(self, obj):
-        return obj.total()
+        return centavos(obj.importe_total)
     total_carrito.short_description = "Total"
+    total_carrito.admin_order_field = "importe_total"
 
     def num_productos(self, obj):
-        return obj.carritoproducto_set.count()
+        return obj.cantidad_lineas
     num_productos.short_description = "N° productos"
+    num_productos.admin_order_field = "cantidad_lineas"
 
 admin.site.register(Carrito, CarritoAdmin)
 
@@ -101,17 +136,34 @@ admin.site.register(Carrito, CarritoAdmin)
 # - Muestra cantidad, subtotal y usuario dueño del carrito
 # ======================================================
 class CarritoProductoAdmin(admin.ModelAdmin):
-    list_display = ("producto", "cantidad", "carrito", "usuario_del_carrito", "subtotal")
+    list_display = ("producto", "cantidad", "carrito_de", "usuario_del_carrito", "subtotal")
     search_fields = ("producto__nombre", "carrito__usuario__username")
     list_filter = ("carrito__usuario",)
 
+    def get_queryset(self, request):
+        # con_importes(): producto en el mismo JOIN e importe calculado en SQL
+        lineas_del_carrito = CarritoProducto.objects.filter(carrito=OuterRef("carrito")).order_by().values(
+            "carrito"
+        ).annotate(n=Count("id")).values("n")
+        return super().get_queryset(request).con_importes().select_related("carrito__usuario").annotate(
+            lineas_carrito=Subquery(lineas_del_carrito),
+        )
+
+    def carrito_de(self, obj):
+        # Mismo texto que Carrito.__str__, sin contar las líneas fila por fila
+        return f"Carrito de {obj.carrito.usuario.username} ({obj.lineas_carrito} productos)"
+    carrito_de.short_description = "Carrito"
+    carrito_de.admin_order_field = "carrito"
+
     def usuario_del_carrito(self, obj):
         return obj.carrito.usuario.username
     usuario_del_carrito.short_description = "Usuario"
+    usuario_del_carrito.admin_order_field = "carrito__usuario__username"
 
     def subtotal(self, obj):
-        return obj.subtotal()
+        return centavos(obj.importe)
     subtotal.short_description = "Subtotal"
+    subtotal.admin_order_field = "importe"
 
 admin.site.register(CarritoProducto, CarritoProductoAdmin)
 
@@ -134,6 +186,7 @@ class PedidoAdmin(admin.ModelAdmin):
     list_display = ("numero_pedido_formateado", "usuario", "fecha", "total", "pagado")
     search_fields = ("usuario__username", "usuario__email")
     list_filter = ("fecha", "pagado")
+    list_select_related = ("usuario",)
     inlines = [PedidoProductoInline]
 
     readonly_fields = ("numero_pedido_formateado", "total")
@@ -149,17 +202,71 @@ class PedidoProductoAdmin(admin.ModelAdmin):
     list_display = ("producto", "cantidad", "precio_unitario", "pedido", "usuario_del_pedido", "subtotal")
     search_fields = ("producto__nombre", "pedido__usuario__username")
     list_filter = ("pedido__usuario",)
+    list_select_related = ("producto", "pedido__usuario")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            importe=ExpressionWrapper(
+                F("precio_unitario") * F("cantidad"),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
 
     def usuario_del_pedido(self, obj):
         return obj.pedido.usuario.username
     usuario_del_pedido.short_description = "Usuario"
+    usuario_del_pedido.admin_order_field = "pedido__usuario__username"
 
     def subtotal(self, obj):
-        return obj.subtotal()
+        return centavos(obj.importe)
     subtotal.short_description = "Subtotal"
+    subtotal.admin_order_field = "importe"
 
 admin.site.register(PedidoProducto, PedidoProductoAdmin)
 
+# ======================================================
+# Reporte de ventas
+# - El listado de "Ventas diarias" muestra el reporte del período
+#   (?desde=AAAA-MM-DD&hasta=AAAA-MM-DD, por defecto 30 días)
+# - Lee solo las tablas de agregados (ver ventas.py), nunca pedidos
+# ======================================================
+def _fecha_parametro(request, nombre, por_defecto):
+    try:
+        return datetime.date.fromisoformat(request.GET.get(nombre, ''))
+    except ValueError:
+        return por_defecto
+
+
+class VentaDiariaAdmin(admin.ModelAdmin):
+    DIAS_POR_DEFECTO = 30
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        hasta = _fecha_parametro(request, "hasta", timezone.localdate())
+        desde = _fecha_parametro(request, "desde", hasta - datetime.timedelta(days=self.DIAS_POR_DEFECTO - 1))
+        contexto = {
+            **self.admin_site.each_context(request),
+            "title": "Reporte de ventas",
+            "opts": self.model._meta,
+            "desde": desde,
+            "hasta": hasta,
+            **ventas.resumen(desde, hasta),
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, "admin/productos/reporte_ventas.html", contexto)
+
+admin.site.register(VentaDiaria, VentaDiariaAdmin)
+
 # ======================================================
 # Admin personalizado de Usuario
 # - Usa un formulario custom para creación
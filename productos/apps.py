@@ -10,3 +10,7 @@ class ProductosConfig(AppConfig):
 
     # Nombre de la aplicación dentro del proyecto Django
     name = 'productos'
+
+    def ready(self):
+        # Registra los receivers de señales (índice de búsqueda, etc.)
+        from . import signals  # noqa: F401
@@ -0,0 +1,196 @@
+# ======================================================
+# Entrega de archivos: imágenes de productos (MEDIA) y facturas PDF
+# - Reemplaza a static() de Django, que solo sirve con DEBUG, no manda
+#   validadores ni soporta Range
+# - ETag y Last-Modified salen del tamaño y la fecha del archivo (sin
+#   leerlo): If-None-Match / If-Modified-Since responden 304
+# - Range de un tramo (bytes=inicio-fin, bytes=-N): 206 con
+#   Content-Range; el cuerpo se lee por bloques, nunca entero
+# - Cache-Control: las derivadas van direccionadas por contenido (ver
+#   imagenes.py) y son inmutables; el resto dura MEDIA_MAX_AGE; las
+#   facturas son privadas y se revalidan siempre (se pueden regenerar)
+# - Facturas: solo para el dueño del pedido (o staff); el resto recibe
+#   404, así los números de pedido correlativos no sirven para listarlas
+# - MEDIA_OFFLOAD: el servidor de adelante manda los bytes y resuelve
+#   el Range; el worker de Python solo arma los headers
+#     'nginx'    -> X-Accel-Redirect: MEDIA_OFFLOAD_PREFIJO + media/<ruta>
+#                   o facturas/<ruta>, ej:
+#                   location /protegido/media/ { internal; alias /app/media/; }
+#                   location /protegido/facturas/ { internal; alias /app/static/media/pedidos/; }
+#     'sendfile' -> X-Sendfile con la ruta absoluta (Apache mod_xsendfile)
+# ======================================================
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from . import facturas
+from .imagenes import DIRECTORIO as DIRECTORIO_DERIVADAS
+from .models import Pedido
+
+UN_ANIO = 365 * 24 * 3600
+BLOQUE = 64 * 1024
+
+# <carpeta>/derivadas/<hash de 20>/<variante>.<ext>
+_DERIVADA = re.compile(rf'(?:^|/){DIRECTORIO_DERIVADAS}/[0-9a-f]{{20}}/')
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+_FACTURA = re.compile(r'^pedido_(\d+)\.pdf$')
+
+
+class RangoInsatisfacible(ValueError):
+    """El tramo pedido empieza después del final del archivo (416)."""
+
+
+def etag(estado):
+    return f'"{estado.st_size:x}-{estado.st_mtime_ns:x}"'
+
+
+def rango(cabecera, tamano):
+    """
+    (inicio, fin) inclusive pedido en el header Range, o None si se manda el
+    archivo entero (header inválido o varios tramos, que no se soportan).
+    """
+    encontrado = _RANGO.match(cabecera.strip())
+    if not encontrado or not tamano:
+        return None
+    desde, hasta = encontrado.groups()
+    if not desde:
+        if not hasta:
+            return None
+        # Sufijo: los últimos N bytes
+        if int(hasta) == 0:
+            raise RangoInsatisfacible(cabecera)
+        return max(0, tamano - int(hasta)), tamano - 1
+    inicio = int(desde)
+    if hasta and int(hasta) < inicio:
+        return None
+    if inicio >= tamano:
+        raise RangoInsatisfacible(cabecera)
+    return inicio, min(int(hasta), tamano - 1) if hasta else tamano - 1
+
+
+def _if_range_coincide(request, validador, modificado):
+    """Sin If-Range el Range vale siempre; con If-Range, solo si el archivo no cambió."""
+    condicion = request.headers.get('If-Range')
+    if not condicion:
+        return True
+    if condicion.startswith('"'):
+        return condicion == validador
+    return parse_http_date_safe(condicion) == int(modificado)
+
+
+def _tramo(archivo, inicio, largo):
+    try:
+        archivo.seek(inicio)
+        while largo > 0:
+            datos = archivo.read(min(BLOQUE, largo))
+            if not datos:
+                break
+            largo -= len(datos)
+            yield datos
+    finally:
+        archivo.close()
+
+
+def servir(request, raiz, ruta, cache_control, ubicacion):
+    """
+    Respuesta para el archivo `ruta` dentro de `raiz`. `ubicacion` es la
+    carpeta interna del servidor de adelante cuando hay MEDIA_OFFLOAD.
+    """
+    try:
+        completa = safe_join(raiz, ruta)
+        estado = os.stat(completa)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404("Archivo inexistente")
+    if not stat.S_ISREG(estado.st_mode):
+        raise Http404("Archivo inexistente")
+
+    validador = etag(estado)
+    tipo, codificacion = mimetypes.guess_type(completa)
+    cabeceras = {
+        'Content-Type': tipo or 'application/octet-stream',
+        'ETag': validador,
+        'Last-Modified': http_date(estado.st_mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+    if codificacion:
+        cabeceras['Content-Encoding'] = codificacion
+
+    # 304 / 412 sin abrir el archivo
+    base = HttpResponse(headers=cabeceras)
+    condicional = get_conditional_response(request, etag=validador, last_modified=int(estado.st_mtime), response=base)
+    if condicional is not base:
+        return condicional
+
+    offload = getattr(settings, 'MEDIA_OFFLOAD', '')
+    if offload == 'nginx':
+        base['X-Accel-Redirect'] = f"{settings.MEDIA_OFFLOAD_PREFIJO}{ubicacion}/{quote(ruta)}"
+        return base
+    if offload == 'sendfile':
+        base['X-Sendfile'] = completa
+        return base
+
+    tamano = estado.st_size
+    tramo = None
+    if 'Range' in request.headers and _if_range_coincide(request, validador, estado.st_mtime):
+        try:
+            tramo = rango(request.headers['Range'], tamano)
+        except RangoInsatisfacible:
+            respuesta = HttpResponse(status=416, headers=cabeceras)
+            respuesta['Content-Range'] = f"bytes */{tamano}"
+            return respuesta
+
+    inicio, fin = tramo or (0, tamano - 1)
+    if request.method == 'HEAD':
+        respuesta = HttpResponse(status=206 if tramo else 200, headers=cabeceras)
+    elif tramo:
+        respuesta = StreamingHttpResponse(
+            _tramo(open(completa, 'rb'), inicio, fin - inicio + 1), status=206, headers=cabeceras,
+        )
+    else:
+        respuesta = FileResponse(open(completa, 'rb'), headers=cabeceras)
+    if tramo:
+        respuesta['Content-Range'] = f"bytes {inicio}-{fin}/{tamano}"
+    respuesta['Content-Length'] = str(fin - inicio + 1 if tamano else 0)
+    return respuesta
+
+
+# ======================================================
+# Vistas
+# ======================================================
+@require_safe
+def media(request, ruta):
+    if _DERIVADA.search(ruta):
+        cache_control = f"public, max-age={UN_ANIO}, immutable"
+    else:
+        cache_control = f"public, max-age={settings.MEDIA_MAX_AGE}"
+    return servir(request, settings.MEDIA_ROOT, ruta, cache_control, 'media')
+
+
+def _puede_ver_factura(usuario, ruta):
+    encontrado = _FACTURA.match(ruta)
+    if not encontrado:
+        return False
+    if usuario.is_staff:
+        return True
+    return Pedido.objects.filter(numero_pedido=int(encontrado.group(1)), usuario=usuario).exists()
+
+
+@login_required
+@require_safe
+def factura(request, ruta):
+    # Antes de servir() y del offload: el servidor de adelante no revisa permisos
+    if not _puede_ver_factura(request.user, ruta):
+        raise Http404("Archivo inexistente")
+    return servir(request, os.path.abspath(facturas.directorio_facturas()), ruta, 'private, no-cache', 'facturas')
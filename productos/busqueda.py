@@ -0,0 +1,223 @@
+# ======================================================
+# Búsqueda de productos con índice invertido
+# - SQLite: tabla virtual FTS5
+# - PostgreSQL: columna tsvector con índice GIN
+# - Otros motores (o índice ausente): icontains como respaldo
+# ======================================================
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import ExpressionWrapper, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+TABLA_INDICE = 'productos_busqueda'
+
+# Palabras vacías en español que no aportan a la búsqueda
+STOPWORDS = frozenset("""
+a al algo ante con contra de del desde donde e el ella en entre era es esa ese
+eso esta este esto la las le les lo los mas mi muy no o para pero por que se
+sin sobre su sus te tu un una uno unos unas y ya
+""".split())
+
+_RE_TOKEN = re.compile(r'[a-z0-9]+')
+
+# Cache por alias de conexión: ¿existe la tabla del índice?
+_indice_disponible = {}
+
+
+# ======================================================
+# Normalización y tokenización
+# ======================================================
+def normalizar(texto):
+    """Pasa a minúsculas y quita tildes/diéresis ("Pantalón" -> "pantalon")."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def raiz(palabra):
+    """Stemming liviano del plural en español (monitores -> monitor, sillas -> silla)."""
+    if len(palabra) > 4 and palabra.endswith('ces'):
+        return palabra[:-3] + 'z'
+    if len(palabra) > 4 and palabra.endswith('es') and palabra[-3] in 'lrndj':
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith('s') and not palabra.endswith('ss'):
+        return palabra[:-1]
+    return palabra
+
+
+def tokenizar(texto):
+    """Devuelve la lista de términos indexables de un texto."""
+    return [raiz(t) for t in _RE_TOKEN.findall(normalizar(texto)) if t not in STOPWORDS]
+
+
+def documento(texto):
+    return ' '.join(tokenizar(texto))
+
+
+# ======================================================
+# Mantenimiento del índice
+# ======================================================
+def soporta_indice(connection):
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def indice_disponible(using='default'):
+    if using not in _indice_disponible:
+        connection = connections[using]
+        _indice_disponible[using] = (
+            soporta_indice(connection)
+            and TABLA_INDICE in connection.introspection.table_names()
+        )
+    return _indice_disponible[using]
+
+
+def crear_indice(schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLA_INDICE} USING fts5("
+            f"nombre, descripcion, tokenize='unicode61 remove_diacritics 2')"
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE TABLE {TABLA_INDICE} ("
+            f"producto_id bigint PRIMARY KEY REFERENCES productos(id) ON DELETE CASCADE, "
+            f"documento tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX {TABLA_INDICE}_gin ON {TABLA_INDICE} USING GIN (documento)"
+        )
+    _indice_disponible.pop(connection.alias, None)
+
+
+def eliminar_indice(schema_editor):
+    if soporta_indice(schema_editor.connection):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA_INDICE}")
+    _indice_disponible.pop(schema_editor.connection.alias, None)
+
+
+def _filas(productos):
+    return [(p.id, documento(p.nombre), documento(p.descripcion)) for p in productos]
+
+
+def _escribir(cursor, vendor, filas):
+    if vendor == 'sqlite':
+        cursor.executemany(f"DELETE FROM {TABLA_INDICE} WHERE rowid = %s", [(f[0],) for f in filas])
+        cursor.executemany(
+            f"INSERT INTO {TABLA_INDICE} (rowid, nombre, descripcion) VALUES (%s, %s, %s)", filas
+        )
+    else:
+        cursor.executemany(
+            f"INSERT INTO {TABLA_INDICE} (producto_id, documento) VALUES (%s, "
+            f"setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')) "
+            f"ON CONFLICT (producto_id) DO UPDATE SET documento = EXCLUDED.documento",
+            filas,
+        )
+
+
+def indexar(productos, using='default'):
+    """Agrega o actualiza en el índice los productos recibidos."""
+    if not indice_disponible(using):
+        return
+    filas = _filas(productos)
+    if filas:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            _escribir(cursor, connection.vendor, filas)
+
+
+def desindexar(producto_ids, using='default'):
+    if not indice_disponible(using):
+        return
+    columna = 'rowid' if connections[using].vendor == 'sqlite' else 'producto_id'
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {TABLA_INDICE} WHERE {columna} = %s", [(pk,) for pk in producto_ids]
+        )
+
+
+def reconstruir_indice(modelo=None, using='default', lote=2000):
+    """
+    Vacía y vuelve a poblar el índice completo en lotes.
+    Acepta el modelo histórico para poder usarse desde migraciones.
+    Devuelve la cantidad de productos indexados.
+    """
+    if modelo is None:
+        from .models import Producto as modelo
+    if not indice_disponible(using):
+        return 0
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_INDICE}")
+    total = 0
+    productos = modelo.objects.using(using).only('id', 'nombre', 'descripcion').order_by('id')
+    lote_actual = []
+    for producto in productos.iterator(chunk_size=lote):
+        lote_actual.append(producto)
+        if len(lote_actual) >= lote:
+            indexar(lote_actual, using)
+            total += len(lote_actual)
+            lote_actual = []
+    indexar(lote_actual, using)
+    return total + len(lote_actual)
+
+
+# ======================================================
+# Consulta
+# ======================================================
+def _consulta_fts(terminos, vendor, todos=True):
+    """
+    Arma la expresión de búsqueda; el último término se busca como prefijo.
+    Con todos=False alcanza con que aparezca cualquiera de los términos.
+    """
+    if vendor == 'sqlite':
+        partes = [f'"{t}"' for t in terminos]
+        partes[-1] += '*'
+        return (' ' if todos else ' OR ').join(partes)
+    partes = list(terminos)
+    partes[-1] += ':*'
+    return (' & ' if todos else ' | ').join(partes)
+
+
+def buscar_productos(productos, texto, todos=True):
+    """
+    Filtra el queryset de productos por el texto buscado.
+    Anota 'relevancia' (mayor es mejor) cuando se usa el índice.
+    Con todos=False devuelve los que tengan cualquiera de los términos.
+    """
+    using = productos.db
+    terminos = tokenizar(texto)
+    if not terminos or not indice_disponible(using):
+        if not todos and terminos:
+            filtro = Q()
+            for termino in terminos:
+                filtro |= Q(nombre__icontains=termino) | Q(descripcion__icontains=termino)
+            return productos.filter(filtro)
+        return productos.filter(Q(nombre__icontains=texto) | Q(descripcion__icontains=texto))
+
+    # Se une la tabla del índice en la misma consulta (en vez de IN + subconsulta
+    # correlacionada) para recorrer el índice una sola vez y rankear en el mismo paso.
+    vendor = connections[using].vendor
+    consulta = _consulta_fts(terminos, vendor, todos)
+    tabla = productos.model._meta.db_table
+    if vendor == 'sqlite':
+        productos = productos.extra(
+            tables=[TABLA_INDICE],
+            where=[f"{TABLA_INDICE}.rowid = {tabla}.id", f"{TABLA_INDICE} MATCH %s"],
+            params=[consulta],
+        )
+        relevancia = RawSQL(f"-bm25({TABLA_INDICE}, 10.0, 1.0)", ())
+    else:
+        productos = productos.extra(
+            tables=[TABLA_INDICE],
+            where=[
+                f"{TABLA_INDICE}.producto_id = {tabla}.id",
+                f"{TABLA_INDICE}.documento @@ to_tsquery('simple', %s)",
+            ],
+            params=[consulta],
+        )
+        relevancia = RawSQL(f"ts_rank({TABLA_INDICE}.documento, to_tsquery('simple', %s))", (consulta,))
+    # Anotación (no extra select) para poder filtrar/paginar por relevancia
+    productos = productos.annotate(relevancia=ExpressionWrapper(relevancia, output_field=FloatField()))
+    return productos.order_by('-relevancia', 'id')
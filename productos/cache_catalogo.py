@@ -0,0 +1,137 @@
+# ======================================================
+# Caché del catálogo
+# - Fragmentos HTML de las tarjetas de producto y lista de categorías
+# - Las claves llevan una "versión del catálogo" que las señales
+#   incrementan al guardar/borrar productos, categorías o imágenes:
+#   no hace falta borrar claves, las viejas vencen solas
+# - Las escrituras en lote (update, bulk_update, bulk_create) no
+#   disparan señales: quien las hace llama a invalidar(). Por las
+#   dudas la clave de cada tarjeta lleva también stock, precio final
+#   y hash de la imagen
+# - Contadores de aciertos / fallos (comando `estadisticas_cache`)
+# Backend configurable con CATALOGO_CACHE (alias de CACHES)
+# ======================================================
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CLAVE_VERSION = 'catalogo:version'
+CLAVE_ACIERTOS = 'catalogo:aciertos'
+CLAVE_FALLOS = 'catalogo:fallos'
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOGO_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 3600)
+
+
+def version():
+    cache = _cache()
+    actual = cache.get(CLAVE_VERSION)
+    if actual is None:
+        # Si la versión se perdió (reinicio, desalojo) se arranca de un valor
+        # que no puede coincidir con uno anterior
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+        actual = cache.get(CLAVE_VERSION)
+    return actual
+
+
+def _incrementar_version():
+    cache = _cache()
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+
+
+def invalidar(using='default'):
+    """
+    Cambia la versión del catálogo. Se hace en el momento (lo ve la propia
+    transacción) y otra vez al confirmar, para que ninguna request que haya
+    leído datos viejos mientras tanto los deje cacheados con la versión nueva.
+    """
+    _incrementar_version()
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(_incrementar_version, using=using)
+
+
+def _contar(aciertos, fallos):
+    cache = _cache()
+    for clave, cantidad in ((CLAVE_ACIERTOS, aciertos), (CLAVE_FALLOS, fallos)):
+        if cantidad:
+            try:
+                cache.incr(clave, cantidad)
+            except ValueError:
+                if not cache.add(clave, cantidad, timeout=None):
+                    cache.incr(clave, cantidad)
+
+
+def estadisticas():
+    valores = _cache().get_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+    aciertos, fallos = valores.get(CLAVE_ACIERTOS, 0), valores.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': aciertos / total if total else 0.0,
+    }
+
+
+def reiniciar_estadisticas():
+    _cache().delete_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+
+
+def categorias():
+    """Categorías como dicts {'id', 'nombre'} (una consulta por versión del catálogo)."""
+    from .models import Categoria
+
+    cache = _cache()
+    clave = f'catalogo:{version()}:categorias'
+    valor = cache.get(clave)
+    if valor is None:
+        _contar(0, 1)
+        valor = list(Categoria.objects.order_by('id').values('id', 'nombre'))
+        cache.set(clave, valor, _timeout())
+    else:
+        _contar(1, 0)
+    return valor
+
+
+def _clave_tarjeta(version_catalogo, producto):
+    # Stock, precio e imagen van en la clave: los pedidos descuentan stock con
+    # UPDATE y un update() / bulk_update() de precio o imagen tampoco dispara señales
+    return (
+        f'catalogo:{version_catalogo}:tarjeta:{producto.pk}:{producto.stock}'
+        f':{producto.precio_final}:{producto.imagen_hash}'
+    )
+
+
+def tarjetas(productos):
+    """
+    HTML de la tarjeta de cada producto, en el mismo orden. Lee todas las
+    claves en una sola operación y renderiza (y guarda) solo las que faltan.
+    """
+    cache = _cache()
+    version_catalogo = version()
+    claves = [_clave_tarjeta(version_catalogo, p) for p in productos]
+    encontradas = cache.get_many(claves) if claves else {}
+
+    nuevas = {}
+    resultado = []
+    for clave, producto in zip(claves, productos):
+        html = encontradas.get(clave)
+        if html is None:
+            html = render_to_string('productos/tarjeta_producto.html', {'producto': producto})
+            nuevas[clave] = html
+        resultado.append(mark_safe(html))
+    if nuevas:
+        cache.set_many(nuevas, _timeout())
+    _contar(len(claves) - len(nuevas), len(nuevas))
+    return resultado
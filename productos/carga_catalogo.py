@@ -0,0 +1,186 @@
+# ======================================================
+# Importación / exportación masiva del catálogo
+# - Formatos: CSV (con encabezado) o JSONL (un objeto por línea)
+#   columnas: sku, nombre, descripcion, precio, descuento, stock, categoria
+# - Se lee y escribe en streaming: la memoria no crece con el archivo
+# - Upsert por `sku` en lotes con bulk_create(update_conflicts=True);
+#   las categorías se resuelven por nombre con un mapa en memoria
+# - bulk_create no dispara señales: cada lote se indexa para la
+#   búsqueda y al final se invalida la caché del catálogo (los
+#   similares se recalculan aparte, ver comando `importar_catalogo`)
+# ======================================================
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import busqueda, cache_catalogo
+from .models import Categoria, Producto
+
+COLUMNAS = ('sku', 'nombre', 'descripcion', 'precio', 'descuento', 'stock', 'categoria')
+FORMATOS = ('csv', 'jsonl')
+
+CAMPOS_ACTUALIZADOS = ['nombre', 'descripcion', 'precio', 'descuento', 'stock', 'categoria']
+
+
+class FilaInvalida(Exception):
+    pass
+
+
+def formato_de(nombre_archivo, formato=None):
+    """Formato pedido o, si no se indica, el de la extensión del archivo."""
+    formato = formato or nombre_archivo.rsplit('.', 1)[-1].lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato!r} (usar {', '.join(FORMATOS)})")
+    return formato
+
+
+# ======================================================
+# Lectura
+# ======================================================
+def leer_filas(archivo, formato):
+    """Genera (número de línea, dict) desde un archivo de texto abierto."""
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila
+        return
+    for numero, linea in enumerate(archivo, start=1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            yield numero, None
+            continue
+        yield numero, fila
+
+
+def normalizar(fila):
+    """Valida una fila leída y la devuelve con tipos de Python. Lanza FilaInvalida."""
+    if not isinstance(fila, dict):
+        raise FilaInvalida("no es un objeto")
+    sku = str(fila.get('sku') or '').strip()
+    nombre = str(fila.get('nombre') or '').strip()
+    if not sku:
+        raise FilaInvalida("falta el sku")
+    if len(sku) > 64:
+        raise FilaInvalida("sku de más de 64 caracteres")
+    if not nombre:
+        raise FilaInvalida("falta el nombre")
+    try:
+        precio = Decimal(str(fila.get('precio', '')).strip()).quantize(Decimal('0.01'))
+        if not precio.is_finite():
+            # quantize() deja pasar NaN, que después rompe la comparación de rango
+            raise InvalidOperation(precio)
+        descuento = int(fila.get('descuento') or 0)
+        stock = int(fila.get('stock') or 0)
+    except (InvalidOperation, TypeError, ValueError):
+        raise FilaInvalida("precio, descuento o stock no numérico")
+    if precio < 0 or precio >= Decimal('1e8') or not 0 <= descuento <= 100 or stock < 0:
+        raise FilaInvalida("precio, descuento o stock fuera de rango")
+    return {
+        'sku': sku,
+        'nombre': nombre[:200],
+        'descripcion': str(fila.get('descripcion') or ''),
+        'precio': precio,
+        'descuento': descuento,
+        'stock': stock,
+        'categoria': str(fila.get('categoria') or '').strip()[:100],
+    }
+
+
+# ======================================================
+# Importación
+# ======================================================
+class MapaCategorias:
+    """nombre -> id; crea en lote las categorías que faltan."""
+
+    def __init__(self):
+        self.ids = dict(Categoria.objects.values_list('nombre', 'id'))
+
+    def resolver(self, nombres):
+        faltan = {n for n in nombres if n and n not in self.ids}
+        if faltan:
+            Categoria.objects.bulk_create([Categoria(nombre=n) for n in faltan], ignore_conflicts=True)
+            self.ids.update(Categoria.objects.filter(nombre__in=faltan).values_list('nombre', 'id'))
+        return self.ids
+
+
+def _guardar_lote(filas, categorias):
+    # Si el mismo sku viene dos veces en el lote queda la última
+    # (un upsert no puede tocar la misma fila dos veces)
+    filas = list({f['sku']: f for f in filas}.values())
+    ids_categorias = categorias.resolver({f['categoria'] for f in filas})
+    productos = [
+        Producto(
+            sku=f['sku'], nombre=f['nombre'], descripcion=f['descripcion'], precio=f['precio'],
+            descuento=f['descuento'], stock=f['stock'], categoria_id=ids_categorias.get(f['categoria']),
+        )
+        for f in filas
+    ]
+    with transaction.atomic():
+        Producto.objects.bulk_create(
+            productos, update_conflicts=True, unique_fields=['sku'], update_fields=CAMPOS_ACTUALIZADOS,
+        )
+        busqueda.indexar(
+            Producto.objects.filter(sku__in=[f['sku'] for f in filas]).only('id', 'nombre', 'descripcion')
+        )
+    return len(filas)
+
+
+def importar(filas, lote=1000, progreso=None, errores=None):
+    """
+    Upsert de las filas (iterable de (número, dict)) en lotes de `lote`.
+    Las inválidas se saltean y se informan con errores(número, motivo).
+    Devuelve (filas guardadas, filas inválidas).
+    """
+    categorias = MapaCategorias()
+    guardadas = invalidas = 0
+    pendientes = []
+    for numero, fila in filas:
+        try:
+            pendientes.append(normalizar(fila))
+        except FilaInvalida as e:
+            invalidas += 1
+            if errores:
+                errores(numero, str(e))
+            continue
+        if len(pendientes) >= lote:
+            guardadas += _guardar_lote(pendientes, categorias)
+            pendientes = []
+            if progreso:
+                progreso(guardadas)
+    if pendientes:
+        guardadas += _guardar_lote(pendientes, categorias)
+        if progreso:
+            progreso(guardadas)
+    if guardadas:
+        cache_catalogo.invalidar()
+    return guardadas, invalidas
+
+
+# ======================================================
+# Exportación
+# ======================================================
+def exportar(archivo, formato, lote=2000):
+    """Escribe todo el catálogo en `archivo` (texto) y devuelve la cantidad de filas."""
+    filas = Producto.objects.order_by('id').values_list(
+        'sku', 'nombre', 'descripcion', 'precio', 'descuento', 'stock', 'categoria__nombre',
+    ).iterator(chunk_size=lote)
+    escritor = csv.writer(archivo) if formato == 'csv' else None
+    if escritor:
+        escritor.writerow(COLUMNAS)
+    total = 0
+    for fila in filas:
+        fila = list(fila)
+        fila[0] = fila[0] or ''
+        fila[3] = str(fila[3])
+        fila[6] = fila[6] or ''
+        if escritor:
+            escritor.writerow(fila)
+        else:
+            archivo.write(json.dumps(dict(zip(COLUMNAS, fila)), ensure_ascii=False) + '\n')
+        total += 1
+    return total
@@ -0,0 +1,362 @@
+# ======================================================
+# Almacenamiento del carrito
+# - CARRITO_MODO = 'db': cada clic escribe en carritos_productos
+#   (comportamiento original)
+# - CARRITO_MODO = 'cache': el carrito vivo está en la caché como
+#   {producto_id: cantidad}; el stock se valida contra una foto
+#   cacheada (CARRITO_STOCK_TIMEOUT) y la base solo se escribe al
+#   volcar: en el checkout, cuando el carrito lleva más de
+#   CARRITO_VOLCADO_SEGUNDOS sin volcar, o con `volcar_carritos`
+# El stock real se vuelve a validar al crear el pedido (pedidos.py).
+# Con varios procesos la caché tiene que ser compartida (Redis, etc.)
+# Dos pestañas del mismo usuario que cambian el carrito a la vez: gana
+# la última escritura (los ítems de la otra se pierden, como si no
+# hubiera hecho el clic), pero cada escritura lleva su propio número
+# de cambio (incr), así el volcado nunca da por escrita otra versión.
+# ======================================================
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Carrito, CarritoProducto, Producto, centavos, precio_con_descuento_sql
+
+MODO_DB = 'db'
+MODO_CACHE = 'cache'
+
+# Índice de carritos sin volcar (ver _marcar_pendiente)
+CLAVE_PENDIENTES_FIN = 'carritos:pendientes:fin'
+CLAVE_PENDIENTES_INICIO = 'carritos:pendientes:inicio'
+CLAVE_PENDIENTES_REVISADO = 'carritos:pendientes:revisado'
+
+
+def _cache():
+    return caches[getattr(settings, 'CARRITO_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'CARRITO_CACHE_TIMEOUT', 7 * 24 * 3600)
+
+
+def modo():
+    return getattr(settings, 'CARRITO_MODO', MODO_DB)
+
+
+def de(usuario):
+    """Carrito del usuario según CARRITO_MODO."""
+    if modo() == MODO_CACHE:
+        return CarritoEnCache(usuario.pk)
+    return CarritoEnBase(usuario)
+
+
+# ======================================================
+# Modo base de datos
+# ======================================================
+class CarritoEnBase:
+    def __init__(self, usuario):
+        self.usuario = usuario
+
+    def _carrito(self):
+        carrito, _ = Carrito.objects.get_or_create(usuario=self.usuario)
+        return carrito
+
+    def stock(self, producto_id):
+        """Stock del producto, o None si no existe."""
+        return Producto.objects.filter(id=producto_id).values_list('stock', flat=True).first()
+
+    def agregar(self, producto_id, stock):
+        carrito_producto, creado = CarritoProducto.objects.get_or_create(
+            carrito=self._carrito(), producto_id=producto_id
+        )
+        if not creado and carrito_producto.cantidad < stock:
+            carrito_producto.cantidad += 1
+            carrito_producto.save()
+
+    def quitar(self, producto_id):
+        item = CarritoProducto.objects.filter(carrito=self._carrito(), producto_id=producto_id).first()
+        if item:
+            if item.cantidad > 1:
+                item.cantidad -= 1
+                item.save()
+            else:
+                item.delete()
+
+    def vaciar(self):
+        self._carrito().carritoproducto_set.all().delete()
+
+    def lineas(self):
+        self.carrito = self._carrito()
+        return self.carrito.lineas()
+
+    def total(self, lineas):
+        return self.carrito.total() if lineas else 0
+
+    def volcar(self):
+        pass
+
+
+# ======================================================
+# Modo caché (write-behind)
+# Estado en la caché: {'items': {producto_id: cantidad},
+#                      'cambios': n, 'volcados': n,
+#                      'sin_volcar_desde': timestamp | None}
+# 'cambios' sale de un contador propio (carrito:<id>:cambios, incr)
+# ======================================================
+def _clave(usuario_id):
+    return f'carrito:{usuario_id}'
+
+
+def _clave_cambios(usuario_id):
+    return f'carrito:{usuario_id}:cambios'
+
+
+def _clave_stock(producto_id):
+    return f'carrito:stock:{producto_id}'
+
+
+def _clave_pendiente(usuario_id):
+    return f'carritos:pendiente:{usuario_id}'
+
+
+def _clave_posicion(numero):
+    return f'carritos:pendientes:{numero}'
+
+
+def _incrementar(cache, clave):
+    """cache.incr() creando la clave si no existe (add no pisa a otro proceso)."""
+    cache.add(clave, 0, timeout=None)
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        # Se desalojó entre add e incr
+        cache.add(clave, 0, timeout=None)
+        return cache.incr(clave)
+
+
+def _cargar_de_la_base(usuario_id):
+    items = dict(
+        CarritoProducto.objects.filter(carrito__usuario_id=usuario_id)
+        .order_by('id').values_list('producto_id', 'cantidad')
+    )
+    return {'items': items, 'cambios': 0, 'volcados': 0, 'sin_volcar_desde': None}
+
+
+# Carritos pendientes: una clave por usuario (carritos:pendiente:<id> = desde)
+# y, para recorrerlos, una lista a la que solo se agrega:
+# carritos:pendientes:<n> = usuario_id, con n de un contador (incr). Todo es
+# add / incr / set de claves propias: requests de usuarios distintos no se pisan.
+def _marcar_pendiente(usuario_id, desde):
+    cache = _cache()
+    if cache.add(_clave_pendiente(usuario_id), desde, timeout=None):
+        numero = _incrementar(cache, CLAVE_PENDIENTES_FIN)
+        cache.set(_clave_posicion(numero), usuario_id, _timeout())
+
+
+def _quitar_pendiente(usuario_id):
+    _cache().delete(_clave_pendiente(usuario_id))
+
+
+def _indice(cache):
+    """(inicio, fin, {n: usuario_id}) de la lista de pendientes."""
+    inicio = cache.get(CLAVE_PENDIENTES_INICIO, 0)
+    fin = cache.get(CLAVE_PENDIENTES_FIN, 0)
+    claves = {_clave_posicion(n): n for n in range(inicio + 1, fin + 1)}
+    return inicio, fin, {claves[clave]: usuario_id for clave, usuario_id in cache.get_many(list(claves)).items()}
+
+
+def _marcas(cache, usuarios):
+    """{usuario_id: desde} de los que siguen pendientes."""
+    claves = {_clave_pendiente(usuario_id): usuario_id for usuario_id in set(usuarios)}
+    return {claves[clave]: desde for clave, desde in cache.get_many(list(claves)).items() if desde is not None}
+
+
+def _compactar(cache, inicio, fin, posiciones, pendientes):
+    """
+    Descarta el principio de la lista hasta el primer usuario que sigue
+    pendiente. Una posición vacía puede ser un request que todavía no la
+    escribió: solo se saltea si ya estaba antes de la vuelta anterior.
+    """
+    revisado = cache.get(CLAVE_PENDIENTES_REVISADO, 0)
+    nuevo_inicio = inicio
+    for numero in range(inicio + 1, fin + 1):
+        usuario_id = posiciones.get(numero)
+        if usuario_id is None and numero > revisado:
+            break
+        if usuario_id is not None and usuario_id in pendientes:
+            break
+        nuevo_inicio = numero
+    if nuevo_inicio > inicio:
+        cache.delete_many([_clave_posicion(n) for n in range(inicio + 1, nuevo_inicio + 1)])
+        cache.set(CLAVE_PENDIENTES_INICIO, nuevo_inicio, timeout=None)
+    cache.set(CLAVE_PENDIENTES_REVISADO, fin, timeout=None)
+
+
+def pendientes():
+    """{usuario_id: timestamp} de los carritos con cambios sin volcar."""
+    cache = _cache()
+    _, _, posiciones = _indice(cache)
+    return _marcas(cache, posiciones.values())
+
+
+def stock_cacheado(productos_ids):
+    """
+    {producto_id: stock} de una foto cacheada por CARRITO_STOCK_TIMEOUT
+    segundos; los que faltan se leen en una consulta. Los productos
+    inexistentes no aparecen.
+    """
+    cache = _cache()
+    claves = {_clave_stock(pid): pid for pid in productos_ids}
+    encontrados = cache.get_many(list(claves))
+    resultado = {claves[clave]: stock for clave, stock in encontrados.items() if stock is not None}
+    faltan = [pid for clave, pid in claves.items() if clave not in encontrados]
+    if faltan:
+        leidos = dict(Producto.objects.filter(id__in=faltan).values_list('id', 'stock'))
+        # Los inexistentes se cachean como None para no volver a consultarlos
+        cache.set_many(
+            {_clave_stock(pid): leidos.get(pid) for pid in faltan},
+            getattr(settings, 'CARRITO_STOCK_TIMEOUT', 60),
+        )
+        resultado.update(leidos)
+    return resultado
+
+
+def volcar(usuario_id, estado=None):
+    """
+    Escribe el carrito cacheado en carritos_productos (una transacción,
+    operaciones en lote) y lo marca como volcado. Devuelve False si no
+    había nada que volcar.
+    """
+    cache = _cache()
+    estado = estado or cache.get(_clave(usuario_id))
+    if estado is None or estado['cambios'] == estado['volcados']:
+        _quitar_pendiente(usuario_id)
+        return False
+
+    items = estado['items']
+    with transaction.atomic():
+        carrito, _ = Carrito.objects.select_for_update().get_or_create(usuario_id=usuario_id)
+        actuales = {
+            producto_id: (linea_id, cantidad)
+            for linea_id, producto_id, cantidad in carrito.carritoproducto_set.values_list('id', 'producto_id', 'cantidad')
+        }
+        sobrantes = [linea_id for producto_id, (linea_id, _) in actuales.items() if producto_id not in items]
+        if sobrantes:
+            CarritoProducto.objects.filter(id__in=sobrantes).delete()
+        modificadas = [
+            CarritoProducto(id=actuales[producto_id][0], cantidad=cantidad)
+            for producto_id, cantidad in items.items()
+            if producto_id in actuales and actuales[producto_id][1] != cantidad
+        ]
+        if modificadas:
+            CarritoProducto.objects.bulk_update(modificadas, ['cantidad'])
+        nuevos = [producto_id for producto_id in items if producto_id not in actuales]
+        if nuevos:
+            # Un producto borrado mientras estaba en el carrito se descarta
+            existentes = set(Producto.objects.filter(id__in=nuevos).values_list('id', flat=True))
+            CarritoProducto.objects.bulk_create([
+                CarritoProducto(carrito=carrito, producto_id=producto_id, cantidad=items[producto_id])
+                for producto_id in nuevos if producto_id in existentes
+            ])
+
+    # Si hubo clics mientras se volcaba el carrito sigue pendiente
+    posterior = cache.get(_clave(usuario_id))
+    if posterior is not None and posterior['cambios'] == estado['cambios']:
+        posterior['volcados'] = estado['cambios']
+        posterior['sin_volcar_desde'] = None
+        cache.set(_clave(usuario_id), posterior, _timeout())
+        _quitar_pendiente(usuario_id)
+    return True
+
+
+def volcar_pendientes(antiguedad=0):
+    """Vuelca los carritos con cambios de hace más de `antiguedad` segundos."""
+    cache = _cache()
+    limite = time.time() - antiguedad
+    inicio, fin, posiciones = _indice(cache)
+    volcados = 0
+    for usuario_id, desde in _marcas(cache, posiciones.values()).items():
+        if desde <= limite and volcar(usuario_id):
+            volcados += 1
+    _compactar(cache, inicio, fin, posiciones, _marcas(cache, posiciones.values()))
+    return volcados
+
+
+def olvidar(usuario_id):
+    """Descarta el carrito cacheado (por ejemplo después de crear el pedido)."""
+    if modo() != MODO_CACHE:
+        return
+    _cache().delete(_clave(usuario_id))
+    _quitar_pendiente(usuario_id)
+
+
+class CarritoEnCache:
+    def __init__(self, usuario_id):
+        self.usuario_id = usuario_id
+
+    def _estado(self):
+        estado = _cache().get(_clave(self.usuario_id))
+        if estado is None:
+            estado = _cargar_de_la_base(self.usuario_id)
+        return estado
+
+    def _guardar(self, estado):
+        ahora = time.time()
+        estado['cambios'] = _incrementar(_cache(), _clave_cambios(self.usuario_id))
+        if estado['sin_volcar_desde'] is None:
+            estado['sin_volcar_desde'] = ahora
+            _marcar_pendiente(self.usuario_id, ahora)
+        _cache().set(_clave(self.usuario_id), estado, _timeout())
+        if ahora - estado['sin_volcar_desde'] >= getattr(settings, 'CARRITO_VOLCADO_SEGUNDOS', 300):
+            volcar(self.usuario_id, estado)
+
+    def stock(self, producto_id):
+        return stock_cacheado([producto_id]).get(producto_id)
+
+    def agregar(self, producto_id, stock):
+        estado = self._estado()
+        cantidad = estado['items'].get(producto_id, 0)
+        if cantidad and cantidad >= stock:
+            return
+        estado['items'][producto_id] = cantidad + 1
+        self._guardar(estado)
+
+    def quitar(self, producto_id):
+        estado = self._estado()
+        cantidad = estado['items'].get(producto_id)
+        if not cantidad:
+            return
+        if cantidad > 1:
+            estado['items'][producto_id] = cantidad - 1
+        else:
+            del estado['items'][producto_id]
+        self._guardar(estado)
+
+    def vaciar(self):
+        estado = self._estado()
+        if estado['items']:
+            estado['items'] = {}
+            self._guardar(estado)
+
+    def lineas(self):
+        """Líneas como las de Carrito.lineas() (sin guardar), con una consulta."""
+        items = self._estado()['items']
+        if not items:
+            return []
+        productos = Producto.objects.annotate(precio_unitario=precio_con_descuento_sql()).in_bulk(list(items))
+        lineas = []
+        for producto_id, cantidad in items.items():
+            producto = productos.get(producto_id)
+            if producto is None:
+                continue
+            linea = CarritoProducto(producto=producto, cantidad=cantidad)
+            linea.precio_unitario = centavos(producto.precio_unitario)
+            linea.importe = linea.precio_unitario * cantidad
+            lineas.append(linea)
+        return lineas
+
+    def total(self, lineas):
+        return sum(linea.importe for linea in lineas) if lineas else 0
+
+    def volcar(self):
+        volcar(self.usuario_id)
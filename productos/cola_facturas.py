@@ -0,0 +1,113 @@
+# ======================================================
+# Cola de facturas en la base de datos
+# - encolar_factura(): la usa la vista al confirmar el pedido
+# - procesar_lote(): la usa el comando `procesar_facturas`
+#   (toma tareas pendientes y renderiza los PDFs, en paralelo
+#   si recibe un pool de procesos)
+# - Cada toma cuenta un intento; las tareas de un worker caído
+#   vuelven a la cola pasado VENCIMIENTO (en cada vuelta) y tras
+#   MAX_INTENTOS quedan en error
+# ======================================================
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import facturas
+from .models import TareaFactura
+
+MAX_INTENTOS = 3
+
+# Tareas "en proceso" más viejas que esto se consideran abandonadas
+# (worker caído) y vuelven a la cola
+VENCIMIENTO = timedelta(minutes=10)
+
+
+def encolar_factura(pedido):
+    return TareaFactura.objects.create(pedido=pedido)
+
+
+def programar_factura(pedido):
+    """
+    Encola la factura del pedido, o la genera en el momento si
+    FACTURAS_EN_SEGUNDO_PLANO=False (en ese caso devuelve su URL).
+    """
+    if getattr(settings, 'FACTURAS_EN_SEGUNDO_PLANO', True):
+        encolar_factura(pedido)
+        return None
+    return facturas.guardar_factura(pedido)
+
+
+def tomar_tareas(cantidad):
+    """
+    Marca hasta `cantidad` tareas pendientes como 'en proceso' (contando un
+    intento) y las devuelve. Antes recupera las abandonadas.
+    En PostgreSQL usa SKIP LOCKED para que varios workers no se pisen;
+    en SQLite la transacción IMMEDIATE ya serializa a los workers.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        reencolar_vencidas(ahora)
+        pendientes = TareaFactura.objects.filter(estado=TareaFactura.PENDIENTE).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            pendientes = pendientes.select_for_update(skip_locked=True)
+        ids = list(pendientes.values_list('id', flat=True)[:cantidad])
+        TareaFactura.objects.filter(id__in=ids).update(
+            estado=TareaFactura.EN_PROCESO, intentos=F('intentos') + 1, tomada=ahora, actualizada=ahora,
+        )
+    return list(
+        TareaFactura.objects.filter(id__in=ids)
+        .select_related('pedido__usuario')
+        .prefetch_related('pedido__pedidoproducto_set__producto')
+        .order_by('id')
+    )
+
+
+def reencolar_vencidas(ahora=None):
+    """
+    Devuelve a la cola las tareas tomadas hace más de VENCIMIENTO; las que ya
+    agotaron MAX_INTENTOS pasan a error. Devuelve cuántas volvieron a la cola.
+    """
+    ahora = ahora or timezone.now()
+    vencidas = TareaFactura.objects.filter(estado=TareaFactura.EN_PROCESO, tomada__lt=ahora - VENCIMIENTO)
+    vencidas.filter(intentos__gte=MAX_INTENTOS).update(
+        estado=TareaFactura.ERROR, error="El worker no terminó la tarea en ningún intento", actualizada=ahora,
+    )
+    return vencidas.update(estado=TareaFactura.PENDIENTE, actualizada=ahora)
+
+
+def _terminar(tarea, pdf_url=None, error=None):
+    if error is None:
+        tarea.estado, tarea.pdf_url, tarea.error = TareaFactura.TERMINADA, pdf_url, ''
+    else:
+        tarea.error = error
+        tarea.estado = TareaFactura.ERROR if tarea.intentos >= MAX_INTENTOS else TareaFactura.PENDIENTE
+    tarea.save(update_fields=['estado', 'pdf_url', 'error', 'actualizada'])
+
+
+def procesar_lote(cantidad=10, pool=None):
+    """
+    Procesa un lote de tareas y devuelve cuántas tomó.
+    Con `pool` (ProcessPoolExecutor) el renderizado corre en paralelo; la base
+    solo se toca desde este proceso.
+    """
+    tareas = tomar_tareas(cantidad)
+    if not tareas:
+        return 0
+
+    datos = [facturas.datos_factura(t.pedido) for t in tareas]
+    if pool is None:
+        futuros = [None] * len(tareas)
+    else:
+        futuros = [pool.submit(facturas.renderizar_y_guardar, d) for d in datos]
+
+    for tarea, d, futuro in zip(tareas, datos, futuros):
+        try:
+            pdf_url = futuro.result() if futuro else facturas.renderizar_y_guardar(d)
+        except Exception as e:
+            _terminar(tarea, error=f"{type(e).__name__}: {e}")
+        else:
+            _terminar(tarea, pdf_url=pdf_url)
+    return len(tareas)
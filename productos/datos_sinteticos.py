@@ -0,0 +1,156 @@
+# ======================================================
+# Datos sintéticos para benchmarks
+# - Determinísticos: la misma semilla genera los mismos datos
+# - Todo con inserciones en lote (bulk_create); al final se
+#   reconstruyen el índice de búsqueda y los agregados de ventas
+# - Se marcan con prefijos (usuarios "bench_", sku "BENCH-") para
+#   que la prueba de carga los encuentre
+# Conviene usar una base aparte (DATABASE_URL) para no mezclar
+# con datos reales.
+# ======================================================
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from . import busqueda, cache_catalogo, secuencias, similares, ventas
+from .models import Carrito, CarritoProducto, Categoria, Pedido, PedidoProducto, Producto, Usuario
+
+PALABRAS = (
+    "monitor teclado mouse silla gamer auricular parlante notebook cámara micrófono "
+    "pantalla mecánico inalámbrico ergonómico rgb usb bluetooth óptico curvo portátil "
+    "escritorio cable adaptador soporte funda batería cargador lámpara mochila joystick"
+).split()
+
+SILABAS = "ka ro mi tex lu zen pro vo da rix na tor qui bel sa fo nu gra po lin".split()
+
+PREFIJO_USUARIO = 'bench_'
+PREFIJO_SKU = 'BENCH-'
+CLAVE_USUARIOS = 'bench'
+
+LOTE = 5000
+
+
+def marcas(rnd, cantidad=20_000):
+    """Vocabulario de marcas/modelos inventados (términos de búsqueda selectivos)."""
+    return sorted({''.join(rnd.choices(SILABAS, k=3)) for _ in range(cantidad)})
+
+
+def existen():
+    return Producto.objects.filter(sku=f'{PREFIJO_SKU}0').exists()
+
+
+def _en_lotes(modelo, objetos, lote=LOTE):
+    pendientes, total = [], 0
+    for objeto in objetos:
+        pendientes.append(objeto)
+        if len(pendientes) >= lote:
+            modelo.objects.bulk_create(pendientes)
+            total += len(pendientes)
+            pendientes = []
+    modelo.objects.bulk_create(pendientes)
+    return total + len(pendientes)
+
+
+def generar(semilla=42, categorias=50, productos=100_000, usuarios=1_000, carritos=0.3,
+            pedidos=100_000, lineas_por_pedido=10, dias=365, con_similares=False, progreso=None):
+    """
+    Genera el catálogo, usuarios, carritos y pedidos. Devuelve un dict con
+    lo creado. `carritos` es la fracción de usuarios con carrito activo.
+    """
+    rnd = random.Random(semilla)
+    avisar = progreso or (lambda mensaje: None)
+    vocabulario = marcas(rnd)
+    creados = {}
+
+    with transaction.atomic():
+        nuevas = [Categoria(nombre=f"Bench {rnd.choice(PALABRAS).capitalize()} {i}") for i in range(categorias)]
+        Categoria.objects.bulk_create(nuevas)
+        creados['categorias'] = len(nuevas)
+        ids_categorias = [c.pk for c in nuevas]
+
+        def producto(i):
+            nombre = ' '.join([rnd.choice(PALABRAS)] + rnd.choices(vocabulario, k=2)).capitalize()
+            return Producto(
+                sku=f"{PREFIJO_SKU}{i}",
+                nombre=f"{nombre} {i}",
+                descripcion=' '.join(rnd.choices(PALABRAS, k=15) + rnd.choices(vocabulario, k=5)),
+                precio=rnd.randint(1000, 500000),
+                descuento=rnd.choice((0, 0, 0, 5, 10, 20)),
+                # Stock alto: la prueba de carga compra sin agotar el catálogo
+                stock=rnd.randint(0, 10) * 1000,
+                categoria_id=rnd.choice(ids_categorias) if ids_categorias else None,
+            )
+        creados['productos'] = _en_lotes(Producto, (producto(i) for i in range(productos)))
+        avisar(f"{creados['productos']} productos")
+
+        clave = make_password(CLAVE_USUARIOS)
+        creados['usuarios'] = _en_lotes(Usuario, (
+            Usuario(username=f"{PREFIJO_USUARIO}{i}", email=f"{PREFIJO_USUARIO}{i}@example.com", password=clave)
+            for i in range(usuarios)
+        ))
+        ids_usuarios = list(
+            Usuario.objects.filter(username__startswith=PREFIJO_USUARIO).order_by('id').values_list('id', flat=True)
+        )
+        # Precio con descuento, como lo guarda crear_pedido_desde_carrito
+        precios, ids_con_stock = {}, []
+        for pk, precio_final, stock in Producto.objects.filter(sku__startswith=PREFIJO_SKU).order_by('id') \
+                .values_list('id', 'precio_final', 'stock'):
+            precios[pk] = precio_final
+            if stock:
+                ids_con_stock.append(pk)
+        ids_productos = list(precios)
+
+        # Los carritos solo llevan productos con stock: si no, el checkout de la prueba de carga falla
+        con_carrito = [u for u in ids_usuarios if rnd.random() < carritos] if ids_con_stock else []
+        Carrito.objects.bulk_create([Carrito(usuario_id=u) for u in con_carrito], ignore_conflicts=True)
+        ids_carritos = dict(Carrito.objects.filter(usuario_id__in=con_carrito).values_list('usuario_id', 'id'))
+        creados['lineas_carrito'] = _en_lotes(CarritoProducto, (
+            CarritoProducto(carrito_id=ids_carritos[u], producto_id=p, cantidad=rnd.randint(1, 3))
+            for u in con_carrito
+            for p in rnd.sample(ids_con_stock, min(len(ids_con_stock), rnd.randint(1, 5)))
+        ))
+
+        # Pedidos: fechas repartidas en los últimos `dias`; las líneas se arman
+        # por lote para no tener todos los pedidos en memoria
+        ahora = timezone.now()
+        creados['pedidos'] = creados['lineas_pedido'] = 0
+        for inicio in range(0, pedidos, LOTE):
+            cantidad = min(LOTE, pedidos - inicio)
+            # Números del mismo contador que los pedidos reales (bulk_create no lo usa)
+            lote = [
+                Pedido(
+                    usuario_id=rnd.choice(ids_usuarios), numero_pedido=numero, total=0, pagado=True,
+                    direccion_envio="Calle Falsa 123",
+                )
+                for numero in secuencias.reservar_numeros_pedido(cantidad)
+            ]
+            Pedido.objects.bulk_create(lote)
+            lineas = []
+            for pedido in lote:
+                # `fecha` es auto_now_add: bulk_create la pisa, se corrige junto con el total
+                pedido.fecha = ahora - datetime.timedelta(seconds=rnd.randint(0, dias * 86400))
+                total = 0
+                cantidad_lineas = min(len(ids_productos), rnd.randint(1, lineas_por_pedido * 2 - 1))
+                for producto_id in rnd.sample(ids_productos, cantidad_lineas):
+                    cantidad = rnd.randint(1, 3)
+                    lineas.append(PedidoProducto(
+                        pedido_id=pedido.pk, producto_id=producto_id, cantidad=cantidad,
+                        precio_unitario=precios[producto_id],
+                    ))
+                    total += precios[producto_id] * cantidad
+                pedido.total = total
+            Pedido.objects.bulk_update(lote, ['fecha', 'total'], batch_size=1000)
+            creados['lineas_pedido'] += _en_lotes(PedidoProducto, lineas)
+            creados['pedidos'] += len(lote)
+            avisar(f"{creados['pedidos']} pedidos, {creados['lineas_pedido']} líneas")
+
+    # bulk_create no dispara señales: índices derivados y cachés a mano
+    busqueda.reconstruir_indice()
+    ventas.reconstruir()
+    if con_similares:
+        similares.reconstruir()
+    cache_catalogo.invalidar()
+    return creados
@@ -0,0 +1,62 @@
+# ======================================================
+# Archivos estáticos con WhiteNoise, también bajo ASGI
+# - WhiteNoiseMiddleware es solo sync: bajo ASGI Django lo adapta y
+#   cada request ocupa un hilo de punta a punta, aunque la vista sea
+#   async (se pierde la concurrencia del servidor ASGI)
+# - Esta versión es sync y async: los estáticos se sirven igual que
+#   WhiteNoise (en un hilo, es lectura de archivos) y el resto de los
+#   requests sigue async sin pasar por un hilo
+# - Las facturas están dentro de static/ (static/media/pedidos) pero no
+#   se sirven como estáticos: siguen de largo a archivos.factura, que
+#   revisa el dueño del pedido (y /static/... no tiene ruta: 404)
+# ======================================================
+import os
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import facturas
+
+
+def prefijos_privados():
+    """URLs de estáticos que no se sirven: la carpeta de facturas si cae dentro de STATICFILES_DIRS."""
+    carpeta = os.path.abspath(facturas.directorio_facturas())
+    prefijos = []
+    for entrada in settings.STATICFILES_DIRS:
+        prefijo, raiz = entrada if isinstance(entrada, (list, tuple)) else ('', entrada)
+        raiz = os.path.abspath(raiz)
+        if carpeta == raiz or carpeta.startswith(raiz + os.sep):
+            relativa = os.path.relpath(carpeta, raiz).replace(os.sep, '/')
+            partes = [p for p in (prefijo.strip('/'), '' if relativa == '.' else relativa) if p]
+            prefijos.append(settings.STATIC_URL + ''.join(f"{p}/" for p in partes))
+    return tuple(prefijos)
+
+
+class EstaticosMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.privados = prefijos_privados()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path_info.startswith(self.privados):
+            return self.get_response(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if request.path_info.startswith(self.privados):
+            return await self.get_response(request)
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
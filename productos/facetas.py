@@ -0,0 +1,136 @@
+# ======================================================
+# Facetas del catálogo (conteos para la navegación)
+# - Una sola consulta agrupada por (categoría, rango de precio,
+#   con stock, con descuento) sobre la búsqueda y el rango de
+#   precio actuales; cada faceta se suma en Python desde esos grupos
+# - Conteo "disjuntivo": cada faceta aplica los filtros de las otras
+#   pero no el suyo (elegir una categoría no borra los conteos del resto)
+# - Los grupos se guardan en la caché del catálogo por versión del
+#   catálogo, texto buscado y rango de precio, con un timeout corto
+#   (FACETAS_CACHE_TIMEOUT): el stock cambia con UPDATE sin señales
+# - Catálogos grandes: el catálogo sin filtros (la consulta más cara,
+#   recorre toda la tabla) lo puede mantener precalculado el comando
+#   `calcular_facetas`, así ningún request paga esa consulta
+# ======================================================
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from . import cache_catalogo
+from .busqueda import normalizar
+
+# Límites de los rangos de precio (precio con descuento)
+LIMITES_PRECIO = (5_000, 20_000, 50_000, 100_000, 250_000)
+
+
+def rangos_precio():
+    """[(desde, hasta)] de cada rango; el primero desde 0 y el último sin tope (None)."""
+    desdes = (0,) + LIMITES_PRECIO
+    return list(zip(desdes, LIMITES_PRECIO + (None,)))
+
+
+def _etiqueta(desde, hasta):
+    pesos = lambda valor: f"${valor:,}".replace(',', '.')
+    if not desde:
+        return f"Hasta {pesos(hasta)}"
+    if hasta is None:
+        return f"Más de {pesos(desde)}"
+    return f"{pesos(desde)} a {pesos(hasta)}"
+
+
+def _rango_sql():
+    casos = [When(precio_final__lt=limite, then=Value(i)) for i, limite in enumerate(LIMITES_PRECIO)]
+    return Case(*casos, default=Value(len(LIMITES_PRECIO)), output_field=IntegerField())
+
+
+def _si(condicion):
+    return Case(When(condicion, then=Value(1)), default=Value(0), output_field=IntegerField())
+
+
+def agrupar(productos):
+    """[(categoria_id, rango, con_stock, con_descuento, cantidad)] en una consulta."""
+    filas = (
+        productos.order_by()
+        .values(
+            'categoria_id', rango=_rango_sql(), con_stock=_si(Q(stock__gt=0)), con_descuento=_si(Q(descuento__gt=0)),
+        )
+        .annotate(cantidad=Count('id'))
+        .values_list('categoria_id', 'rango', 'con_stock', 'con_descuento', 'cantidad')
+    )
+    return [tuple(fila) for fila in filas]
+
+
+def _clave(texto, precio_min, precio_max):
+    partes = f"{normalizar(texto or '')}|{precio_min}|{precio_max}"
+    return f"catalogo:{cache_catalogo.version()}:facetas:{hashlib.md5(partes.encode()).hexdigest()}"
+
+
+def grupos(productos, texto=None, precio_min=None, precio_max=None, recalcular=False):
+    """
+    Grupos del queryset `productos` (ya filtrado por texto y precio), leídos
+    de la caché si otra request ya los calculó para los mismos parámetros.
+    """
+    cache = caches[getattr(settings, 'CATALOGO_CACHE', 'default')]
+    clave = _clave(texto, precio_min, precio_max)
+    valor = None if recalcular else cache.get(clave)
+    if valor is None:
+        valor = agrupar(productos)
+        cache.set(clave, valor, getattr(settings, 'FACETAS_CACHE_TIMEOUT', 300))
+    return valor
+
+
+def precalcular():
+    """Recalcula y guarda los grupos del catálogo sin filtros; devuelve cuántos son."""
+    from .models import Producto
+
+    return len(grupos(Producto.objects.all(), recalcular=True))
+
+
+def contar(grupos, categorias, categoria=None, con_stock=False, oferta=False):
+    """
+    Conteos de cada faceta a partir de los grupos. `categorias`: dicts
+    {'id', 'nombre'}; categoria / con_stock / oferta: filtros elegidos.
+    """
+    def pasa(grupo, excepto):
+        cat, _, stock, descuento, _ = grupo
+        return (
+            (excepto == 'categoria' or categoria is None or cat == categoria)
+            and (excepto == 'stock' or not con_stock or stock)
+            and (excepto == 'oferta' or not oferta or descuento)
+        )
+
+    por_categoria, por_rango = {}, [0] * (len(LIMITES_PRECIO) + 1)
+    stock = {'con_stock': 0, 'sin_stock': 0}
+    total = con_descuento = 0
+    for grupo in grupos:
+        cat, rango, hay_stock, descuento, cantidad = grupo
+        if pasa(grupo, 'categoria'):
+            por_categoria[cat] = por_categoria.get(cat, 0) + cantidad
+        if pasa(grupo, 'stock'):
+            stock['con_stock' if hay_stock else 'sin_stock'] += cantidad
+        if pasa(grupo, 'oferta') and descuento:
+            con_descuento += cantidad
+        if pasa(grupo, None):
+            por_rango[rango] += cantidad
+            total += cantidad
+
+    return {
+        'total': total,
+        'categorias': [dict(c, cantidad=por_categoria.get(c['id'], 0)) for c in categorias],
+        'precios': [
+            {'desde': desde, 'hasta': hasta, 'etiqueta': _etiqueta(desde, hasta), 'cantidad': cantidad}
+            for (desde, hasta), cantidad in zip(rangos_precio(), por_rango)
+        ],
+        'stock': stock,
+        'oferta': con_descuento,
+    }
+
+
+def entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
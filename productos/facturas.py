@@ -0,0 +1,126 @@
+# ======================================================
+# Facturas PDF de pedidos
+# - datos_factura(): extrae de la base lo necesario (proceso principal)
+# - renderizar_factura(): arma el PDF con ReportLab a partir de datos
+#   simples, sin tocar la base (se puede correr en otro proceso)
+# - guardar_factura(): escribe el archivo y devuelve su URL
+# ======================================================
+import io
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_LEFT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .instrumentacion import medir
+
+
+# Ubicación configurable con FACTURAS_DIR / FACTURAS_URL. Los archivos siguen en la
+# carpeta de siempre; la URL pasa por archivos.factura (ETag, Range, caché privada),
+# no por WhiteNoise (que las cacheaba como públicas)
+def directorio_facturas():
+    return getattr(settings, 'FACTURAS_DIR', os.path.join('static', 'media', 'pedidos'))
+
+
+def nombre_archivo(numero_pedido_formateado):
+    return f"pedido_{numero_pedido_formateado}.pdf"
+
+
+def url_base():
+    return getattr(settings, 'FACTURAS_URL', '/facturas/')
+
+
+def url_factura(numero_pedido_formateado):
+    return f"{url_base()}{nombre_archivo(numero_pedido_formateado)}"
+
+
+def datos_factura(pedido):
+    """Datos serializables del pedido; las líneas deberían venir prefetcheadas."""
+    fecha_local = timezone.localtime(pedido.fecha)
+    return {
+        'numero': pedido.numero_pedido_formateado(),
+        'cliente': f"{pedido.usuario.first_name} {pedido.usuario.last_name}",
+        'email': pedido.usuario.email,
+        'direccion': pedido.direccion_envio,
+        'fecha': fecha_local.strftime("%d/%m/%Y %H:%M"),
+        'total': pedido.total,
+        'lineas': [
+            (item.producto.nombre, item.cantidad, item.precio_unitario)
+            for item in pedido.pedidoproducto_set.all()
+        ],
+    }
+
+
+@lru_cache(maxsize=None)
+def _estilos():
+    """
+    Hoja de estilos, estilo de celda y estilo de tabla: se crean una vez por
+    proceso y se reutilizan en cada factura (solo se leen, nunca se modifican).
+    """
+    styles = getSampleStyleSheet()
+    # Estilo para las celdas de la tabla con wrap
+    cell_style = ParagraphStyle(name='cell_style', fontName='Helvetica', fontSize=10, leading=12, alignment=TA_LEFT)
+    table_style = TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
+        ('TEXTCOLOR',(0,0),(-1,0),colors.black),
+        ('ALIGN',(1,1),(-1,-1),'CENTER'),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0,0), (-1,0), 12),
+        ('BACKGROUND', (0,-1), (-1,-1), colors.lightgrey),
+        ('FONTNAME', (0,-1), (-1,-1), 'Helvetica-Bold'),
+    ])
+    return styles, cell_style, table_style
+
+
+def renderizar_factura(datos):
+    """Devuelve los bytes del PDF de la factura."""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    styles, cell_style, table_style = _estilos()
+
+    elements.append(Paragraph(f"Factura - Pedido #{datos['numero']}", styles['Title']))
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(f"<b>Cliente:</b> {datos['cliente']}", styles['Normal']))
+    elements.append(Paragraph(f"<b>Email:</b> {datos['email']}", styles['Normal']))
+    elements.append(Paragraph(f"<b>Dirección:</b> {datos['direccion']}", styles['Normal']))
+    elements.append(Paragraph(f"<b>Fecha:</b> {datos['fecha']}", styles['Normal']))
+    elements.append(Spacer(1, 12))
+
+    # Datos de la tabla
+    data = [['Producto', 'Cantidad', 'Precio Unitario', 'Subtotal']]
+    for nombre, cantidad, precio_unitario in datos['lineas']:
+        subtotal = cantidad * precio_unitario
+        producto_parrafo = Paragraph(nombre, cell_style)  # Wrap para nombres largos
+        data.append([producto_parrafo, str(cantidad), f"${precio_unitario:.2f}", f"${subtotal:.2f}"])
+    data.append(['', '', 'Total:', f"${datos['total']:.2f}"])
+
+    # Crear la tabla
+    table = Table(data, colWidths=[200, 60, 100, 100], repeatRows=1)
+    table.setStyle(table_style)
+    elements.append(table)
+
+    # Construir el PDF
+    with medir('pdf'):
+        doc.build(elements)
+    return buffer.getvalue()
+
+
+def renderizar_y_guardar(datos):
+    """Renderiza y escribe el PDF; pensado para correr en un proceso del pool."""
+    directorio = directorio_facturas()
+    os.makedirs(directorio, exist_ok=True)
+    with open(os.path.join(directorio, nombre_archivo(datos['numero'])), "wb") as f:
+        f.write(renderizar_factura(datos))
+    return url_factura(datos['numero'])
+
+
+def guardar_factura(pedido):
+    """Genera la factura del pedido en el proceso actual y devuelve su URL."""
+    return renderizar_y_guardar(datos_factura(pedido))
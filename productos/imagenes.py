@@ -0,0 +1,114 @@
+# ======================================================
+# Derivadas de imágenes de productos
+# - A partir de la imagen original genera versiones reducidas
+#   (miniatura / tarjeta / zoom) en JPEG y WebP
+# - Se guardan direccionadas por contenido, junto al original:
+#   img_productos/derivadas/<hash>/<variante>.<ext>
+#   (misma imagen => mismos archivos; nunca hace falta invalidarlos)
+# - El hash queda en el campo `imagen_hash` del modelo, así los
+#   templates arman las URLs sin tocar el disco
+# ======================================================
+import hashlib
+import io
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Ancho máximo (px) de cada variante; nunca se agranda la original
+VARIANTES = {
+    'miniatura': 160,
+    'tarjeta': 400,
+    'zoom': 1200,
+}
+
+# Extensión -> (formato de Pillow, opciones de guardado)
+FORMATOS = {
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+DIRECTORIO = 'derivadas'
+
+
+def hash_contenido(archivo):
+    """SHA-1 (hex, 20 caracteres) del contenido de un archivo abierto."""
+    digest = hashlib.sha1()
+    archivo.seek(0)
+    for bloque in iter(lambda: archivo.read(64 * 1024), b''):
+        digest.update(bloque)
+    archivo.seek(0)
+    return digest.hexdigest()[:20]
+
+
+def nombre_derivada(nombre_original, hash_imagen, variante, extension):
+    """Ruta (en el storage) de una derivada, en la carpeta de la imagen original."""
+    carpeta = posixpath.dirname(nombre_original)
+    return posixpath.join(carpeta, DIRECTORIO, hash_imagen, f"{variante}.{extension}")
+
+
+def url_derivada(nombre_original, hash_imagen, variante, extension='jpg'):
+    return default_storage.url(nombre_derivada(nombre_original, hash_imagen, variante, extension))
+
+
+def _redimensionar(imagen, ancho):
+    if imagen.width <= ancho:
+        return imagen.copy()
+    alto = max(1, round(imagen.height * ancho / imagen.width))
+    return imagen.resize((ancho, alto), Image.LANCZOS)
+
+
+def _codificar(imagen, extension):
+    formato, opciones = FORMATOS[extension]
+    if formato == 'JPEG' and imagen.mode != 'RGB':
+        # JPEG no tiene transparencia: se apoya sobre fondo blanco
+        fondo = Image.new('RGB', imagen.size, 'white')
+        if imagen.mode in ('RGBA', 'LA'):
+            fondo.paste(imagen, mask=imagen.getchannel('A'))
+        else:
+            fondo.paste(imagen.convert('RGB'))
+        imagen = fondo
+    buffer = io.BytesIO()
+    imagen.save(buffer, formato, **opciones)
+    return buffer.getvalue()
+
+
+def generar_derivadas(nombre_original, storage=None):
+    """
+    Genera las derivadas que falten para la imagen `nombre_original` y
+    devuelve su hash. Es idempotente y no toca la base, así que se puede
+    correr en otro proceso (ver comando `generar_derivadas`).
+    """
+    storage = storage or default_storage
+    with storage.open(nombre_original, 'rb') as archivo:
+        hash_imagen = hash_contenido(archivo)
+        pendientes = [
+            (variante, ancho, extension)
+            for variante, ancho in VARIANTES.items()
+            for extension in FORMATOS
+            if not storage.exists(nombre_derivada(nombre_original, hash_imagen, variante, extension))
+        ]
+        if not pendientes:
+            return hash_imagen
+        original = Image.open(archivo)
+        original.load()  # se lee antes de cerrar el archivo
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    reducidas = {}
+    for variante, ancho, extension in pendientes:
+        if variante not in reducidas:
+            reducidas[variante] = _redimensionar(original, ancho)
+        nombre = nombre_derivada(nombre_original, hash_imagen, variante, extension)
+        storage.save(nombre, ContentFile(_codificar(reducidas[variante], extension)))
+    return hash_imagen
+
+
+def srcset(nombre_original, hash_imagen, extension='jpg'):
+    """Valor del atributo srcset con todas las variantes ('url 160w, url 400w, ...')."""
+    return ', '.join(
+        f"{url_derivada(nombre_original, hash_imagen, variante, extension)} {ancho}w"
+        for variante, ancho in VARIANTES.items()
+    )
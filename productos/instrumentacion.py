@@ -0,0 +1,193 @@
+# ======================================================
+# Instrumentación por request
+# - MedicionMiddleware: cuenta las consultas SQL y su tiempo, detecta
+#   las repetidas (mismo SQL con distintos parámetros, el típico N+1)
+#   y suma el tiempo de plantillas, de llamadas externas (Mercado Pago)
+#   y de PDFs (ReportLab)
+# - Lo devuelve en el header Server-Timing (lo muestran las devtools
+#   del navegador) y, si el request supera INSTRUMENTACION_UMBRAL_LENTO_MS,
+#   lo registra como JSON en el log 'productos.instrumentacion' junto
+#   con las consultas más repetidas
+# - Pensado para dejarlo activo en producción: por consulta solo un
+#   perf_counter y un contador; las huellas se calculan al reportar
+# - medir('categoria'): suma tiempo a una categoría desde cualquier
+#   módulo; fuera de un request no hace nada. Las categorías se
+#   solapan: el SQL que se ejecuta al renderizar cuenta también en
+#   'plantillas'
+# - Sync y async: bajo ASGI las consultas corren en el hilo sync del
+#   request (sync_to_async) y ahí se instalan las envolturas del SQL
+# ======================================================
+import contextlib
+import json
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger(__name__)
+
+_actual = ContextVar('medicion', default=None)
+
+# Listas de parámetros de largo variable (IN (%s, %s, ...)) cuentan como la misma consulta
+_LISTAS = re.compile(r'%s(?:, %s)+')
+
+
+class Medicion:
+    __slots__ = ('consultas', 'tiempos', 'veces', 'sql')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempos = defaultdict(float)  # categoría -> segundos
+        self.veces = Counter()             # categoría -> llamadas
+        self.sql = Counter()               # SQL sin parámetros -> ejecuciones
+
+    def repetidas(self, top=5):
+        """[(huella, veces)] de las consultas ejecutadas más de una vez, de más a menos."""
+        por_huella = Counter()
+        for sql, veces in self.sql.items():
+            por_huella[huella(sql)] += veces
+        return [(sql, veces) for sql, veces in por_huella.most_common(top) if veces > 1]
+
+
+def huella(sql):
+    return _LISTAS.sub('%s, ...', sql)
+
+
+def actual():
+    """Medición del request en curso (None fuera de un request)."""
+    return _actual.get()
+
+
+@contextlib.contextmanager
+def medir(categoria):
+    medicion = _actual.get()
+    if medicion is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.tiempos[categoria] += time.perf_counter() - inicio
+        medicion.veces[categoria] += 1
+
+
+def _registrar_sql(execute, sql, params, many, context):
+    medicion = _actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.tiempos['sql'] += time.perf_counter() - inicio
+        medicion.consultas += 1
+        medicion.sql[sql] += 1
+
+
+# ======================================================
+# Plantillas
+# Backend igual al de Django que mide cada render de nivel superior
+# (los {% include %} quedan dentro del render que los incluye)
+# ======================================================
+class PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        with medir('plantillas'):
+            return super().render(context, request)
+
+
+class PlantillasMedidas(DjangoTemplates):
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return PlantillaMedida(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# ======================================================
+# Middleware
+# ======================================================
+def server_timing(medicion, total):
+    repetidas = sum(veces - 1 for _, veces in medicion.repetidas(top=None))
+    partes = [f'sql;dur={medicion.tiempos["sql"] * 1000:.1f};desc="{medicion.consultas} consultas, {repetidas} repetidas"']
+    for categoria in sorted(medicion.veces):
+        partes.append(f'{categoria};dur={medicion.tiempos[categoria] * 1000:.1f}')
+    partes.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(partes)
+
+
+def registro_lento(request, respuesta, medicion, total):
+    return {
+        'metodo': request.method,
+        'ruta': request.path,
+        'estado': respuesta.status_code,
+        'usuario': getattr(getattr(request, 'user', None), 'pk', None),
+        'total_ms': round(total * 1000, 1),
+        'consultas': medicion.consultas,
+        **{f'{categoria}_ms': round(segundos * 1000, 1) for categoria, segundos in sorted(medicion.tiempos.items())},
+        'repetidas': [{'sql': sql[:500], 'veces': veces} for sql, veces in medicion.repetidas()],
+    }
+
+
+def _envolver_sql(envolturas):
+    for alias in connections:
+        envolturas.enter_context(connections[alias].execute_wrapper(_registrar_sql))
+
+
+class MedicionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = Medicion()
+        token = _actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as envolturas:
+                _envolver_sql(envolturas)
+                respuesta = self.get_response(request)
+        finally:
+            _actual.reset(token)
+        return self._reportar(request, respuesta, medicion, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        medicion = Medicion()
+        token = _actual.set(medicion)
+        inicio = time.perf_counter()
+        envolturas = contextlib.ExitStack()
+        try:
+            await sync_to_async(_envolver_sql)(envolturas)
+            try:
+                respuesta = await self.get_response(request)
+            finally:
+                await sync_to_async(envolturas.close)()
+        finally:
+            _actual.reset(token)
+        return self._reportar(request, respuesta, medicion, time.perf_counter() - inicio)
+
+    def _reportar(self, request, respuesta, medicion, total):
+        if settings.INSTRUMENTACION_SERVER_TIMING:
+            respuesta['Server-Timing'] = server_timing(medicion, total)
+        if total * 1000 >= settings.INSTRUMENTACION_UMBRAL_LENTO_MS:
+            logger.warning(
+                "Request lento %s",
+                json.dumps(registro_lento(request, respuesta, medicion, total), ensure_ascii=False),
+            )
+        return respuesta
@@ -0,0 +1,83 @@
+# ======================================================
+# Comando: benchmark_busqueda
+# - Genera un catálogo sintético dentro de una transacción
+# - Mide la latencia de búsqueda con icontains y con el índice
+# - Revierte todo al terminar (no deja datos en la base)
+# ======================================================
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from productos import busqueda
+from productos.datos_sinteticos import PALABRAS, marcas
+from productos.models import Categoria, Producto
+
+CONSULTAS_FIJAS = ["monitor curvo", "teclado mecanico", "silla ergonómica"]
+
+
+class Command(BaseCommand):
+    help = "Compara la latencia de búsqueda icontains vs índice invertido sobre un catálogo sintético."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=100_000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['semilla'])
+        # Vocabulario amplio de marcas/modelos: como en un catálogo real, la
+        # mayoría de los términos buscados son selectivos.
+        self.marcas = marcas(rnd)
+        self.consultas = CONSULTAS_FIJAS + rnd.sample(self.marcas, 5) + [rnd.choice(self.marcas)[:4]]
+        with transaction.atomic():
+            self._generar(rnd, options['productos'])
+            productos = Producto.objects.all()
+            resultados = {
+                'icontains': self._medir(
+                    lambda q: productos.filter(Q(nombre__icontains=q) | Q(descripcion__icontains=q)),
+                    options['repeticiones'],
+                ),
+                'indice': self._medir(lambda q: busqueda.buscar_productos(productos, q), options['repeticiones']),
+            }
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Catálogo: {options['productos']} productos")
+        for nombre, tiempos in resultados.items():
+            self.stdout.write(
+                f"{nombre:>10}: mediana {statistics.median(tiempos) * 1000:.1f} ms, "
+                f"máx {max(tiempos) * 1000:.1f} ms"
+            )
+
+    def _generar(self, rnd, cantidad):
+        categoria, _ = Categoria.objects.get_or_create(nombre="Benchmark búsqueda")
+        lote = []
+        for i in range(cantidad):
+            nombre = ' '.join([rnd.choice(PALABRAS)] + rnd.choices(self.marcas, k=2)).capitalize()
+            lote.append(Producto(
+                nombre=f"{nombre} {i}",
+                descripcion=' '.join(rnd.choices(PALABRAS, k=15) + rnd.choices(self.marcas, k=5)),
+                precio=rnd.randint(1000, 500000),
+                stock=rnd.randint(0, 50),
+                categoria=categoria,
+            ))
+            if len(lote) == 5000:
+                Producto.objects.bulk_create(lote)
+                lote = []
+        Producto.objects.bulk_create(lote)
+        busqueda.reconstruir_indice()
+
+    def _medir(self, buscar, repeticiones):
+        """Total de resultados + primera página (24 productos), como en lista_productos."""
+        tiempos = []
+        for _ in range(repeticiones):
+            for consulta in self.consultas:
+                inicio = time.perf_counter()
+                resultados = buscar(consulta)
+                resultados.count()
+                list(resultados[:24])
+                tiempos.append(time.perf_counter() - inicio)
+        return tiempos
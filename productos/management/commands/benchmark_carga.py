@@ -0,0 +1,67 @@
+# ======================================================
+# Comando: benchmark_carga
+# - Prueba de carga de punta a punta sobre los datos de
+#   `generar_datos_benchmark` (ver prueba_carga.py)
+# - Informa p50/p95/p99, errores y consultas por request de cada
+#   paso, y requests por segundo en total
+# - --salida guarda el resultado en JSON; --comparar muestra la
+#   diferencia con una corrida anterior
+# Uso:
+#   python manage.py benchmark_carga --usuarios-virtuales 8 --iteraciones 50 --salida bench.json
+#   python manage.py benchmark_carga --comparar bench.json
+# ======================================================
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import prueba_carga
+
+
+class Command(BaseCommand):
+    help = "Mide latencia y throughput del recorrido de compra con usuarios virtuales concurrentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios-virtuales', type=int, default=4, help="Hilos concurrentes.")
+        parser.add_argument('--iteraciones', type=int, default=20, help="Recorridos por usuario virtual.")
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado.")
+        parser.add_argument('--comparar', help="Resultado JSON anterior contra el que comparar.")
+
+    def handle(self, *args, **options):
+        if options['usuarios_virtuales'] < 1 or options['iteraciones'] < 1:
+            raise CommandError("--usuarios-virtuales e --iteraciones tienen que ser mayores a 0.")
+        anterior = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as archivo:
+                    anterior = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"No se pudo leer {options['comparar']}: {e}")
+
+        try:
+            resultado = prueba_carga.ejecutar(
+                options['usuarios_virtuales'], options['iteraciones'], options['semilla'],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        self.stdout.write(f"{'paso':>20} {'req':>6} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'consultas':>10}")
+        for paso, datos in resultado['pasos'].items():
+            self.stdout.write(
+                f"{paso:>20} {datos['requests']:>6} {datos['errores']:>5} {datos['p50_ms']:>8.1f} "
+                f"{datos['p95_ms']:>8.1f} {datos['p99_ms']:>8.1f} {datos['consultas_media']:>10.1f}"
+            )
+        total = resultado['total']
+        self.stdout.write(self.style.SUCCESS(
+            f"{total['requests']} requests en {total['segundos']:.1f}s "
+            f"({total['requests_por_segundo']} req/s), {total['errores']} errores"
+        ))
+        for falla in resultado['fallas']:
+            self.stderr.write(falla)
+        if anterior:
+            for linea in prueba_carga.comparar(anterior, resultado):
+                self.stdout.write(linea)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultado guardado en {options['salida']}")
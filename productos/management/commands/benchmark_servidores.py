@@ -0,0 +1,59 @@
+# ======================================================
+# Comando: benchmark_servidores
+# - WSGI (gunicorn, workers sync) contra ASGI (gunicorn +
+#   UvicornWorker, vistas async) con la misma cantidad de workers,
+#   sobre los datos de `generar_datos_benchmark` (ver prueba_servidores.py)
+# - La pasarela de pagos falsa tarda --demora-pasarela segundos
+# - Informa req/s, p50/p95/p99 y errores por paso, y memoria de cada servidor
+# Uso:
+#   python manage.py benchmark_servidores --workers 2 --concurrencia 32 --segundos 20
+#   python manage.py benchmark_servidores --servidores asgi --salida asgi.json
+# ======================================================
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import prueba_servidores
+
+
+class Command(BaseCommand):
+    help = "Compara throughput y latencia de WSGI y ASGI con la misma cantidad de workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servidores', default='wsgi,asgi', help="Separados por coma: wsgi, asgi.")
+        parser.add_argument('--workers', type=int, default=2, help="Procesos de cada servidor.")
+        parser.add_argument('--concurrencia', type=int, default=32, help="Clientes concurrentes.")
+        parser.add_argument('--segundos', type=float, default=20, help="Duración de la carga por servidor.")
+        parser.add_argument('--demora-pasarela', type=float, default=0.3,
+                            help="Segundos que tarda la pasarela falsa en responder.")
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado.")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['concurrencia'] < 1 or options['segundos'] <= 0:
+            raise CommandError("--workers, --concurrencia y --segundos tienen que ser mayores a 0.")
+        servidores = [s.strip() for s in options['servidores'].split(',') if s.strip()]
+        try:
+            resultado = prueba_servidores.ejecutar(
+                servidores, options['workers'], options['concurrencia'], options['segundos'],
+                options['demora_pasarela'], options['semilla'],
+            )
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(e)
+
+        for nombre, datos in resultado['servidores'].items():
+            memoria = datos['memoria_mb']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{nombre}: {datos['total']['requests_por_segundo']} req/s, {datos['total']['errores']} errores, "
+                f"memoria {memoria['inicial']} -> {memoria['maxima']} MB"
+            ))
+            self.stdout.write(f"{'paso':>12} {'req':>6} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'consultas':>10}")
+            for paso, p in datos['pasos'].items():
+                self.stdout.write(
+                    f"{paso:>12} {p['requests']:>6} {p['errores']:>5} {p['p50_ms']:>8.1f} "
+                    f"{p['p95_ms']:>8.1f} {p['p99_ms']:>8.1f} {p['consultas_media']:>10.1f}"
+                )
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultado guardado en {options['salida']}")
@@ -0,0 +1,49 @@
+# ======================================================
+# Comando: benchmark_sesiones
+# - Catálogo, carrito y checkout con cada backend de sesiones
+#   (SESIONES_MODO 'db' y 'cache', ver sesiones.py) sobre los datos de
+#   `generar_datos_benchmark` (ver prueba_sesiones.py)
+# - Informa consultas por request, lecturas / escrituras de
+#   django_session y cuántas consultas ahorra 'cache' en cada página
+# Uso:
+#   python manage.py benchmark_sesiones --requests 50
+#   python manage.py benchmark_sesiones --salida sesiones.json
+# ======================================================
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import prueba_sesiones
+
+
+class Command(BaseCommand):
+    help = "Compara las consultas por request de las sesiones en base y en caché."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help="Requests medidos por página y modo.")
+        parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError("--requests tiene que ser mayor a 0.")
+        try:
+            resultado = prueba_sesiones.ejecutar(options['requests'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        self.stdout.write(
+            f"{'modo':>6} {'página':>10} {'consultas':>10} {'lect. ses.':>11} {'escr. ses.':>11} {'media ms':>9}"
+        )
+        for modo, paginas in resultado['modos'].items():
+            for pagina, p in paginas.items():
+                self.stdout.write(
+                    f"{modo:>6} {pagina:>10} {p['consultas']:>10.2f} {p['lecturas_sesion']:>11.2f} "
+                    f"{p['escrituras_sesion']:>11.2f} {p['media_ms']:>9.2f}"
+                )
+        for modo, paginas in resultado.get('ahorro', {}).items():
+            detalle = ', '.join(f"{pagina} {ahorro:+.2f}" for pagina, ahorro in paginas.items())
+            self.stdout.write(self.style.SUCCESS(f"{modo}: consultas ahorradas por request contra 'db': {detalle}"))
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultado guardado en {options['salida']}")
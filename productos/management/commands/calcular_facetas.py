@@ -0,0 +1,41 @@
+# ======================================================
+# Comando: calcular_facetas
+# - Mantiene precalculados en la caché los conteos de facetas del
+#   catálogo sin filtros (ver facetas.py), la consulta más cara con
+#   catálogos grandes: así los requests siempre la leen de la caché
+# - Recalcula cada --espera segundos (menos que FACETAS_CACHE_TIMEOUT)
+# Uso: python manage.py calcular_facetas [--espera 60] [--una-vez]
+# (necesita la misma caché compartida que los procesos web)
+# ======================================================
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from productos import facetas
+
+
+class Command(BaseCommand):
+    help = "Precalcula en la caché los conteos de facetas del catálogo completo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--espera', type=float, default=60.0, help="Segundos entre vueltas.")
+        parser.add_argument('--una-vez', action='store_true',
+                            help="Hace una sola vuelta y termina (útil para cron o tests).")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                inicio = time.perf_counter()
+                cantidad = facetas.precalcular()
+                if options['una_vez']:
+                    break
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{cantidad} grupos en {time.perf_counter() - inicio:.2f}s")
+                close_old_connections()
+                time.sleep(options['espera'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{cantidad} grupos de facetas calculados en {time.perf_counter() - inicio:.2f}s"
+        ))
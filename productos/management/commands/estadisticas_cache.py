@@ -0,0 +1,30 @@
+# ======================================================
+# Comando: estadisticas_cache
+# - Muestra aciertos / fallos de la caché del catálogo
+# Uso:
+#   python manage.py estadisticas_cache
+#   python manage.py estadisticas_cache --reiniciar
+# Con la caché locmem los contadores son por proceso: para ver
+# los del servidor hace falta un backend compartido.
+# ======================================================
+from django.core.management.base import BaseCommand
+
+from productos import cache_catalogo
+
+
+class Command(BaseCommand):
+    help = "Muestra los aciertos y fallos de la caché del catálogo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reiniciar', action='store_true', help="Pone los contadores en cero.")
+
+    def handle(self, *args, **options):
+        datos = cache_catalogo.estadisticas()
+        self.stdout.write(
+            f"Versión del catálogo: {cache_catalogo.version()}\n"
+            f"Aciertos: {datos['aciertos']}  Fallos: {datos['fallos']}  "
+            f"Tasa de aciertos: {datos['tasa_aciertos']:.1%}"
+        )
+        if options['reiniciar']:
+            cache_catalogo.reiniciar_estadisticas()
+            self.stdout.write(self.style.SUCCESS("Contadores reiniciados."))
@@ -0,0 +1,45 @@
+# ======================================================
+# Comando: exportar_catalogo
+# - Exporta todos los productos a CSV o JSONL (streaming), con las
+#   mismas columnas que acepta `importar_catalogo`
+# Uso:
+#   python manage.py exportar_catalogo catalogo.csv
+#   python manage.py exportar_catalogo - --formato jsonl > catalogo.jsonl
+# ======================================================
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import carga_catalogo
+
+
+class Command(BaseCommand):
+    help = "Exporta el catálogo de productos a un archivo CSV o JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo, o - para escribir en la salida estándar.")
+        parser.add_argument('--formato', choices=carga_catalogo.FORMATOS,
+                            help="Formato del archivo (por defecto, según la extensión).")
+        parser.add_argument('--lote', type=int, default=2000, help="Filas leídas de la base por vez.")
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        if archivo == '-' and not options['formato']:
+            raise CommandError("Con la salida estándar hay que indicar --formato.")
+        try:
+            formato = carga_catalogo.formato_de(archivo, options['formato'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        inicio = time.perf_counter()
+        if archivo == '-':
+            total = carga_catalogo.exportar(sys.stdout, formato, options['lote'])
+        else:
+            with open(archivo, 'w', encoding='utf-8', newline='') as salida:
+                total = carga_catalogo.exportar(salida, formato, options['lote'])
+            duracion = time.perf_counter() - inicio
+            # Con '-' la salida estándar es el archivo: el resumen no se mezcla
+            self.stdout.write(self.style.SUCCESS(
+                f"{total} productos exportados en {duracion:.2f}s ({total / max(duracion, 1e-9):.0f} filas/s)"
+            ))
@@ -0,0 +1,51 @@
+# ======================================================
+# Comando: generar_datos_benchmark
+# - Carga datos sintéticos determinísticos para la prueba de carga:
+#   categorías, productos, usuarios "bench_", carritos y pedidos
+#   (con millones de líneas si se pide), todo con bulk_create
+# Uso (mejor sobre una base aparte):
+#   DATABASE_URL=sqlite:////tmp/bench.sqlite3 python manage.py migrate
+#   DATABASE_URL=sqlite:////tmp/bench.sqlite3 python manage.py generar_datos_benchmark --pedidos 200000
+# ======================================================
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import datos_sinteticos
+
+
+class Command(BaseCommand):
+    help = "Genera datos sintéticos (catálogo, usuarios, carritos, pedidos) para benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--categorias', type=int, default=50)
+        parser.add_argument('--productos', type=int, default=100_000)
+        parser.add_argument('--usuarios', type=int, default=1_000)
+        parser.add_argument('--carritos', type=float, default=0.3,
+                            help="Fracción de usuarios con carrito activo.")
+        parser.add_argument('--pedidos', type=int, default=100_000)
+        parser.add_argument('--lineas-por-pedido', type=int, default=10, help="Promedio de líneas por pedido.")
+        parser.add_argument('--dias', type=int, default=365, help="Antigüedad máxima de los pedidos.")
+        parser.add_argument('--similares', action='store_true',
+                            help="Recalcula también los productos similares (lento con catálogos grandes).")
+
+    def handle(self, *args, **options):
+        if datos_sinteticos.existen():
+            raise CommandError("Ya hay datos de benchmark en esta base (usar una base nueva).")
+        if options['productos'] < 1 or options['usuarios'] < 1 or options['lineas_por_pedido'] < 1:
+            raise CommandError("--productos, --usuarios y --lineas-por-pedido tienen que ser mayores a 0.")
+        inicio = time.perf_counter()
+
+        def progreso(mensaje):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {mensaje} ({time.perf_counter() - inicio:.1f}s)")
+
+        creados = datos_sinteticos.generar(
+            semilla=options['semilla'], categorias=options['categorias'], productos=options['productos'],
+            usuarios=options['usuarios'], carritos=options['carritos'], pedidos=options['pedidos'],
+            lineas_por_pedido=options['lineas_por_pedido'], dias=options['dias'],
+            con_similares=options['similares'], progreso=progreso,
+        )
+        detalle = ', '.join(f"{cantidad} {nombre.replace('_', ' ')}" for nombre, cantidad in creados.items())
+        self.stdout.write(self.style.SUCCESS(f"Generado en {time.perf_counter() - inicio:.1f}s: {detalle}"))
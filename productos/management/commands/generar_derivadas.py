@@ -0,0 +1,81 @@
+# ======================================================
+# Comando: generar_derivadas
+# - Genera las derivadas (miniatura / tarjeta / zoom, JPEG y WebP)
+#   de las imágenes de productos ya cargadas
+# - Procesa en paralelo con un pool de procesos; la base solo
+#   se toca desde el proceso principal (bulk_update por lote)
+# Uso:
+#   python manage.py generar_derivadas
+#   python manage.py generar_derivadas --todas --procesos 4
+# ======================================================
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from productos import cache_catalogo, imagenes
+from productos.models import Producto, ProductoImagen
+
+
+def _generar(nombre):
+    """Corre en el pool: devuelve (hash, error) sin lanzar excepciones."""
+    try:
+        return imagenes.generar_derivadas(nombre), None
+    except OSError as e:
+        return '', f"{type(e).__name__}: {e}"
+
+
+class Command(BaseCommand):
+    help = "Genera las derivadas responsive de las imágenes de productos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help="Incluye imágenes que ya tienen derivadas (las faltantes se regeneran).")
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--lote', type=int, default=100, help="Imágenes leídas de la base por vez.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        procesos = max(1, options['procesos'])
+        total = errores = 0
+        with ProcessPoolExecutor(procesos) as pool:
+            for modelo in (Producto, ProductoImagen):
+                objetos = modelo.objects.exclude(imagen='').exclude(imagen__isnull=True).only('imagen', 'imagen_hash')
+                if not options['todas']:
+                    objetos = objetos.filter(imagen_hash='')
+                lote = []
+                for objeto in objetos.order_by('pk').iterator(chunk_size=options['lote']):
+                    lote.append(objeto)
+                    if len(lote) >= options['lote']:
+                        errores += self._procesar(pool, modelo, lote, procesos)
+                        total += len(lote)
+                        lote = []
+                errores += self._procesar(pool, modelo, lote, procesos)
+                total += len(lote)
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{total - errores} imágenes procesadas ({errores} con error) en {duracion:.2f}s ({procesos} procesos)"
+        ))
+
+    def _procesar(self, pool, modelo, lote, procesos):
+        """Genera las derivadas del lote en el pool y guarda los hashes; devuelve los errores."""
+        if not lote:
+            return 0
+        errores = 0
+        chunksize = max(1, len(lote) // (procesos * 4))
+        cambiados = []
+        resultados = pool.map(_generar, [o.imagen.name for o in lote], chunksize=chunksize)
+        for objeto, (hash_imagen, error) in zip(lote, resultados):
+            if error:
+                errores += 1
+                self.stderr.write(f"  {objeto.imagen.name}: {error}")
+            elif hash_imagen != objeto.imagen_hash:
+                objeto.imagen_hash = hash_imagen
+                cambiados.append(objeto)
+        if cambiados:
+            modelo.objects.bulk_update(cambiados, ['imagen_hash'])
+            # bulk_update no dispara señales: las tarjetas cacheadas apuntan a las derivadas viejas
+            cache_catalogo.invalidar()
+        return errores
@@ -0,0 +1,80 @@
+# ======================================================
+# Comando: importar_catalogo
+# - Carga masiva de productos desde CSV o JSONL (streaming)
+# - Upsert por sku en lotes; crea las categorías que falten
+# Uso:
+#   python manage.py importar_catalogo proveedor.csv --lote 2000
+#   python manage.py importar_catalogo - --formato jsonl < feed.jsonl
+# (ver columnas en productos/carga_catalogo.py)
+# ======================================================
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import carga_catalogo, similares
+
+MAX_ERRORES_MOSTRADOS = 20
+
+
+class Command(BaseCommand):
+    help = "Importa (crea o actualiza por sku) productos desde un archivo CSV o JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo, o - para leer de la entrada estándar.")
+        parser.add_argument('--formato', choices=carga_catalogo.FORMATOS,
+                            help="Formato del archivo (por defecto, según la extensión).")
+        parser.add_argument('--lote', type=int, default=1000, help="Filas por upsert / transacción.")
+        parser.add_argument('--sin-similares', action='store_true',
+                            help="No recalcula los productos similares al terminar "
+                                 "(correr después `recalcular_similares`).")
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        if archivo == '-' and not options['formato']:
+            raise CommandError("Con la entrada estándar hay que indicar --formato.")
+        try:
+            formato = carga_catalogo.formato_de(archivo, options['formato'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        inicio = time.perf_counter()
+
+        def progreso(guardadas):
+            if options['verbosity'] > 1:
+                velocidad = guardadas / max(time.perf_counter() - inicio, 1e-9)
+                self.stdout.write(f"  {guardadas} filas ({velocidad:.0f} filas/s)")
+
+        errores_mostrados = []
+
+        def errores(numero, motivo):
+            if len(errores_mostrados) < MAX_ERRORES_MOSTRADOS:
+                errores_mostrados.append(numero)
+                self.stderr.write(f"Línea {numero}: {motivo}")
+
+        if archivo == '-':
+            entrada = sys.stdin
+        else:
+            try:
+                entrada = open(archivo, encoding='utf-8', newline='')
+            except OSError as e:
+                raise CommandError(f"No se pudo abrir {archivo}: {e}")
+        try:
+            guardadas, invalidas = carga_catalogo.importar(
+                carga_catalogo.leer_filas(entrada, formato),
+                lote=options['lote'], progreso=progreso, errores=errores,
+            )
+        finally:
+            if entrada is not sys.stdin:
+                entrada.close()
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{guardadas} productos importados en {duracion:.2f}s "
+            f"({guardadas / max(duracion, 1e-9):.0f} filas/s), {invalidas} filas inválidas"
+        ))
+
+        if guardadas and not options['sin_similares']:
+            inicio = time.perf_counter()
+            total = similares.reconstruir()
+            self.stdout.write(f"Similares recalculados para {total} productos en {time.perf_counter() - inicio:.2f}s")
@@ -0,0 +1,50 @@
+# ======================================================
+# Comando: procesar_facturas
+# - Worker de la cola de facturas (TareaFactura)
+# - Renderiza los PDFs fuera del request, opcionalmente en
+#   varios procesos a la vez (--procesos)
+# - Se pueden correr varios: cada vuelta recupera las tareas
+#   de workers caídos (ver cola_facturas.reencolar_vencidas)
+# Uso: python manage.py procesar_facturas --procesos 4
+# ======================================================
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from productos import cola_facturas
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de facturas PDF pendientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1,
+                            help="Procesos para renderizar PDFs en paralelo (1 = sin pool).")
+        parser.add_argument('--lote', type=int, default=20, help="Tareas tomadas por vuelta.")
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help="Segundos entre consultas cuando la cola está vacía.")
+        parser.add_argument('--una-vez', action='store_true',
+                            help="Vacía la cola y termina (útil para cron o tests).")
+
+    def handle(self, *args, **options):
+        pool = ProcessPoolExecutor(options['procesos']) if options['procesos'] > 1 else None
+        procesadas = 0
+        try:
+            while True:
+                cantidad = cola_facturas.procesar_lote(options['lote'], pool)
+                procesadas += cantidad
+                if cantidad:
+                    continue
+                if options['una_vez']:
+                    break
+                # Worker de larga duración: descarta conexiones caídas o vencidas
+                close_old_connections()
+                time.sleep(options['espera'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f"{procesadas} facturas procesadas"))
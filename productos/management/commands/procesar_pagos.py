@@ -0,0 +1,51 @@
+# ======================================================
+# Comando: procesar_pagos
+# - Worker de la bandeja del webhook de Mercado Pago
+# - Deduplica por id de pago y crea los pedidos aprobados
+# Uso: python manage.py procesar_pagos
+# (se pueden correr varios workers: cada uno toma sus notificaciones, ver webhooks.py)
+# ======================================================
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from productos import pagos, webhooks
+
+
+class Command(BaseCommand):
+    help = "Procesa las notificaciones de pago recibidas por el webhook."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=200, help="Notificaciones leídas por vuelta.")
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help="Segundos entre consultas cuando la bandeja está vacía.")
+        parser.add_argument('--una-vez', action='store_true',
+                            help="Vacía la bandeja y termina (útil para cron o tests).")
+
+    def handle(self, *args, **options):
+        leidas, resumen = 0, {}
+        try:
+            while True:
+                try:
+                    cantidad, parcial = webhooks.procesar_lote(options['lote'])
+                except pagos.PasarelaNoDisponible as e:
+                    self.stderr.write(f"{e} (se reintenta el mismo lote)")
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['espera'])
+                    continue
+                leidas += cantidad
+                for resultado, n in parcial.items():
+                    resumen[resultado] = resumen.get(resultado, 0) + n
+                if cantidad:
+                    continue
+                if options['una_vez']:
+                    break
+                # Worker de larga duración: descarta conexiones caídas o vencidas
+                close_old_connections()
+                time.sleep(options['espera'])
+        except KeyboardInterrupt:
+            pass
+        detalle = ', '.join(f"{n} {resultado}" for resultado, n in sorted(resumen.items())) or 'sin pagos nuevos'
+        self.stdout.write(self.style.SUCCESS(f"{leidas} notificaciones leídas ({detalle})"))
@@ -0,0 +1,32 @@
+# ======================================================
+# Comando: recalcular_similares
+# - Recalcula la tabla de productos similares de todo el catálogo
+#   (al guardar un producto ya se actualiza sola; esto es para
+#   cargas masivas o cambios en el cálculo del puntaje)
+# Uso:
+#   python manage.py recalcular_similares
+# ======================================================
+import time
+
+from django.core.management.base import BaseCommand
+
+from productos import similares
+
+
+class Command(BaseCommand):
+    help = "Recalcula los productos similares de todo el catálogo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help="Productos recalculados por transacción.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+
+        def progreso(hechos, total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {hechos}/{total}")
+
+        total = similares.reconstruir(lote=options['lote'], progreso=progreso)
+        self.stdout.write(self.style.SUCCESS(
+            f"Similares recalculados para {total} productos en {time.perf_counter() - inicio:.2f}s"
+        ))
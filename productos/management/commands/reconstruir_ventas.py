@@ -0,0 +1,39 @@
+# ======================================================
+# Comando: reconstruir_ventas
+# - Recalcula los agregados de ventas por día desde los pedidos
+#   (backfill inicial, o después de editar pedidos en el admin)
+# Uso:
+#   python manage.py reconstruir_ventas
+#   python manage.py reconstruir_ventas --desde 2025-09-01 --hasta 2025-09-30
+# ======================================================
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import ventas
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida: {valor} (formato AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = "Recalcula los agregados de ventas diarias (por día, producto y categoría)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help="Fecha inicial (AAAA-MM-DD), inclusive.")
+        parser.add_argument('--hasta', type=_fecha, help="Fecha final (AAAA-MM-DD), inclusive.")
+        parser.add_argument('--lote', type=int, default=2000, help="Filas insertadas por vez.")
+
+    def handle(self, *args, **options):
+        if options['desde'] and options['hasta'] and options['desde'] > options['hasta']:
+            raise CommandError("--desde es posterior a --hasta.")
+        inicio = time.perf_counter()
+        dias = ventas.reconstruir(options['desde'], options['hasta'], lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Ventas recalculadas: {dias} días con ventas en {time.perf_counter() - inicio:.2f}s"
+        ))
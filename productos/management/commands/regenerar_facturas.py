@@ -0,0 +1,83 @@
+# ======================================================
+# Comando: regenerar_facturas
+# - (Re)genera los PDFs de pedidos existentes
+# - Filtra por rango de fechas o por números de pedido
+# - Recorre los pedidos por lotes (iterator + prefetch) y
+#   renderiza en paralelo con un pool de procesos
+# Uso:
+#   python manage.py regenerar_facturas --desde 2025-09-01 --hasta 2025-09-30
+#   python manage.py regenerar_facturas --pedidos 12 15 20 --procesos 4
+# ======================================================
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as hora, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from productos import facturas
+from productos.models import Pedido
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida: {valor} (formato AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = "Regenera las facturas PDF de pedidos existentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help="Fecha inicial (AAAA-MM-DD), inclusive.")
+        parser.add_argument('--hasta', type=_fecha, help="Fecha final (AAAA-MM-DD), inclusive.")
+        parser.add_argument('--pedidos', type=int, nargs='+', help="Números de pedido.")
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--lote', type=int, default=200, help="Pedidos leídos de la base por vez.")
+
+    def handle(self, *args, **options):
+        if not (options['desde'] or options['hasta'] or options['pedidos']):
+            raise CommandError("Indicá --desde/--hasta o --pedidos.")
+        self.verbosity = options['verbosity']
+
+        pedidos = Pedido.objects.select_related('usuario').prefetch_related(
+            'pedidoproducto_set__producto'
+        ).order_by('numero_pedido')
+        if options['desde']:
+            pedidos = pedidos.filter(fecha__gte=timezone.make_aware(datetime.combine(options['desde'], hora.min)))
+        if options['hasta']:
+            limite = datetime.combine(options['hasta'] + timedelta(days=1), hora.min)
+            pedidos = pedidos.filter(fecha__lt=timezone.make_aware(limite))
+        if options['pedidos']:
+            pedidos = pedidos.filter(numero_pedido__in=options['pedidos'])
+
+        inicio = time.perf_counter()
+        total = 0
+        procesos = max(1, options['procesos'])
+        with ProcessPoolExecutor(procesos) as pool:
+            lote = []
+            # iterator() con chunk_size también aplica el prefetch por bloque
+            for pedido in pedidos.iterator(chunk_size=options['lote']):
+                lote.append(facturas.datos_factura(pedido))
+                if len(lote) >= options['lote']:
+                    total += self._renderizar(pool, lote, procesos)
+                    lote = []
+            total += self._renderizar(pool, lote, procesos)
+
+        duracion = time.perf_counter() - inicio
+        ritmo = total / duracion if duracion else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} facturas regeneradas en {duracion:.2f}s ({ritmo:.1f} facturas/s, {procesos} procesos)"
+        ))
+
+    def _renderizar(self, pool, lote, procesos):
+        """Reparte el lote en el pool y espera a que termine (memoria acotada a un lote)."""
+        if not lote:
+            return 0
+        chunksize = max(1, len(lote) // (procesos * 4))
+        for url in pool.map(facturas.renderizar_y_guardar, lote, chunksize=chunksize):
+            if self.verbosity > 1:
+                self.stdout.write(f"  {url}")
+        return len(lote)
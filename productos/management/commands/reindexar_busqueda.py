@@ -0,0 +1,26 @@
+# ======================================================
+# Comando: reindexar_busqueda
+# - Reconstruye el índice de búsqueda de productos
+# - Útil después de cargas masivas que no disparan señales
+# ======================================================
+import time
+
+from django.core.management.base import BaseCommand
+
+from productos import busqueda
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de productos (FTS5 / tsvector)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help="Productos por lote.")
+
+    def handle(self, *args, **options):
+        if not busqueda.indice_disponible():
+            self.stderr.write("El motor de base de datos no tiene índice de búsqueda; se usa icontains.")
+            return
+        inicio = time.perf_counter()
+        total = busqueda.reconstruir_indice(lote=options['lote'])
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f"{total} productos indexados en {duracion:.2f}s"))
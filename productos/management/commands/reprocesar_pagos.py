@@ -0,0 +1,42 @@
+# ======================================================
+# Comando: reprocesar_pagos
+# - Replay de notificaciones del webhook de Mercado Pago
+# - Vuelve a consultar los pagos y a crear los pedidos que falten
+#   (sigue siendo idempotente: nunca duplica un pedido)
+# Uso:
+#   python manage.py reprocesar_pagos --pagos 123456 123457
+#   python manage.py reprocesar_pagos --desde 500 --hasta 800
+# ======================================================
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import pagos, webhooks
+from productos.models import NotificacionPago
+
+
+class Command(BaseCommand):
+    help = "Reprocesa pagos puntuales o un rango de notificaciones de la bandeja."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pagos', nargs='+', help="Ids de pago de Mercado Pago.")
+        parser.add_argument('--desde', type=int, help="Id de notificación inicial (inclusive).")
+        parser.add_argument('--hasta', type=int, help="Id de notificación final (inclusive).")
+
+    def handle(self, *args, **options):
+        if options['pagos']:
+            pago_ids = options['pagos']
+        elif options['desde'] is not None or options['hasta'] is not None:
+            notificaciones = NotificacionPago.objects.filter(tipo='payment')
+            if options['desde'] is not None:
+                notificaciones = notificaciones.filter(id__gte=options['desde'])
+            if options['hasta'] is not None:
+                notificaciones = notificaciones.filter(id__lte=options['hasta'])
+            pago_ids = list(notificaciones.order_by('id').values_list('pago_id', flat=True))
+        else:
+            raise CommandError("Indicá --pagos o --desde/--hasta.")
+
+        try:
+            resumen = webhooks.procesar_pagos(pago_ids, forzar=True)
+        except pagos.PasarelaNoDisponible as e:
+            raise CommandError(str(e))
+        detalle = ', '.join(f"{n} {resultado}" for resultado, n in sorted(resumen.items())) or 'ninguno'
+        self.stdout.write(self.style.SUCCESS(f"Pagos reprocesados: {detalle}"))
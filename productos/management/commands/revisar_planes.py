@@ -0,0 +1,43 @@
+# ======================================================
+# Comando: revisar_planes
+# - Corre EXPLAIN sobre las consultas críticas (ver planes.py) en la
+#   base configurada y falla si alguna recorre una tabla (o un
+#   índice) entera o resuelve parte del ORDER BY fuera del índice
+# - Sirve para chequear una base real (p. ej. PostgreSQL de producción)
+#   después de migrar; los tests hacen lo mismo sobre la base de test
+# Uso:
+#   python manage.py revisar_planes
+#   python manage.py revisar_planes --consultas historial_pedidos lineas_carrito -v 2
+# ======================================================
+from django.core.management.base import BaseCommand, CommandError
+
+from productos import planes
+
+
+class Command(BaseCommand):
+    help = "Verifica que las consultas críticas usen índices (EXPLAIN) en la base actual."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consultas', nargs='+', choices=sorted(planes.CONSULTAS),
+                            help="Solo estas consultas (por defecto todas).")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        try:
+            resultado = planes.revisar(options['database'], options['consultas'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        fallidas = []
+        for nombre, (plan, problemas) in resultado.items():
+            if problemas:
+                fallidas.append(nombre)
+                self.stdout.write(self.style.ERROR(f"{nombre}: {'; '.join(problemas)}"))
+            else:
+                self.stdout.write(f"{nombre}: OK")
+            if problemas or options['verbosity'] > 1:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        if fallidas:
+            raise CommandError(f"{len(fallidas)} consulta(s) sin índice: {', '.join(fallidas)}")
+        self.stdout.write(self.style.SUCCESS(f"{len(resultado)} consultas usan índices."))
@@ -0,0 +1,40 @@
+# ======================================================
+# Comando: volcar_carritos
+# - Write-behind de los carritos en modo caché (CARRITO_MODO='cache'):
+#   escribe en carritos_productos los que tienen cambios sin volcar
+# Uso: python manage.py volcar_carritos [--antiguedad 60] [--una-vez]
+# (necesita la misma caché compartida que los procesos web)
+# ======================================================
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from productos import carritos
+
+
+class Command(BaseCommand):
+    help = "Vuelca a la base los carritos cacheados con cambios pendientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--antiguedad', type=float, default=60.0,
+                            help="Solo vuelca carritos con cambios de hace más de estos segundos.")
+        parser.add_argument('--espera', type=float, default=30.0, help="Segundos entre vueltas.")
+        parser.add_argument('--una-vez', action='store_true',
+                            help="Hace una sola vuelta y termina (útil para cron o tests).")
+
+    def handle(self, *args, **options):
+        if carritos.modo() != carritos.MODO_CACHE:
+            self.stdout.write("CARRITO_MODO no es 'cache': no hay carritos para volcar.")
+            return
+        volcados = 0
+        try:
+            while True:
+                volcados += carritos.volcar_pendientes(options['antiguedad'])
+                if options['una_vez']:
+                    break
+                close_old_connections()
+                time.sleep(options['espera'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"{volcados} carritos volcados"))
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from productos import busqueda
+
+
+def crear_indice(apps, schema_editor):
+    busqueda.crear_indice(schema_editor)
+    busqueda.reconstruir_indice(apps.get_model('productos', 'Producto'), schema_editor.connection.alias)
+
+
+def eliminar_indice(apps, schema_editor):
+    busqueda.eliminar_indice(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0007_alter_producto_imagen_alter_productoimagen_imagen'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import migrations, models
+
+from productos.secuencias import SECUENCIA_PEDIDOS, valor_inicial
+
+
+def inicializar(apps, schema_editor):
+    using = schema_editor.connection.alias
+    ultimo = valor_inicial(using, apps.get_model('productos', 'Pedido'))
+    apps.get_model('productos', 'Secuencia').objects.using(using).create(nombre='pedido', valor=ultimo)
+    if schema_editor.connection.vendor == 'postgresql':
+        # CACHE: cada sesión (worker) reserva un bloque de números en memoria
+        cache = max(1, settings.PEDIDOS_BLOQUE_NUMEROS)
+        schema_editor.execute(f"CREATE SEQUENCE {SECUENCIA_PEDIDOS} START WITH {ultimo + 1} CACHE {cache}")
+
+
+def eliminar(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SECUENCIA_PEDIDOS}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_producto_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia (numeración interna)',
+                'verbose_name_plural': 'Secuencias (numeración interna)',
+                'db_table': 'secuencias',
+            },
+        ),
+        migrations.RunPython(inicializar, eliminar),
+    ]
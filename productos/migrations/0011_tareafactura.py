@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0010_secuencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaFactura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('terminada', 'Terminada'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('pdf_url', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('actualizada', models.DateTimeField(auto_now=True)),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tareas_factura', to='productos.pedido')),
+            ],
+            options={
+                'verbose_name': 'Tarea de factura (PDF en cola)',
+                'verbose_name_plural': 'Tareas de facturas (PDFs en cola)',
+                'db_table': 'tareas_facturas',
+                'indexes': [models.Index(fields=['estado', 'id'], name='tareas_facturas_estado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from productos import similares
+
+
+def calcular_similares(apps, schema_editor):
+    similares.reconstruir(
+        apps.get_model('productos', 'Producto'),
+        apps.get_model('productos', 'ProductoSimilar'),
+        schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_imagen_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puntaje', models.FloatField()),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='productos.producto')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_de', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Producto similar (precalculado)',
+                'verbose_name_plural': 'Productos similares (precalculados)',
+                'db_table': 'productos_similares',
+                'indexes': [models.Index(fields=['producto', 'posicion'], name='productos_similares_pos_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'similar'), name='productos_similares_unico')],
+            },
+        ),
+        migrations.RunPython(calcular_similares, migrations.RunPython.noop),
+    ]
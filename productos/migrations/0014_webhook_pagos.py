@@ -0,0 +1,66 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_producto_similar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(blank=True, max_length=30)),
+                ('pago_id', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('cuerpo', models.TextField(blank=True)),
+                ('recibida', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Notificación de pago (webhook)',
+                'verbose_name_plural': 'Notificaciones de pago (webhook)',
+                'db_table': 'notificaciones_pago',
+            },
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='referencia_pago',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='IntentoPago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('referencia', models.CharField(max_length=64, unique=True)),
+                ('direccion_envio', models.CharField(blank=True, max_length=255)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Intento de pago (checkout iniciado)',
+                'verbose_name_plural': 'Intentos de pago (checkouts iniciados)',
+                'db_table': 'intentos_pago',
+            },
+        ),
+        migrations.CreateModel(
+            name='PagoProcesado',
+            fields=[
+                ('pago_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('referencia', models.CharField(blank=True, max_length=64)),
+                ('estado', models.CharField(max_length=30)),
+                ('detalle', models.CharField(blank=True, max_length=255)),
+                ('procesado', models.DateTimeField(auto_now_add=True)),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='productos.pedido')),
+            ],
+            options={
+                'verbose_name': 'Pago procesado (Mercado Pago)',
+                'verbose_name_plural': 'Pagos procesados (Mercado Pago)',
+                'db_table': 'pagos_procesados',
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0015_producto_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(unique=True)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Venta diaria (reporte)',
+                'verbose_name_plural': 'Ventas diarias (reporte)',
+                'db_table': 'ventas_diarias',
+                'ordering': ['-dia'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiariaCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('categoria', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='productos.categoria')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria por categoría',
+                'verbose_name_plural': 'Ventas diarias por categoría',
+                'db_table': 'ventas_diarias_categorias',
+                'constraints': [models.UniqueConstraint(fields=('dia', 'categoria'), name='ventas_dia_categoria_uniq'), models.UniqueConstraint(condition=models.Q(('categoria__isnull', True)), fields=('dia',), name='ventas_dia_sin_categoria_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiariaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria por producto',
+                'verbose_name_plural': 'Ventas diarias por producto',
+                'db_table': 'ventas_diarias_productos',
+                'constraints': [models.UniqueConstraint(fields=('dia', 'producto'), name='ventas_dia_producto_uniq')],
+            },
+        ),
+    ]
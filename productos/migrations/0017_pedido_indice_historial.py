@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0016_ventas_diarias'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['usuario', 'fecha', 'id'], name='pedidos_usuario_fecha_idx'),
+        ),
+    ]
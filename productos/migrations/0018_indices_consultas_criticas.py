@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def fusionar_lineas_repetidas(apps, schema_editor):
+    """Antes de la restricción única: las líneas repetidas de un carrito se suman en la más vieja."""
+    using = schema_editor.connection.alias
+    CarritoProducto = apps.get_model('productos', 'CarritoProducto')
+    repetidas = (
+        CarritoProducto.objects.using(using).values('carrito_id', 'producto_id')
+        .annotate(lineas=Count('id'), primera=Min('id'), total=Sum('cantidad'))
+        .filter(lineas__gt=1).order_by()
+    )
+    for grupo in repetidas:
+        lineas = CarritoProducto.objects.using(using).filter(
+            carrito_id=grupo['carrito_id'], producto_id=grupo['producto_id'],
+        )
+        lineas.filter(id=grupo['primera']).update(cantidad=grupo['total'])
+        lineas.exclude(id=grupo['primera']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0017_pedido_indice_historial'),
+    ]
+
+    # Primero se crean los índices nuevos y después se quitan los de los FK
+    # que quedan cubiertos, así ninguna consulta se queda sin índice
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'id'], name='productos_cat_id_idx'),
+        ),
+        migrations.RunPython(fusionar_lineas_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='carritoproducto',
+            constraint=models.UniqueConstraint(fields=('carrito', 'producto'), name='carritos_productos_unico'),
+        ),
+        migrations.AlterField(
+            model_name='carritoproducto',
+            name='carrito',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='productos.carrito'),
+        ),
+        migrations.AlterField(
+            model_name='pedido',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='categoria',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='productos', to='productos.categoria'),
+        ),
+    ]
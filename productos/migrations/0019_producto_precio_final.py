@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:56
+
+import django.db.models.expressions
+import django.db.models.functions.math
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0018_indices_consultas_criticas'),
+    ]
+
+    # El valor lo calcula la base al agregar la columna (y en cada INSERT/UPDATE);
+    # los índices por precio de lista se quitan recién cuando están los nuevos
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='precio_final',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('precio'), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', models.F('descuento'))), '*', models.Value(Decimal('0.01'))), 2), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['precio_final', 'id'], name='productos_precio_final_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'precio_final', 'id'], name='productos_cat_final_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='productos_precio_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='productos_cat_precio_idx',
+        ),
+    ]
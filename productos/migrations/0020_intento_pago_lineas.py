@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0019_producto_precio_final'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='intentopago',
+            name='total',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.CreateModel(
+            name='IntentoPagoProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('intento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='productos.intentopago')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Producto en intento de pago',
+                'verbose_name_plural': 'Productos en intentos de pago',
+                'db_table': 'intentos_pago_productos',
+            },
+        ),
+    ]
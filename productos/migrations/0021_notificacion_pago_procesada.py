@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+def marcar_leidas(apps, schema_editor):
+    """Lo que el cursor anterior (Secuencia 'notificaciones_pago') ya había pasado queda procesado."""
+    using = schema_editor.connection.alias
+    cursor = apps.get_model('productos', 'Secuencia').objects.using(using).filter(nombre='notificaciones_pago').first()
+    if cursor is not None:
+        apps.get_model('productos', 'NotificacionPago').objects.using(using).filter(
+            id__lte=cursor.valor,
+        ).update(procesada=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0020_intento_pago_lineas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacionpago',
+            name='procesada',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='notificacionpago',
+            name='tomada',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notificacionpago',
+            index=models.Index(fields=['procesada', 'id'], name='notif_pago_procesada_idx'),
+        ),
+        migrations.RunPython(marcar_leidas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:57
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fechar_tomadas(apps, schema_editor):
+    """Las tareas en proceso antes de esta migración se tomaron cuando se actualizaron por última vez."""
+    apps.get_model('productos', 'TareaFactura').objects.using(schema_editor.connection.alias).filter(
+        estado='en_proceso',
+    ).update(tomada=F('actualizada'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0021_notificacion_pago_procesada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tareafactura',
+            name='tomada',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fechar_tomadas, migrations.RunPython.noop),
+    ]
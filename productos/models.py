@@ -1,11 +1,42 @@
 # ======================================================
 # Imports necesarios para modelos de Django
 # ======================================================
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Round
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 
 
+# ======================================================
+# Expresiones SQL reutilizables
+# ======================================================
+CENTAVOS = Decimal('0.01')
+
+
+def centavos(valor):
+    """Normaliza importes calculados en SQL (SQLite los devuelve como float)."""
+    return Decimal(valor or 0).quantize(CENTAVOS)
+
+
+def _precio_final():
+    """Precio con descuento redondeado a centavos: expresión de la columna Producto.precio_final."""
+    # Se multiplica por 0.01 en vez de dividir por 100: en SQLite un precio entero
+    # (guardado como 99) dividido por un entero daría división entera
+    return Round(F('precio') * (Value(100) - F('descuento')) * Value(Decimal('0.01')), 2)
+
+
+def precio_con_descuento_sql(prefijo=''):
+    """
+    Precio con descuento en SQL (la columna generada Producto.precio_final),
+    igual que se guarda en PedidoProducto.precio_unitario.
+    `prefijo` permite usarlo a través de relaciones, ej: 'producto__'.
+    """
+    return ExpressionWrapper(F(f'{prefijo}precio_final'), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
 # ======================================================
 # Modelo Categoria
 # - Representa categorías para organizar productos
@@ -28,24 +59,39 @@ class Categoria(models.Model):
 # - Representa un producto con precio, stock, descuento
 # - Relación con Categoria
 # - Permite calcular precio con descuento y ahorro
+# - precio_final: precio con descuento calculado y guardado por la
+#   base (columna generada), para ordenar y filtrar en SQL
 # ======================================================
 class Producto(models.Model):
+    # Código del proveedor: clave de la importación masiva (ver carga_catalogo.py)
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True)
     nombre = models.CharField(max_length=200)
     descripcion = models.TextField()
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     descuento = models.PositiveIntegerField(default=0)
     stock = models.PositiveIntegerField(default=0)
+    # La base lo recalcula al cambiar precio o descuento (también en bulk_create/update)
+    precio_final = models.GeneratedField(
+        expression=_precio_final(),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
     imagen = models.ImageField(upload_to="img_productos/", blank=True, null=True)
+    # Hash del contenido de la imagen: ubica sus derivadas (ver imagenes.py)
+    imagen_hash = models.CharField(max_length=20, blank=True, editable=False)
     categoria = models.ForeignKey(
         Categoria,
         on_delete=models.CASCADE,
         related_name="productos",
         null=True,
-        blank=True
+        blank=True,
+        db_index=False,  # Lo cubre productos_cat_id_idx (categoria, id)
     )
 
     @property
     def precio_con_descuento(self):
+        # Para objetos en memoria: después de save() precio_final queda con el valor
+        # anterior hasta refresh_from_db(). Lo leído de la base trae precio_final.
         return self.precio - (self.precio * self.descuento / 100) if self.descuento else self.precio
 
     @property
@@ -59,6 +105,14 @@ class Producto(models.Model):
         db_table = 'productos'
         verbose_name = "Producto (artículo a la venta)"
         verbose_name_plural = "Productos (artículos a la venta)"
+        # Índices para la paginación por cursor del catálogo (orden + id de desempate)
+        indexes = [
+            models.Index(fields=['categoria', 'id'], name='productos_cat_id_idx'),
+            models.Index(fields=['precio_final', 'id'], name='productos_precio_final_idx'),
+            models.Index(fields=['nombre', 'id'], name='productos_nombre_id_idx'),
+            models.Index(fields=['categoria', 'precio_final', 'id'], name='productos_cat_final_idx'),
+            models.Index(fields=['categoria', 'nombre', 'id'], name='productos_cat_nombre_idx'),
+        ]
 
 
 # ======================================================
@@ -68,6 +122,7 @@ class Producto(models.Model):
 class ProductoImagen(models.Model):
     producto = models.ForeignKey(Producto, related_name="imagenes", on_delete=models.CASCADE)
     imagen = models.ImageField(upload_to='img_productos/', blank=True, null=True)
+    imagen_hash = models.CharField(max_length=20, blank=True, editable=False)
 
     def __str__(self):
         return f"Imagen de {self.producto.nombre}"
@@ -78,6 +133,30 @@ class ProductoImagen(models.Model):
         verbose_name_plural = "Imágenes de Productos"
 
 
+# ======================================================
+# Modelo ProductoSimilar
+# - Productos similares precalculados (ver similares.py)
+# - La vista de detalle los lee con una sola consulta indexada
+# ======================================================
+class ProductoSimilar(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='similares')
+    similar = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='similar_de')
+    puntaje = models.FloatField()
+    posicion = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"{self.similar.nombre} similar a {self.producto.nombre} ({self.puntaje:.2f})"
+
+    class Meta:
+        db_table = 'productos_similares'
+        verbose_name = "Producto similar (precalculado)"
+        verbose_name_plural = "Productos similares (precalculados)"
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'similar'], name='productos_similares_unico'),
+        ]
+        indexes = [models.Index(fields=['producto', 'posicion'], name='productos_similares_pos_idx')]
+
+
 # ======================================================
 # Modelo Carrito
 # - Representa el carrito de un usuario
@@ -89,11 +168,30 @@ class Carrito(models.Model):
     productos = models.ManyToManyField(Producto, through='CarritoProducto', blank=True)
     creado = models.DateTimeField(auto_now_add=True)
 
+    def lineas(self):
+        """Líneas del carrito con producto e importes ya resueltos (una sola consulta)."""
+        lineas = list(self.carritoproducto_set.con_importes().order_by('id'))
+        for linea in lineas:
+            linea.precio_unitario = centavos(linea.precio_unitario)
+            linea.importe = centavos(linea.importe)
+        return lineas
+
     def total(self):
-        return sum(item.subtotal() for item in self.carritoproducto_set.all())
+        """Total con descuentos calculado en la base con un único agregado."""
+        total = self.carritoproducto_set.aggregate(
+            total=Sum(
+                F('cantidad') * precio_con_descuento_sql('producto__'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )['total']
+        return centavos(total)
 
     def __str__(self):
-        return f"Carrito de {self.usuario.username} ({self.carritoproducto_set.count()} productos)"
+        # El admin anota `cantidad_lineas` para no contar carrito por carrito
+        cantidad = getattr(self, 'cantidad_lineas', None)
+        if cantidad is None:
+            cantidad = self.carritoproducto_set.count()
+        return f"Carrito de {self.usuario.username} ({cantidad} productos)"
 
     class Meta:
         db_table = 'carritos_usuarios'
@@ -106,11 +204,29 @@ class Carrito(models.Model):
 # - Intermedia entre Carrito y Producto
 # - Almacena cantidad y calcula subtotal
 # ======================================================
+class CarritoProductoQuerySet(models.QuerySet):
+    def con_importes(self):
+        """
+        Trae el producto en el mismo JOIN y anota 'precio_unitario' (con descuento)
+        e 'importe' (precio_unitario * cantidad) calculados en SQL.
+        """
+        return self.select_related('producto').annotate(
+            precio_unitario=precio_con_descuento_sql('producto__'),
+        ).annotate(
+            importe=ExpressionWrapper(
+                F('precio_unitario') * F('cantidad'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+
 class CarritoProducto(models.Model):
-    carrito = models.ForeignKey('Carrito', on_delete=models.CASCADE)
+    carrito = models.ForeignKey('Carrito', on_delete=models.CASCADE, db_index=False)  # Lo cubre la restricción única
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=1)
 
+    objects = CarritoProductoQuerySet.as_manager()
+
     def subtotal(self):
         return self.producto.precio_con_descuento * self.cantidad
 
@@ -121,27 +237,34 @@ class CarritoProducto(models.Model):
         db_table = 'carritos_productos'
         verbose_name = "Producto en Carrito (contenido del carrito)"
         verbose_name_plural = "Productos en Carrito (contenido del carrito)"
+        # Una línea por producto: respalda el get_or_create de carritos.py y
+        # sirve de índice para las líneas de un carrito
+        constraints = [
+            models.UniqueConstraint(fields=['carrito', 'producto'], name='carritos_productos_unico'),
+        ]
 
 
 # ======================================================
 # Modelo Pedido
 # - Representa un pedido realizado por un usuario
 # - Relación ManyToMany con Producto a través de PedidoProducto
-# - Calcula número de pedido secuencial
+# - Número de pedido secuencial asignado por secuencias.py
 # ======================================================
 class Pedido(models.Model):
-    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)  # Ver índices
     fecha = models.DateTimeField(auto_now_add=True)
     total = models.DecimalField(max_digits=10, decimal_places=2)
     productos = models.ManyToManyField('Producto', through='PedidoProducto')
     direccion_envio = models.CharField(max_length=255, blank=True, null=True)
     pagado = models.BooleanField(default=False)
     numero_pedido = models.PositiveIntegerField(unique=True, blank=True, null=True)
+    # external_reference del checkout de Mercado Pago: un pedido por pago
+    referencia_pago = models.CharField(max_length=64, unique=True, blank=True, null=True)
 
     def save(self, *args, **kwargs):
         if not self.numero_pedido:
-            ultimo = Pedido.objects.order_by('-numero_pedido').first()
-            self.numero_pedido = (ultimo.numero_pedido + 1) if ultimo and ultimo.numero_pedido else 1
+            from .secuencias import siguiente_numero_pedido
+            self.numero_pedido = siguiente_numero_pedido()
         super().save(*args, **kwargs)
 
     def numero_pedido_formateado(self):
@@ -154,6 +277,11 @@ class Pedido(models.Model):
         db_table = 'pedidos_usuarios'
         verbose_name = "Pedido (compra confirmada)"
         verbose_name_plural = "Pedidos (compras confirmadas)"
+        # Historial de cada usuario paginado por cursor (fecha, id); cubre también
+        # el filtro por usuario (el FK no tiene índice propio)
+        indexes = [
+            models.Index(fields=['usuario', 'fecha', 'id'], name='pedidos_usuario_fecha_idx'),
+        ]
 
 
 # ======================================================
@@ -179,6 +307,212 @@ class PedidoProducto(models.Model):
         verbose_name_plural = "Productos en Pedido (contenido del pedido)"
 
 
+# ======================================================
+# Modelo TareaFactura
+# - Cola en la base de facturas PDF pendientes de generar
+# - La procesa el comando `procesar_facturas` (fuera del request)
+# ======================================================
+class TareaFactura(models.Model):
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    TERMINADA = 'terminada'
+    ERROR = 'error'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (TERMINADA, 'Terminada'),
+        (ERROR, 'Error'),
+    ]
+
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='tareas_factura')
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)   # se cuenta al tomarla
+    pdf_url = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    tomada = models.DateTimeField(null=True, blank=True)   # cuándo la tomó un worker
+    creada = models.DateTimeField(auto_now_add=True)
+    actualizada = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Factura de {self.pedido} ({self.estado})"
+
+    class Meta:
+        db_table = 'tareas_facturas'
+        verbose_name = "Tarea de factura (PDF en cola)"
+        verbose_name_plural = "Tareas de facturas (PDFs en cola)"
+        indexes = [models.Index(fields=['estado', 'id'], name='tareas_facturas_estado_idx')]
+
+
+# ======================================================
+# Modelo IntentoPago
+# - Se crea en el checkout con el external_reference enviado a
+#   Mercado Pago: permite armar el pedido aunque el usuario no
+#   vuelva al sitio (lo hace el webhook)
+# - Guarda lo que se mandó a cobrar (total y líneas): el pedido se
+#   arma con eso aunque el carrito cambie antes de la aprobación
+# ======================================================
+class IntentoPago(models.Model):
+    referencia = models.CharField(max_length=64, unique=True)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    direccion_envio = models.CharField(max_length=255, blank=True)
+    # None en los intentos anteriores a guardar las líneas (se arman del carrito)
+    total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.referencia} ({self.usuario.username})"
+
+    class Meta:
+        db_table = 'intentos_pago'
+        verbose_name = "Intento de pago (checkout iniciado)"
+        verbose_name_plural = "Intentos de pago (checkouts iniciados)"
+
+
+class IntentoPagoProducto(models.Model):
+    intento = models.ForeignKey(IntentoPago, on_delete=models.CASCADE, related_name='lineas')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    cantidad = models.PositiveIntegerField()
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto.nombre} ({self.intento.referencia})"
+
+    class Meta:
+        db_table = 'intentos_pago_productos'
+        verbose_name = "Producto en intento de pago"
+        verbose_name_plural = "Productos en intentos de pago"
+
+
+# ======================================================
+# Modelo NotificacionPago
+# - Bandeja de entrada del webhook de Mercado Pago: el endpoint
+#   solo inserta; el worker las toma (tomada) y las marca como
+#   procesadas (ver webhooks.py)
+# ======================================================
+class NotificacionPago(models.Model):
+    tipo = models.CharField(max_length=30, blank=True)
+    pago_id = models.CharField(max_length=64, blank=True, db_index=True)
+    cuerpo = models.TextField(blank=True)
+    recibida = models.DateTimeField(auto_now_add=True)
+    procesada = models.BooleanField(default=False)
+    # Cuándo la tomó un worker; si se cae, vuelve a la bandeja pasado webhooks.VENCIMIENTO
+    tomada = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Notificación {self.id}: {self.tipo} {self.pago_id}"
+
+    class Meta:
+        db_table = 'notificaciones_pago'
+        verbose_name = "Notificación de pago (webhook)"
+        verbose_name_plural = "Notificaciones de pago (webhook)"
+        indexes = [models.Index(fields=['procesada', 'id'], name='notif_pago_procesada_idx')]
+
+
+# ======================================================
+# Modelo PagoProcesado
+# - Pagos ya resueltos por el worker (aprobados o rechazados):
+#   las notificaciones repetidas del mismo pago se descartan
+# ======================================================
+class PagoProcesado(models.Model):
+    pago_id = models.CharField(max_length=64, primary_key=True)
+    referencia = models.CharField(max_length=64, blank=True)
+    estado = models.CharField(max_length=30)
+    pedido = models.ForeignKey(Pedido, on_delete=models.SET_NULL, null=True, blank=True)
+    detalle = models.CharField(max_length=255, blank=True)
+    procesado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pago {self.pago_id} ({self.estado})"
+
+    class Meta:
+        db_table = 'pagos_procesados'
+        verbose_name = "Pago procesado (Mercado Pago)"
+        verbose_name_plural = "Pagos procesados (Mercado Pago)"
+
+
+# ======================================================
+# Modelo Secuencia
+# - Contador con nombre para numeraciones (ej: número de pedido)
+# - En PostgreSQL se usa una SEQUENCE nativa en su lugar
+# ======================================================
+class Secuencia(models.Model):
+    nombre = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+    class Meta:
+        db_table = 'secuencias'
+        verbose_name = "Secuencia (numeración interna)"
+        verbose_name_plural = "Secuencias (numeración interna)"
+
+
+# ======================================================
+# Agregados de ventas por día (ver ventas.py)
+# - Se suman al crear cada pedido, en su misma transacción
+# - `reconstruir_ventas` los recalcula desde los pedidos
+# - El reporte del admin lee solo estas tablas
+# ======================================================
+class VentaDiaria(models.Model):
+    dia = models.DateField(unique=True)
+    pedidos = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Ventas del {self.dia}: ${self.ingresos}"
+
+    class Meta:
+        db_table = 'ventas_diarias'
+        ordering = ['-dia']
+        verbose_name = "Venta diaria (reporte)"
+        verbose_name_plural = "Ventas diarias (reporte)"
+
+
+class VentaDiariaProducto(models.Model):
+    dia = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='ventas_diarias')
+    pedidos = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.producto_id} el {self.dia}: {self.unidades} u."
+
+    class Meta:
+        db_table = 'ventas_diarias_productos'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'producto'], name='ventas_dia_producto_uniq'),
+        ]
+        verbose_name = "Venta diaria por producto"
+        verbose_name_plural = "Ventas diarias por producto"
+
+
+class VentaDiariaCategoria(models.Model):
+    dia = models.DateField()
+    # NULL = productos sin categoría
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, null=True, related_name='ventas_diarias')
+    pedidos = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.categoria_id or 'Sin categoría'} el {self.dia}: ${self.ingresos}"
+
+    class Meta:
+        db_table = 'ventas_diarias_categorias'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'categoria'], name='ventas_dia_categoria_uniq'),
+            # Un UNIQUE común admite varios NULL: la fila "sin categoría" se limita aparte
+            models.UniqueConstraint(
+                fields=['dia'], condition=models.Q(categoria__isnull=True), name='ventas_dia_sin_categoria_uniq',
+            ),
+        ]
+        verbose_name = "Venta diaria por categoría"
+        verbose_name_plural = "Ventas diarias por categoría"
+
+
 # ======================================================
 # Modelo Perfil
 # - Información adicional del usuario
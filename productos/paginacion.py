@@ -0,0 +1,172 @@
+# ======================================================
+# Paginación por cursor (keyset) para el catálogo y los historiales
+# - Nunca usa OFFSET: cada página filtra a partir de la última
+#   fila vista, así el costo no crece con la profundidad
+# - Orden estable: campo elegido + id como desempate, en la misma
+#   dirección (un orden descendente lo es también en el id)
+# - El filtro del cursor lleva una cota sobre el campo
+#   (campo >= v AND (campo > v OR id > pk)): así la base busca en el
+#   índice desde el cursor en lugar de recorrerlo desde el principio
+# ======================================================
+import base64
+import json
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+
+# orden -> (campo, descendente)
+ORDENES = {
+    'id': ('id', False),
+    'precio': ('precio_final', False),   # precio con descuento (columna generada)
+    'nombre': ('nombre', False),
+    'relevancia': ('relevancia', True),
+}
+
+# Historiales de pedidos: más nuevos primero (índice usuario, fecha, id)
+ORDENES_PEDIDOS = {
+    'fecha': ('fecha', True),
+}
+
+TAMANO_PAGINA = getattr(settings, 'CATALOGO_TAMANO_PAGINA', 24)
+TAMANO_PAGINA_MAX = getattr(settings, 'CATALOGO_TAMANO_PAGINA_MAX', 96)
+
+
+@dataclass
+class Pagina:
+    items: list
+    siguiente: str = None   # cursor de la página siguiente (None si no hay)
+    anterior: str = None    # cursor de la página anterior (None si no hay)
+
+
+def tamano_pagina(valor):
+    """Tamaño pedido por el usuario, acotado a [1, TAMANO_PAGINA_MAX]."""
+    try:
+        return max(1, min(int(valor), TAMANO_PAGINA_MAX))
+    except (TypeError, ValueError):
+        return TAMANO_PAGINA
+
+
+def codificar_cursor(direccion, valor, pk):
+    datos = json.dumps({'d': direccion, 'v': valor, 'id': pk}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (direccion, valor, pk) o None si el cursor es inválido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if datos['d'] not in ('s', 'a'):
+            return None
+        return datos['d'], datos['v'], int(datos['id'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _valor_del_cursor(queryset, campo, valor):
+    """
+    Convierte el valor del cursor al tipo del campo de orden (columna o
+    anotación). Lanza ValueError si no corresponde: cursor editado a mano.
+    """
+    if campo == 'id':
+        return valor
+    try:
+        anotacion = queryset.query.annotations.get(campo)
+        columna = anotacion.output_field if anotacion is not None else queryset.model._meta.get_field(campo)
+        # Las columnas generadas convierten con el tipo que guardan
+        columna = getattr(columna, 'output_field', columna)
+        convertido = columna.to_python(valor)
+    except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+        raise ValueError(f"Valor de cursor inválido para {campo}: {valor!r}")
+    if convertido is None:
+        raise ValueError(f"Valor de cursor vacío para {campo}")
+    return convertido
+
+
+def _mas_alla(campo, mayor, valor, pk):
+    """(campo, id) mayor (o menor) que (valor, pk), con la cota del campo adelante."""
+    estricto, cota = ('gt', 'gte') if mayor else ('lt', 'lte')
+    if campo == 'id':
+        return Q(**{f'id__{estricto}': pk})
+    return Q(**{f'{campo}__{cota}': valor}) & (
+        Q(**{f'{campo}__{estricto}': valor}) | Q(**{f'id__{estricto}': pk})
+    )
+
+
+def _despues_de(campo, descendente, valor, pk):
+    """Filas que van después de (valor, pk) en el orden (campo, id)."""
+    return _mas_alla(campo, not descendente, valor, pk)
+
+
+def _antes_de(campo, descendente, valor, pk):
+    return _mas_alla(campo, descendente, valor, pk)
+
+
+def _ordenamiento(campo, descendente, invertido=False):
+    # El id desempata en la misma dirección que el campo: así el orden es el
+    # del índice (campo, id), recorrido hacia adelante o hacia atrás
+    desc = descendente != invertido
+    if campo == 'id':
+        return ['-id' if desc else 'id']
+    primario = F(campo).desc() if desc else F(campo).asc()
+    return [primario, '-id' if desc else 'id']
+
+
+def _consulta(queryset, orden, cursor, tamano, ordenes):
+    """(queryset de la página con una fila de más, dirección, posición del cursor, campo)."""
+    campo, descendente = ordenes.get(orden) or ORDENES['id']
+    posicion = decodificar_cursor(cursor) if cursor else None
+    if posicion is not None:
+        try:
+            posicion = (posicion[0], _valor_del_cursor(queryset, campo, posicion[1]), posicion[2])
+        except ValueError:
+            posicion = None
+
+    if posicion is None:
+        return queryset.order_by(*_ordenamiento(campo, descendente))[:tamano + 1], 's', None, campo
+
+    direccion, valor, pk = posicion
+    if direccion == 's':
+        filtro = _despues_de(campo, descendente, valor, pk)
+        orden_sql = _ordenamiento(campo, descendente)
+    else:
+        filtro = _antes_de(campo, descendente, valor, pk)
+        orden_sql = _ordenamiento(campo, descendente, invertido=True)
+    return queryset.filter(filtro).order_by(*orden_sql)[:tamano + 1], direccion, posicion, campo
+
+
+def _armar(filas, direccion, posicion, campo, tamano):
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    if direccion == 'a':
+        filas.reverse()
+
+    if not filas:
+        return Pagina(items=[])
+
+    primera, ultima = filas[0], filas[-1]
+    hay_siguiente = hay_mas if direccion == 's' else True
+    hay_anterior = hay_mas if direccion == 'a' else posicion is not None
+    return Pagina(
+        items=filas,
+        siguiente=codificar_cursor('s', getattr(ultima, campo), ultima.pk) if hay_siguiente else None,
+        anterior=codificar_cursor('a', getattr(primera, campo), primera.pk) if hay_anterior else None,
+    )
+
+
+def paginar(queryset, orden='id', cursor=None, tamano=TAMANO_PAGINA, ordenes=ORDENES):
+    """
+    Devuelve una Pagina de `tamano` elementos del queryset ordenado por `orden`
+    (una clave de `ordenes`), a partir del cursor recibido. Se pide una fila de
+    más para saber si hay otra página en la dirección recorrida.
+    """
+    consulta, *resto = _consulta(queryset, orden, cursor, tamano, ordenes)
+    return _armar(list(consulta), *resto, tamano)
+
+
+async def apaginar(queryset, orden='id', cursor=None, tamano=TAMANO_PAGINA, ordenes=ORDENES):
+    """paginar() con el ORM async (vistas async)."""
+    consulta, *resto = _consulta(queryset, orden, cursor, tamano, ordenes)
+    return _armar([fila async for fila in consulta], *resto, tamano)
@@ -0,0 +1,296 @@
+# ======================================================
+# Cliente de Mercado Pago
+# - Un único SDK por proceso con una sesión HTTP compartida
+#   (reutiliza conexiones keep-alive entre requests)
+# - Timeouts de conexión y lectura acotados (MP_TIMEOUT_*)
+# - Disyuntor (circuit breaker): tras varios fallos seguidos deja
+#   de llamar a la pasarela durante un rato y falla al instante,
+#   en vez de dejar workers colgados esperando
+# - items_preferencia(): arma los ítems del carrito con una consulta;
+#   items_de_lineas(): los mismos a partir de líneas ya leídas
+# - acrear_preferencia(): la misma llamada para las vistas async
+#   (ASGI) con httpx, sin bloquear el event loop mientras espera
+# ======================================================
+import asyncio
+import json
+import threading
+import time
+import weakref
+
+import httpx
+import mercadopago
+import requests
+from django.conf import settings
+from mercadopago.config import RequestOptions
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+
+from .instrumentacion import medir
+from .models import centavos, precio_con_descuento_sql
+
+URL_API_MP = 'https://api.mercadopago.com'
+
+
+class ErrorPago(Exception):
+    """La pasarela rechazó la operación o respondió algo inesperado."""
+
+
+class PasarelaNoDisponible(ErrorPago):
+    """Timeout, error de red o 5xx; o el disyuntor está abierto."""
+
+
+# ======================================================
+# Disyuntor
+# - cerrado: las llamadas pasan
+# - abierto: fallan al instante durante `espera` segundos
+# - después deja pasar una llamada de prueba: si anda se cierra,
+#   si falla vuelve a abrirse; si termina sin resultado (excepción
+#   inesperada, cancelación) se libera para la siguiente
+# ======================================================
+class Disyuntor:
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, umbral=5, espera=30.0):
+        self.umbral = umbral
+        self.espera = espera
+        self._lock = threading.Lock()
+        self._fallos = 0
+        self._abierto_desde = None
+        self._probando = False
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado()
+
+    def _estado(self):
+        if self._abierto_desde is None:
+            return self.CERRADO
+        if time.monotonic() - self._abierto_desde >= self.espera:
+            return self.SEMIABIERTO
+        return self.ABIERTO
+
+    def permitir(self):
+        """
+        Indica si se puede llamar ahora; en semiabierto deja pasar una sola
+        llamada. Devuelve el estado con el que se autorizó (o None), para terminar().
+        """
+        with self._lock:
+            estado = self._estado()
+            if estado == self.CERRADO:
+                return estado
+            if estado == self.SEMIABIERTO and not self._probando:
+                self._probando = True
+                return estado
+            return None
+
+    def terminar(self, permiso):
+        """Cierre de toda llamada autorizada: libera la prueba si no registró éxito ni fallo."""
+        if permiso == self.SEMIABIERTO:
+            with self._lock:
+                self._probando = False
+
+    def exito(self):
+        with self._lock:
+            self._fallos, self._abierto_desde, self._probando = 0, None, False
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self._probando or self._fallos >= self.umbral:
+                self._abierto_desde = time.monotonic()
+            self._probando = False
+
+
+# ======================================================
+# Transporte HTTP para el SDK
+# ======================================================
+class ClienteHttp(HttpClient):
+    """
+    Reemplaza al HttpClient del SDK (que abre una sesión por llamada):
+    sesión compartida, timeouts (conexión, lectura), sin reintentos
+    automáticos (un POST repetido puede duplicar la preferencia) y disyuntor.
+    """
+
+    def __init__(self, url_api=URL_API_MP, timeout=(3.0, 10.0), disyuntor=None, conexiones=10):
+        self.url_api = url_api.rstrip('/')
+        self.timeout = timeout
+        self.disyuntor = disyuntor or Disyuntor()
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=conexiones, max_retries=0)
+        self.sesion.mount('https://', adaptador)
+        self.sesion.mount('http://', adaptador)
+
+    def request(self, method, url, maxretries=None, retry_on=None, backoff_factor=None, **kwargs):
+        permiso = self.disyuntor.permitir()
+        if not permiso:
+            raise PasarelaNoDisponible("Mercado Pago no está respondiendo; se reintentará en unos segundos.")
+        if url.startswith(URL_API_MP):
+            url = self.url_api + url[len(URL_API_MP):]
+        kwargs['timeout'] = self.timeout
+        try:
+            try:
+                with medir('externo'):
+                    respuesta = self.sesion.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                self.disyuntor.fallo()
+                raise PasarelaNoDisponible(f"Error de conexión con Mercado Pago: {type(e).__name__}") from e
+            return self.interpretar(respuesta.status_code, respuesta.content, respuesta.json)
+        finally:
+            self.disyuntor.terminar(permiso)
+
+    def interpretar(self, estado, contenido, a_json):
+        """Resultado al estilo del SDK ({'status', 'response'}); 5xx y 429 cuentan como fallo."""
+        if estado >= 500 or estado == 429:
+            self.disyuntor.fallo()
+            raise PasarelaNoDisponible(f"Mercado Pago respondió {estado}")
+        self.disyuntor.exito()
+
+        resultado = {"status": estado, "response": None}
+        if estado != 204 and contenido:
+            try:
+                resultado["response"] = a_json()
+            except ValueError:
+                raise ErrorPago(f"Respuesta inválida de Mercado Pago ({estado})")
+        return resultado
+
+
+# ======================================================
+# SDK compartido
+# ======================================================
+_sdk = None
+_sdk_lock = threading.Lock()
+
+
+def sdk():
+    """SDK de Mercado Pago del proceso (se crea en el primer uso)."""
+    global _sdk
+    if _sdk is None:
+        with _sdk_lock:
+            if _sdk is None:
+                cliente = ClienteHttp(
+                    url_api=getattr(settings, 'MP_API_URL', URL_API_MP),
+                    timeout=(getattr(settings, 'MP_TIMEOUT_CONEXION', 3.0), getattr(settings, 'MP_TIMEOUT_LECTURA', 10.0)),
+                    disyuntor=Disyuntor(
+                        umbral=getattr(settings, 'MP_DISYUNTOR_FALLOS', 5),
+                        espera=getattr(settings, 'MP_DISYUNTOR_ESPERA', 30.0),
+                    ),
+                )
+                _sdk = mercadopago.SDK(
+                    settings.MP_ACCESS_TOKEN,
+                    http_client=cliente,
+                    request_options=RequestOptions(max_retries=0),
+                )
+    return _sdk
+
+
+def reiniciar():
+    """Descarta el SDK compartido (tests / cambio de configuración)."""
+    global _sdk
+    with _sdk_lock:
+        if _sdk is not None:
+            _sdk.http_client.sesion.close()
+        _sdk = None
+        # Los clientes async se cierran con su event loop
+        _clientes_async.clear()
+
+
+def _filas_preferencia(carrito):
+    return carrito.carritoproducto_set.annotate(
+        precio_unitario=precio_con_descuento_sql('producto__'),
+    ).order_by('id').values_list('producto__nombre', 'cantidad', 'precio_unitario')
+
+
+def _item(nombre, cantidad, precio_unitario):
+    return {
+        "title": nombre,
+        "quantity": cantidad,
+        "unit_price": float(centavos(precio_unitario)),
+        "currency_id": "ARS",
+    }
+
+
+def items_preferencia(carrito):
+    """Ítems de la preferencia de pago a partir del carrito, con una sola consulta."""
+    return [_item(*fila) for fila in _filas_preferencia(carrito)]
+
+
+def items_de_lineas(lineas):
+    """Ítems de la preferencia a partir de líneas ya leídas (Carrito.lineas())."""
+    return [_item(linea.producto.nombre, linea.cantidad, linea.precio_unitario) for linea in lineas]
+
+
+def _url_de_pago(respuesta):
+    preference = respuesta.get("response") or {}
+    url = preference.get("sandbox_init_point")
+    if not url:
+        raise ErrorPago(preference.get("cause") or preference.get("message") or respuesta.get("status"))
+    return url
+
+
+def crear_preferencia(datos):
+    """Crea la preferencia y devuelve la URL de pago (sandbox)."""
+    return _url_de_pago(sdk().preference().create(datos))
+
+
+def consultar_pago(pago_id):
+    """Estado, external_reference y monto (transaction_amount) de un pago, consultados a Mercado Pago."""
+    respuesta = sdk().payment().get(pago_id)
+    pago = respuesta.get("response") or {}
+    if respuesta.get("status") != 200:
+        raise ErrorPago(pago.get("message") or f"No se pudo consultar el pago {pago_id}")
+    monto = pago.get('transaction_amount')
+    return {
+        'estado': pago.get('status'),
+        'referencia': pago.get('external_reference') or '',
+        'monto': centavos(str(monto)) if monto is not None else None,
+    }
+
+
+# ======================================================
+# Cliente asíncrono (vistas async bajo ASGI)
+# - httpx.AsyncClient: mientras espera a Mercado Pago el worker sigue
+#   atendiendo otros requests
+# - Misma URL, headers, timeouts y disyuntor que el SDK compartido: si
+#   la pasarela falla, el disyuntor se abre para las dos vías
+# - Un cliente (con su pool de conexiones) por event loop
+# ======================================================
+_clientes_async = weakref.WeakKeyDictionary()
+
+
+def _cliente_async(http):
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_async.get(loop)
+    if cliente is None:
+        conexion, lectura = http.timeout
+        cliente = httpx.AsyncClient(timeout=httpx.Timeout(lectura, connect=conexion))
+        _clientes_async[loop] = cliente
+    return cliente
+
+
+async def _apost(ruta, datos):
+    mp = sdk()
+    http = mp.http_client
+    permiso = http.disyuntor.permitir()
+    if not permiso:
+        raise PasarelaNoDisponible("Mercado Pago no está respondiendo; se reintentará en unos segundos.")
+    headers = mp.request_options.get_headers()
+    headers['Content-type'] = 'application/json'
+    try:
+        try:
+            with medir('externo'):
+                respuesta = await _cliente_async(http).post(http.url_api + ruta, content=json.dumps(datos), headers=headers)
+        except httpx.HTTPError as e:
+            http.disyuntor.fallo()
+            raise PasarelaNoDisponible(f"Error de conexión con Mercado Pago: {type(e).__name__}") from e
+        return http.interpretar(respuesta.status_code, respuesta.content, respuesta.json)
+    finally:
+        # Cancelación o excepción inesperada durante la prueba: no dejarla tomada
+        http.disyuntor.terminar(permiso)
+
+
+async def acrear_preferencia(datos):
+    """crear_preferencia() sin bloquear el event loop."""
+    return _url_de_pago(await _apost('/checkout/preferences', datos))
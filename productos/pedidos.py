@@ -0,0 +1,167 @@
+# ======================================================
+# Alta de pedidos
+# - Convierte el carrito en un Pedido en una única transacción
+# - Descuenta stock con UPDATE condicional (nunca queda negativo)
+# - Idempotente por referencia de pago: el webhook y la vuelta del
+#   navegador pueden pedirlo los dos, se crea un solo pedido
+# - registrar_intento(): en el checkout guarda las líneas y el total
+#   que se mandan a cobrar; el pedido de ese pago se arma con esas
+#   líneas, no con lo que tenga el carrito cuando llega la aprobación
+# - Suma el pedido a los agregados de ventas (ventas.py)
+# - resumen_de(): cantidad y total de pedidos de un usuario, cacheado
+# ======================================================
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from . import carritos, ventas
+from .models import Carrito, IntentoPago, IntentoPagoProducto, Pedido, PedidoProducto, Producto
+from .secuencias import siguiente_numero_pedido
+
+
+class StockInsuficiente(Exception):
+    """No hay stock para cubrir una o más líneas del carrito."""
+
+    def __init__(self, productos):
+        self.productos = productos
+        nombres = ', '.join(p.nombre for p in productos)
+        super().__init__(f"Stock insuficiente para: {nombres}")
+
+
+class CarritoVacio(Exception):
+    pass
+
+
+class PedidoYaCreado(Exception):
+    """Ya existe el pedido de esa referencia de pago (queda en `pedido`)."""
+
+    def __init__(self, pedido):
+        self.pedido = pedido
+        super().__init__(f"El pago {pedido.referencia_pago} ya generó el pedido {pedido.numero_pedido_formateado()}")
+
+
+def registrar_intento(usuario, carrito, referencia, direccion_envio=''):
+    """
+    Crea el IntentoPago del checkout con las líneas del carrito (precios
+    ya con descuento) y su total. Devuelve (intento, líneas).
+    """
+    lineas = carrito.lineas()
+    with transaction.atomic():
+        intento = IntentoPago.objects.create(
+            referencia=referencia, usuario=usuario, direccion_envio=direccion_envio,
+            total=sum(linea.importe for linea in lineas),
+        )
+        IntentoPagoProducto.objects.bulk_create([
+            IntentoPagoProducto(
+                intento=intento, producto=linea.producto, cantidad=linea.cantidad,
+                precio_unitario=linea.precio_unitario,
+            )
+            for linea in lineas
+        ])
+    return intento, lineas
+
+
+def _lineas_del_intento(usuario, referencia_pago):
+    """Líneas guardadas en el checkout de ese pago, o None si no hay (intentos viejos)."""
+    if not referencia_pago:
+        return None
+    intento = IntentoPago.objects.filter(referencia=referencia_pago, usuario=usuario).first()
+    if intento is None or intento.total is None:
+        return None
+    lineas = list(intento.lineas.select_related('producto').order_by('id'))
+    for linea in lineas:
+        linea.importe = linea.precio_unitario * linea.cantidad
+    return lineas
+
+
+def crear_pedido_desde_carrito(usuario, direccion_envio='', referencia_pago=None):
+    """
+    Crea el Pedido y sus líneas a partir del carrito del usuario, descuenta
+    stock y vacía el carrito. Todo ocurre en una transacción: si alguna línea
+    no tiene stock suficiente se lanza StockInsuficiente y no se modifica nada.
+    Con `referencia_pago`, si ese pago ya tiene pedido se lanza PedidoYaCreado;
+    si su checkout guardó líneas, el pedido se arma con ellas y del carrito
+    solo se quitan esos productos.
+    """
+    # El número se asigna fuera de la transacción: si el pedido falla queda un
+    # hueco, pero el contador no queda bloqueado mientras se descuenta stock.
+    numero_pedido = siguiente_numero_pedido()
+    with transaction.atomic():
+        # Bloquea el carrito para que dos confirmaciones del mismo usuario se serialicen
+        carrito, _ = Carrito.objects.select_for_update().get_or_create(usuario=usuario)
+        # Con el carrito bloqueado, la otra vía (webhook / navegador) ya terminó o espera
+        if referencia_pago:
+            existente = Pedido.objects.filter(referencia_pago=referencia_pago).first()
+            if existente is not None:
+                raise PedidoYaCreado(existente)
+        del_intento = _lineas_del_intento(usuario, referencia_pago)
+        lineas = carrito.lineas() if del_intento is None else del_intento
+        if not lineas:
+            raise CarritoVacio()
+
+        # Orden de bloqueo consistente (por id de producto) para evitar deadlocks
+        # entre checkouts concurrentes que comparten productos.
+        sin_stock = []
+        for linea in sorted(lineas, key=lambda l: l.producto_id):
+            actualizados = Producto.objects.filter(
+                id=linea.producto_id, stock__gte=linea.cantidad
+            ).update(stock=F('stock') - linea.cantidad)
+            if not actualizados:
+                sin_stock.append(linea.producto)
+        if sin_stock:
+            raise StockInsuficiente(sin_stock)
+
+        pedido = Pedido.objects.create(
+            numero_pedido=numero_pedido,
+            usuario=usuario,
+            total=sum(linea.importe for linea in lineas),
+            pagado=True,
+            direccion_envio=direccion_envio,
+            referencia_pago=referencia_pago or None,
+        )
+        PedidoProducto.objects.bulk_create([
+            PedidoProducto(
+                pedido=pedido,
+                producto=linea.producto,
+                cantidad=linea.cantidad,
+                precio_unitario=linea.precio_unitario,
+            )
+            for linea in lineas
+        ])
+        comprados = carrito.carritoproducto_set.all()
+        if del_intento is not None:
+            # Lo que se agregó después del checkout (otra pestaña) queda en el carrito
+            comprados = comprados.filter(producto_id__in=[linea.producto_id for linea in lineas])
+        comprados.delete()
+        # Al final: las filas de agregados (compartidas entre pedidos) quedan bloqueadas lo menos posible
+        ventas.registrar_pedido(pedido, lineas)
+    # En modo caché la copia cacheada del carrito también quedó vieja
+    carritos.olvidar(usuario.pk)
+    return pedido
+
+
+# ======================================================
+# Resumen del historial de cada usuario (caché)
+# ======================================================
+def _clave_resumen(usuario_id):
+    return f'pedidos:resumen:{usuario_id}'
+
+
+def resumen_de(usuario):
+    """{'cantidad', 'total'} de los pedidos del usuario; cacheado hasta su próximo pedido."""
+    clave = _clave_resumen(usuario.pk)
+    resumen = cache.get(clave)
+    if resumen is None:
+        resumen = Pedido.objects.filter(usuario=usuario).aggregate(cantidad=Count('id'), total=Sum('total'))
+        resumen['total'] = resumen['total'] or 0
+        cache.set(clave, resumen, getattr(settings, 'PEDIDOS_RESUMEN_TIMEOUT', 3600))
+    return resumen
+
+
+def invalidar_resumen(usuario_id, using='default'):
+    """Se borra ya y otra vez al confirmar (igual que cache_catalogo.invalidar)."""
+    clave = _clave_resumen(usuario_id)
+    cache.delete(clave)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(clave), using=using)
@@ -0,0 +1,162 @@
+# ======================================================
+# Planes de ejecución de las consultas críticas
+# - CONSULTAS: las consultas de los caminos calientes (historial,
+#   catálogo por categoría, líneas del carrito, último número de
+#   pedido...), armadas igual que en el código que las usa (las
+#   páginas, con paginacion._consulta, primera y con cursor)
+# - plan(): EXPLAIN en la base actual (SQLite o PostgreSQL)
+# - recorridos_completos(): tablas que el plan recorre enteras, o
+#   cuyo índice recorre entero sin una cota; una consulta crítica
+#   que lo hace perdió su índice
+# - ordena_aparte(): el índice da solo una parte del ORDER BY y el
+#   resto se ordena en memoria (p. ej. desempate en otra dirección)
+# En PostgreSQL se desactiva el Seq Scan al explicar: con tablas chicas
+# (tests) el planificador lo elige aunque el índice exista; así solo
+# aparece cuando no hay índice utilizable.
+# Lo usan los tests (PlanesTests) y el comando `revisar_planes`.
+# ======================================================
+import re
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import paginacion
+from .models import CarritoProducto, Pedido, PedidoProducto, Producto, TareaFactura
+
+BASES_SOPORTADAS = ('sqlite', 'postgresql')
+
+
+def _maximo_numero_pedido(connection):
+    # secuencias.valor_inicial(): aggregate(Max) no es un queryset, se explica el SQL
+    tabla = connection.ops.quote_name(Pedido._meta.db_table)
+    return f"SELECT MAX({connection.ops.quote_name('numero_pedido')}) FROM {tabla}", ()
+
+
+def _pagina(queryset, orden, direccion=None, valor=None, ordenes=paginacion.ORDENES, tamano=paginacion.TAMANO_PAGINA):
+    """La consulta de una página como la arma paginar() (con cursor si se da `direccion`)."""
+    cursor = paginacion.codificar_cursor(direccion, valor, 100) if direccion else None
+    return paginacion._consulta(queryset, orden, cursor, tamano, ordenes)[0]
+
+
+def _historial(direccion=None):
+    return _pagina(
+        Pedido.objects.filter(usuario_id=1), 'fecha', direccion, timezone.now(), paginacion.ORDENES_PEDIDOS, 20,
+    )
+
+
+def _catalogo(orden, direccion=None, categoria=None):
+    productos = Producto.objects.filter(categoria_id=categoria) if categoria else Producto.objects.all()
+    # Valor de cursor de ejemplo para cada orden
+    valor = {'id': None, 'precio': '1000.00', 'nombre': 'M'}[orden]
+    return _pagina(productos, orden, direccion, valor)
+
+
+# nombre -> función(connection) que devuelve un queryset o (sql, params)
+CONSULTAS = {
+    'historial_pedidos': lambda c: _historial(),
+    'historial_pedidos_siguiente': lambda c: _historial('s'),
+    'historial_pedidos_anterior': lambda c: _historial('a'),
+    # Primera página de una categoría; con cursor, todo el catálogo en los dos sentidos
+    'catalogo_categoria': lambda c: _catalogo('id', categoria=1),
+    'catalogo_categoria_precio': lambda c: _catalogo('precio', categoria=1),
+    'catalogo_categoria_nombre': lambda c: _catalogo('nombre', categoria=1),
+    'catalogo_categoria_precio_siguiente': lambda c: _catalogo('precio', 's', categoria=1),
+    'catalogo_siguiente': lambda c: _catalogo('id', 's'),
+    'catalogo_anterior': lambda c: _catalogo('id', 'a'),
+    'catalogo_precio_siguiente': lambda c: _catalogo('precio', 's'),
+    'catalogo_precio_anterior': lambda c: _catalogo('precio', 'a'),
+    'catalogo_nombre_siguiente': lambda c: _catalogo('nombre', 's'),
+    'catalogo_nombre_anterior': lambda c: _catalogo('nombre', 'a'),
+    'catalogo_precio_rango': lambda c: _pagina(
+        Producto.objects.filter(precio_final__gte=1000, precio_final__lte=5000), 'precio',
+    ),
+    'catalogo_categoria_precio_rango': lambda c: _pagina(
+        Producto.objects.filter(categoria_id=1, precio_final__gte=1000, precio_final__lte=5000), 'precio',
+    ),
+    'linea_carrito': lambda c: CarritoProducto.objects.filter(carrito_id=1, producto_id=1),
+    'lineas_carrito': lambda c: CarritoProducto.objects.con_importes().filter(carrito_id=1).order_by('id'),
+    'ultimo_numero_pedido': _maximo_numero_pedido,
+    'pedido_por_numero': lambda c: Pedido.objects.filter(numero_pedido=1, usuario_id=1),
+    'pedido_por_referencia': lambda c: Pedido.objects.filter(referencia_pago='REF'),
+    'lineas_de_pedidos': lambda c: PedidoProducto.objects.filter(pedido_id__in=[1, 2, 3]).select_related('producto'),
+    'tareas_factura_pendientes': lambda c: TareaFactura.objects.filter(
+        estado=TareaFactura.PENDIENTE,
+    ).order_by('id')[:10],
+    'productos_del_pedido': lambda c: Producto.objects.filter(id__in=[1, 2, 3]).order_by('id'),
+}
+
+# SQLite: "SCAN tabla" (sin SEARCH) recorre la tabla o un índice entero
+# (con o sin USING INDEX: sin cota no hay búsqueda);
+# PostgreSQL: "Seq Scan on tabla", o un Index Scan sin "Index Cond"
+_RECORRIDOS = {
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT)"?(\w+)"?'),
+    'postgresql': re.compile(r'Seq Scan on "?(\w+)"?'),
+}
+_INDICE_POSTGRESQL = re.compile(r'Index (?:Only )?Scan (?:Backward )?using \S+ on "?(\w+)"?')
+
+# Parte del ORDER BY resuelta fuera del índice
+_ORDEN_APARTE = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF|LAST \d+ TERMS OF) ORDER BY'),
+    'postgresql': re.compile(r'Incremental Sort'),
+}
+
+
+def _indices_sin_cota(texto):
+    """Tablas de los Index Scan de PostgreSQL que no tienen Index Cond (recorren el índice entero)."""
+    tablas, abierto = [], None
+    for linea in texto.splitlines():
+        nodo = _INDICE_POSTGRESQL.search(linea)
+        if nodo or '->' in linea:
+            if abierto:
+                tablas.append(abierto)
+            abierto = nodo.group(1) if nodo else None
+        elif abierto and 'Index Cond' in linea:
+            abierto = None
+    if abierto:
+        tablas.append(abierto)
+    return tablas
+
+
+def plan(consulta, using='default'):
+    """Texto del EXPLAIN de la consulta (queryset o (sql, params))."""
+    connection = connections[using]
+    if hasattr(consulta, 'query'):
+        sql, params = consulta.query.get_compiler(using=using).as_sql()
+    else:
+        sql, params = consulta
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+        return '\n'.join(' '.join(str(columna) for columna in fila) for fila in cursor.fetchall())
+
+
+def recorridos_completos(texto, vendor):
+    tablas = _RECORRIDOS[vendor].findall(texto)
+    if vendor == 'postgresql':
+        tablas += _indices_sin_cota(texto)
+    return sorted(set(tablas))
+
+
+def ordena_aparte(texto, vendor):
+    return bool(_ORDEN_APARTE[vendor].search(texto))
+
+
+def problemas(texto, vendor):
+    """Descripción de lo que el plan hace mal (lista vacía si usa bien los índices)."""
+    encontrados = [f"recorre entera {tabla}" for tabla in recorridos_completos(texto, vendor)]
+    if ordena_aparte(texto, vendor):
+        encontrados.append("ordena aparte parte del ORDER BY")
+    return encontrados
+
+
+def revisar(using='default', nombres=None):
+    """{nombre: (plan, [problemas])} de las consultas críticas."""
+    connection = connections[using]
+    if connection.vendor not in BASES_SOPORTADAS:
+        raise ValueError(f"Base no soportada para revisar planes: {connection.vendor}")
+    resultado = {}
+    for nombre in nombres or CONSULTAS:
+        texto = plan(CONSULTAS[nombre](connection), using)
+        resultado[nombre] = (texto, problemas(texto, connection.vendor))
+    return resultado
@@ -0,0 +1,281 @@
+# ======================================================
+# Prueba de carga de punta a punta
+# - Cada usuario virtual (un hilo con su propio Client, logueado
+#   como un usuario "bench_") repite el recorrido de una compra:
+#   catálogo, búsqueda, detalle, agregar al carrito, checkout
+#   (contra una pasarela de pagos falsa local) y pago_aprobado
+# - Por paso: latencia p50/p95/p99, errores y consultas SQL por
+#   request; en total: requests por segundo
+# - ejecutar() devuelve un dict listo para guardar como JSON y
+#   comparar corridas (comando `benchmark_carga`)
+# Corre dentro del proceso (django.test.Client): mide vistas y base,
+# no el servidor HTTP. Los datos salen de datos_sinteticos.py.
+# ======================================================
+import contextlib
+import json
+import math
+import platform
+import random
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import busqueda, pagos
+from .datos_sinteticos import PREFIJO_SKU, PREFIJO_USUARIO
+from .models import Categoria, Producto, Usuario
+
+PASOS = ('catalogo', 'catalogo_categoria', 'busqueda', 'detalle', 'agregar', 'carrito', 'checkout', 'pago_aprobado')
+
+# Productos y términos de búsqueda que se sortean en cada recorrido
+MUESTRA_PRODUCTOS = 2000
+
+
+# ======================================================
+# Pasarela de pagos falsa
+# ======================================================
+class PasarelaFalsa(BaseHTTPRequestHandler):
+    """Crea preferencias (POST) y devuelve todo pago como aprobado (GET)."""
+    protocol_version = 'HTTP/1.1'
+    demora = 0.0  # segundos que tarda cada respuesta (latencia de la pasarela real)
+
+    def _responder(self, estado, cuerpo):
+        if self.demora:
+            time.sleep(self.demora)
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._responder(201, {'id': 'pref-bench', 'sandbox_init_point': 'https://sandbox.mp/checkout/pref-bench'})
+
+    def do_GET(self):
+        pago_id = self.path.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+        self._responder(200, {'id': pago_id, 'status': 'approved', 'external_reference': ''})
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def pasarela_falsa(demora=0.0):
+    """
+    Levanta la pasarela falsa y apunta el cliente de pagos a ella mientras
+    dura el bloque; devuelve su URL (para servidores en otro proceso).
+    """
+    manejador = type('PasarelaFalsa', (PasarelaFalsa,), {'demora': demora})
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    try:
+        with override_settings(MP_API_URL=url):
+            pagos.reiniciar()
+            yield url
+    finally:
+        pagos.reiniciar()
+        servidor.shutdown()
+        servidor.server_close()
+
+
+# ======================================================
+# Medición
+# ======================================================
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores ya ordenados)."""
+    if not valores:
+        return None
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+
+
+class Medidor:
+    def __init__(self, pasos=PASOS):
+        self._lock = threading.Lock()
+        self.muestras = {paso: [] for paso in pasos}
+
+    def registrar(self, paso, segundos, consultas, ok):
+        with self._lock:
+            self.muestras[paso].append((segundos, consultas, ok))
+
+    def resumen(self):
+        pasos = {}
+        for paso, muestras in self.muestras.items():
+            if not muestras:
+                continue
+            tiempos = sorted(m[0] * 1000 for m in muestras)
+            consultas = [m[1] for m in muestras]
+            pasos[paso] = {
+                'requests': len(muestras),
+                'errores': sum(1 for m in muestras if not m[2]),
+                'p50_ms': round(percentil(tiempos, 50), 2),
+                'p95_ms': round(percentil(tiempos, 95), 2),
+                'p99_ms': round(percentil(tiempos, 99), 2),
+                'media_ms': round(sum(tiempos) / len(tiempos), 2),
+                'max_ms': round(tiempos[-1], 2),
+                'consultas_media': round(sum(consultas) / len(consultas), 2),
+                'consultas_max': max(consultas),
+            }
+        return pasos
+
+
+def _medir(medidor, paso, pedir, valida):
+    with CaptureQueriesContext(connection) as consultas:
+        inicio = time.perf_counter()
+        respuesta = pedir()
+        segundos = time.perf_counter() - inicio
+    medidor.registrar(paso, segundos, len(consultas.captured_queries), valida(respuesta))
+    return respuesta
+
+
+def _es_json_ok(respuesta):
+    try:
+        return respuesta.status_code == 200 and respuesta.json().get('status') == 'ok'
+    except ValueError:
+        return False
+
+
+# ======================================================
+# Recorrido de compra
+# ======================================================
+def recorrido(cliente, rnd, muestra, medidor):
+    """Una visita completa: navega, busca, compra un producto y confirma el pago."""
+    ok = lambda r: r.status_code == 200
+    ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+    producto_id = rnd.choice(muestra['productos'])
+
+    _medir(medidor, 'catalogo', lambda: cliente.get(reverse('lista_productos')), ok)
+    if muestra['categorias']:
+        categoria = rnd.choice(muestra['categorias'])
+        _medir(medidor, 'catalogo_categoria',
+               lambda: cliente.get(reverse('lista_productos'), {'categoria': categoria}), ok)
+    termino = rnd.choice(muestra['terminos'])
+    _medir(medidor, 'busqueda', lambda: cliente.get(reverse('lista_productos'), {'q': termino}), ok)
+    _medir(medidor, 'detalle', lambda: cliente.get(reverse('detalle_producto', args=[producto_id])), ok)
+    _medir(medidor, 'agregar', lambda: cliente.get(
+        reverse('agregar_al_carrito', args=[producto_id]), HTTP_REFERER=reverse('ver_carrito'),
+    ), lambda r: r.status_code == 302)
+    _medir(medidor, 'carrito', lambda: cliente.get(reverse('ver_carrito')), ok)
+    _medir(medidor, 'checkout', lambda: cliente.post(reverse('checkout'), {'direccion': 'Calle Falsa 123'}, **ajax),
+           lambda r: r.status_code == 200 and r.content.startswith(b'http'))
+    _medir(medidor, 'pago_aprobado', lambda: cliente.post(reverse('pago_aprobado'), **ajax), _es_json_ok)
+
+
+def _muestra(rnd):
+    ids = list(
+        Producto.objects.filter(sku__startswith=PREFIJO_SKU, stock__gt=0)
+        .order_by('id').values_list('id', flat=True)
+    )
+    if not ids:
+        raise ValueError("No hay datos de benchmark: correr antes `generar_datos_benchmark`.")
+    ids = rnd.sample(ids, min(MUESTRA_PRODUCTOS, len(ids)))
+    nombres = Producto.objects.filter(id__in=ids[:200]).values_list('nombre', flat=True)
+    terminos = sorted({t for nombre in nombres for t in busqueda.tokenizar(nombre) if not t.isdigit()})
+    return {
+        'productos': ids,
+        'terminos': terminos or ['monitor'],
+        'categorias': list(Categoria.objects.filter(nombre__startswith="Bench ").values_list('id', flat=True)),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def ejecutar(usuarios_virtuales=4, iteraciones=20, semilla=42):
+    """Corre la prueba y devuelve el resultado (dict serializable a JSON)."""
+    rnd = random.Random(semilla)
+    muestra = _muestra(rnd)
+    usuarios = list(Usuario.objects.filter(username__startswith=PREFIJO_USUARIO).order_by('id')[:usuarios_virtuales])
+    if len(usuarios) < usuarios_virtuales:
+        raise ValueError(f"Hay {len(usuarios)} usuarios de benchmark y se pidieron {usuarios_virtuales}.")
+    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+    medidor = Medidor()
+    errores = []
+
+    def usuario_virtual(numero, usuario, propio_hilo):
+        try:
+            cliente = Client(HTTP_HOST=host, raise_request_exception=False)
+            cliente.force_login(usuario)
+            rnd_usuario = random.Random(semilla * 1000 + numero)
+            for _ in range(iteraciones):
+                recorrido(cliente, rnd_usuario, muestra, medidor)
+        except Exception as e:  # un hilo caído no debe cortar la medición del resto
+            errores.append(f"{usuario.username}: {type(e).__name__}: {e}")
+        finally:
+            if propio_hilo:
+                connection.close()
+
+    with pasarela_falsa():
+        inicio = time.perf_counter()
+        if usuarios_virtuales == 1:
+            usuario_virtual(0, usuarios[0], propio_hilo=False)
+        else:
+            hilos = [
+                threading.Thread(target=usuario_virtual, args=(i, usuario, True))
+                for i, usuario in enumerate(usuarios)
+            ]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        duracion = time.perf_counter() - inicio
+
+    pasos = medidor.resumen()
+    requests = sum(p['requests'] for p in pasos.values())
+    return {
+        'fecha': timezone.now().isoformat(),
+        'parametros': {'usuarios_virtuales': usuarios_virtuales, 'iteraciones': iteraciones, 'semilla': semilla},
+        'entorno': {
+            'commit': _commit(),
+            'base': connection.vendor,
+            'carrito_modo': getattr(settings, 'CARRITO_MODO', 'db'),
+            'debug': settings.DEBUG,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'productos': Producto.objects.count(),
+        },
+        'total': {
+            'requests': requests,
+            'errores': sum(p['errores'] for p in pasos.values()),
+            'segundos': round(duracion, 3),
+            'requests_por_segundo': round(requests / duracion, 2) if duracion else None,
+        },
+        'pasos': pasos,
+        'fallas': errores,
+    }
+
+
+def comparar(anterior, actual):
+    """Líneas de texto con la variación de p95 y consultas por paso entre dos resultados."""
+    lineas = []
+    for paso, datos in actual['pasos'].items():
+        previo = anterior.get('pasos', {}).get(paso)
+        if not previo:
+            continue
+        variacion = (datos['p95_ms'] - previo['p95_ms']) / previo['p95_ms'] * 100 if previo['p95_ms'] else 0.0
+        lineas.append(
+            f"{paso:>20}: p95 {previo['p95_ms']:.1f} -> {datos['p95_ms']:.1f} ms ({variacion:+.0f}%), "
+            f"consultas {previo['consultas_media']:.1f} -> {datos['consultas_media']:.1f}"
+        )
+    previo, total = anterior.get('total', {}), actual['total']
+    if previo.get('requests_por_segundo'):
+        lineas.append(f"{'total':>20}: {previo['requests_por_segundo']} -> {total['requests_por_segundo']} req/s")
+    return lineas
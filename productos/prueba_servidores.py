@@ -0,0 +1,261 @@
+# ======================================================
+# WSGI contra ASGI con el mismo presupuesto de memoria
+# - Levanta cada servidor de verdad con la misma cantidad de workers
+#   (procesos): gunicorn con workers sync (tienda/wsgi.py, vistas
+#   sync) y gunicorn con UvicornWorker (tienda/asgi.py, vistas async)
+# - La pasarela de pagos falsa responde con una demora, como la real:
+#   el checkout pasa casi todo el tiempo esperando a Mercado Pago
+# - Clientes concurrentes (hilos con su requests.Session, logueados
+#   como usuarios "bench_") repiten catálogo, detalle y checkout
+#   durante un tiempo fijo
+# - Por servidor: requests por segundo, latencias y errores por paso,
+#   consultas SQL (del header Server-Timing) y memoria (RSS de todos
+#   los procesos del servidor, solo en Linux)
+# Mide a través de HTTP, a diferencia de prueba_carga.py. Los datos
+# salen de datos_sinteticos.py (`generar_datos_benchmark`).
+# ======================================================
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import django
+import requests
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .datos_sinteticos import CLAVE_USUARIOS, PREFIJO_SKU, PREFIJO_USUARIO
+from .models import Producto, Usuario
+from .prueba_carga import Medidor, _commit, pasarela_falsa
+
+PASOS = ('catalogo', 'detalle', 'checkout')
+
+# servidor -> argumentos de gunicorn (la misma cantidad de workers para los dos)
+SERVIDORES = {
+    'wsgi': ['tienda.wsgi:application', '--worker-class', 'sync'],
+    'asgi': ['tienda.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+_CONSULTAS = re.compile(r'(\d+) consultas')
+
+
+# ======================================================
+# Servidor
+# ======================================================
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memoria_mb(pid):
+    """RSS en MB del proceso y todos sus descendientes (None fuera de Linux)."""
+    if not os.path.isdir('/proc'):
+        return None
+    hijos = {}
+    for entrada in os.listdir('/proc'):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat') as archivo:
+                # el nombre del proceso va entre paréntesis y puede tener espacios
+                padre = int(archivo.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        hijos.setdefault(padre, []).append(int(entrada))
+
+    total_kb, pendientes = 0, [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        pendientes.extend(hijos.get(actual, ()))
+        try:
+            with open(f'/proc/{actual}/status') as archivo:
+                for linea in archivo:
+                    if linea.startswith('VmRSS:'):
+                        total_kb += int(linea.split()[1])
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1)
+
+
+class Servidor:
+    """Un gunicorn en un puerto libre, con el cliente de pagos apuntando a `url_pasarela`."""
+
+    def __init__(self, nombre, workers, url_pasarela, espera=30.0):
+        self.nombre = nombre
+        self.url = f"http://127.0.0.1:{_puerto_libre()}"
+        entorno = dict(os.environ, MP_API_URL=url_pasarela, INSTRUMENTACION_SERVER_TIMING='True')
+        # Cada servidor elige sus vistas (tienda/asgi.py activa las async)
+        entorno.pop('VISTAS_ASYNC', None)
+        # stderr a un archivo: un pipe sin leer puede llenarse y trabar al servidor
+        self._errores = tempfile.TemporaryFile(mode='w+')
+        self.proceso = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *SERVIDORES[nombre], '--workers', str(workers),
+             '--bind', self.url[len('http://'):], '--timeout', '120', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=entorno, stdout=subprocess.DEVNULL, stderr=self._errores,
+        )
+        self._esperar(espera)
+
+    def _esperar(self, espera):
+        limite = time.monotonic() + espera
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                self._errores.seek(0)
+                raise RuntimeError(f"{self.nombre}: el servidor terminó al arrancar:\n{self._errores.read()}")
+            try:
+                if requests.get(f"{self.url}/login/", timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.cerrar()
+        raise RuntimeError(f"{self.nombre}: el servidor no respondió en {espera:.0f}s")
+
+    def memoria_mb(self):
+        return memoria_mb(self.proceso.pid)
+
+    def cerrar(self):
+        self.proceso.terminate()
+        try:
+            self.proceso.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
+            self.proceso.wait()
+        self._errores.close()
+
+
+# ======================================================
+# Clientes
+# ======================================================
+def _consultas(respuesta):
+    encontradas = _CONSULTAS.search(respuesta.headers.get('Server-Timing', ''))
+    return int(encontradas.group(1)) if encontradas else 0
+
+
+def _pedir(medidor, paso, pedir, valida):
+    inicio = time.perf_counter()
+    try:
+        respuesta = pedir()
+    except requests.RequestException:
+        medidor.registrar(paso, time.perf_counter() - inicio, 0, False)
+        return
+    medidor.registrar(paso, time.perf_counter() - inicio, _consultas(respuesta), valida(respuesta))
+
+
+def iniciar_sesion(url, usuario):
+    sesion = requests.Session()
+    sesion.get(f"{url}/login/", timeout=30)
+    respuesta = sesion.post(f"{url}/login/", data={
+        'username': usuario, 'password': CLAVE_USUARIOS,
+        'csrfmiddlewaretoken': sesion.cookies.get('csrftoken', ''),
+    }, headers={'Referer': f"{url}/login/"}, timeout=30, allow_redirects=False)
+    if respuesta.status_code != 302:
+        raise RuntimeError(f"No se pudo iniciar sesión como {usuario} ({respuesta.status_code})")
+    return sesion
+
+
+def cliente(url, sesion, productos, rnd, medidor, hasta):
+    """Repite catálogo, detalle y checkout hasta `hasta` (time.monotonic)."""
+    ok = lambda r: r.status_code == 200
+    checkout_ok = lambda r: r.status_code == 200 and r.content.startswith(b'http')
+    cabeceras = {
+        'X-Requested-With': 'XMLHttpRequest',
+        'X-CSRFToken': sesion.cookies.get('csrftoken', ''),
+        'Referer': f"{url}/checkout/",
+    }
+    while time.monotonic() < hasta:
+        producto_id = rnd.choice(productos)
+        _pedir(medidor, 'catalogo', lambda: sesion.get(f"{url}/", timeout=60), ok)
+        _pedir(medidor, 'detalle', lambda: sesion.get(f"{url}/producto/{producto_id}/", timeout=60), ok)
+        _pedir(medidor, 'checkout', lambda: sesion.post(
+            f"{url}/checkout/", data={'direccion': 'Calle Falsa 123'}, headers=cabeceras, timeout=60,
+        ), checkout_ok)
+
+
+def medir_servidor(nombre, url_pasarela, workers, segundos, productos, usuarios, semilla):
+    servidor = Servidor(nombre, workers, url_pasarela)
+    try:
+        sesiones = [iniciar_sesion(servidor.url, usuario) for usuario in usuarios]
+        memoria_inicial = servidor.memoria_mb()
+        medidor = Medidor(PASOS)
+        hasta = time.monotonic() + segundos
+        hilos = [
+            threading.Thread(target=cliente, args=(
+                servidor.url, sesion, productos, random.Random(semilla * 1000 + i), medidor, hasta,
+            ))
+            for i, sesion in enumerate(sesiones)
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        memoria_maxima = memoria_inicial
+        while any(hilo.is_alive() for hilo in hilos):
+            memoria = servidor.memoria_mb()
+            if memoria is not None:
+                memoria_maxima = max(memoria_maxima or 0, memoria)
+            time.sleep(0.5)
+        duracion = time.perf_counter() - inicio
+    finally:
+        servidor.cerrar()
+
+    pasos = medidor.resumen()
+    requests_totales = sum(p['requests'] for p in pasos.values())
+    return {
+        'total': {
+            'requests': requests_totales,
+            'errores': sum(p['errores'] for p in pasos.values()),
+            'segundos': round(duracion, 3),
+            'requests_por_segundo': round(requests_totales / duracion, 2) if duracion else None,
+        },
+        'memoria_mb': {'inicial': memoria_inicial, 'maxima': memoria_maxima},
+        'pasos': pasos,
+    }
+
+
+def ejecutar(servidores=('wsgi', 'asgi'), workers=2, concurrencia=32, segundos=20, demora_pasarela=0.3, semilla=42):
+    """Mide cada servidor con la misma carga; devuelve un dict serializable a JSON."""
+    desconocidos = set(servidores) - set(SERVIDORES)
+    if desconocidos:
+        raise ValueError(f"Servidores desconocidos: {', '.join(sorted(desconocidos))}")
+    rnd = random.Random(semilla)
+    productos = list(
+        Producto.objects.filter(sku__startswith=PREFIJO_SKU).order_by('id').values_list('id', flat=True)[:5000]
+    )
+    if not productos:
+        raise ValueError("No hay datos de benchmark: correr antes `generar_datos_benchmark`.")
+    usuarios = list(
+        Usuario.objects.filter(username__startswith=PREFIJO_USUARIO).order_by('id')
+        .values_list('username', flat=True)[:concurrencia]
+    )
+    if len(usuarios) < concurrencia:
+        raise ValueError(f"Hay {len(usuarios)} usuarios de benchmark y se pidieron {concurrencia} clientes.")
+
+    resultado = {
+        'fecha': timezone.now().isoformat(),
+        'parametros': {
+            'workers': workers, 'concurrencia': concurrencia, 'segundos': segundos,
+            'demora_pasarela': demora_pasarela, 'semilla': semilla,
+        },
+        'entorno': {
+            'commit': _commit(),
+            'base': connection.vendor,
+            'debug': settings.DEBUG,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cpus': os.cpu_count(),
+        },
+        'servidores': {},
+    }
+    with pasarela_falsa(demora_pasarela) as url_pasarela:
+        for nombre in servidores:
+            resultado['servidores'][nombre] = medir_servidor(
+                nombre, url_pasarela, workers, segundos, productos, usuarios, rnd.randrange(10**6),
+            )
+    return resultado
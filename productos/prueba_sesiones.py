@@ -0,0 +1,103 @@
+# ======================================================
+# Consultas por request según el backend de sesiones
+# - Mismo usuario logueado y mismas páginas (catálogo, carrito y el
+#   checkout con la misma dirección) con cada SESIONES_MODO
+# - Por página: consultas totales, lecturas y escrituras de
+#   django_session y tiempo medio
+# - El checkout siempre escribe la sesión (guarda una referencia de
+#   pago nueva); catálogo y carrito no deberían tocarla en modo 'cache'
+# Corre dentro del proceso (django.test.Client), contra la pasarela
+# falsa de prueba_carga.py.
+# ======================================================
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .datos_sinteticos import PREFIJO_USUARIO
+from .models import Usuario
+from .prueba_carga import pasarela_falsa
+
+# SESIONES_MODO -> SESSION_ENGINE
+MODOS = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'productos.sesiones',
+}
+
+PAGINAS = ('catalogo', 'carrito', 'checkout')
+
+
+def clasificar(consultas):
+    """(lecturas, escrituras) de django_session entre las consultas capturadas."""
+    tabla = Session._meta.db_table
+    lecturas = escrituras = 0
+    for consulta in consultas:
+        if tabla not in consulta['sql']:
+            continue
+        if consulta['sql'].lstrip().upper().startswith('SELECT'):
+            lecturas += 1
+        else:
+            escrituras += 1
+    return lecturas, escrituras
+
+
+def medir_modo(modo, usuario, repeticiones):
+    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+    with override_settings(SESSION_ENGINE=MODOS[modo]):
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+        cliente = Client(HTTP_HOST=host)
+        cliente.force_login(usuario)
+        pedidos = {
+            'catalogo': lambda: cliente.get(reverse('lista_productos')),
+            'carrito': lambda: cliente.get(reverse('ver_carrito')),
+            'checkout': lambda: cliente.post(
+                reverse('checkout'), {'direccion': 'Calle Falsa 123'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            ),
+        }
+        # Una vuelta para calentar cachés (catálogo, sesión)
+        for pedir in pedidos.values():
+            pedir()
+
+        paginas = {}
+        for pagina in PAGINAS:
+            consultas = lecturas = escrituras = 0
+            segundos = 0.0
+            for _ in range(repeticiones):
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    respuesta = pedidos[pagina]()
+                    segundos += time.perf_counter() - inicio
+                if respuesta.status_code != 200:
+                    raise ValueError(f"{modo} / {pagina}: respuesta {respuesta.status_code}")
+                leidas, escritas = clasificar(capturadas.captured_queries)
+                consultas += len(capturadas.captured_queries)
+                lecturas += leidas
+                escrituras += escritas
+            paginas[pagina] = {
+                'consultas': round(consultas / repeticiones, 2),
+                'lecturas_sesion': round(lecturas / repeticiones, 2),
+                'escrituras_sesion': round(escrituras / repeticiones, 2),
+                'media_ms': round(segundos / repeticiones * 1000, 2),
+            }
+    return paginas
+
+
+def ejecutar(repeticiones=20, modos=tuple(MODOS)):
+    """{'modos': {modo: {pagina: medidas}}, 'ahorro': consultas por request menos que 'db'}."""
+    usuario = Usuario.objects.filter(username__startswith=PREFIJO_USUARIO).order_by('id').first()
+    if usuario is None:
+        raise ValueError("No hay datos de benchmark: correr antes `generar_datos_benchmark`.")
+    with pasarela_falsa():
+        resultado = {'repeticiones': repeticiones, 'modos': {modo: medir_modo(modo, usuario, repeticiones) for modo in modos}}
+    if 'db' in resultado['modos']:
+        base = resultado['modos']['db']
+        resultado['ahorro'] = {
+            modo: {pagina: round(base[pagina]['consultas'] - datos['consultas'], 2) for pagina, datos in paginas.items()}
+            for modo, paginas in resultado['modos'].items() if modo != 'db'
+        }
+    return resultado
@@ -0,0 +1,95 @@
+# ======================================================
+# Asignación de números de pedido
+# - PostgreSQL: SEQUENCE nativa (nextval no bloquea ni se revierte)
+# - Otros motores: tabla contador con UPDATE atómico
+# - Opcional: cada proceso reserva bloques de números para no ir
+#   a la base en cada pedido (PEDIDOS_BLOQUE_NUMEROS)
+# - reservar_numeros_pedido(): muchos números de una vez, para las
+#   cargas en lote (bulk_create no pasa por siguiente_numero_pedido)
+# Los números son crecientes y pueden tener huecos (pedidos fallidos,
+# bloques no usados al reiniciar un worker), pero nunca se repiten.
+# ======================================================
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Max
+
+SECUENCIA_PEDIDOS = 'pedidos_numero_pedido_seq'
+
+
+class Asignador:
+    def __init__(self, nombre, tamano_bloque=1, using='default'):
+        self.nombre = nombre
+        self.tamano_bloque = max(1, tamano_bloque)
+        self.using = using
+        self._lock = threading.Lock()
+        self._proximo = 1
+        self._fin = 0
+
+    def siguiente(self):
+        with self._lock:
+            if self._proximo <= self._fin:
+                numero = self._proximo
+                self._proximo += 1
+                return numero
+
+            connection = connections[self.using]
+            if connection.vendor == 'postgresql':
+                # La secuencia ya reserva bloques por sesión (CACHE)
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT nextval(%s)", [SECUENCIA_PEDIDOS])
+                    return cursor.fetchone()[0]
+
+            # Dentro de una transacción ajena el incremento puede revertirse, así que
+            # no se guarda un bloque en memoria: se toma un único número.
+            bloque = 1 if connection.in_atomic_block else self.tamano_bloque
+            fin = self._reservar(bloque)
+            if bloque > 1:
+                self._proximo, self._fin = fin - bloque + 2, fin
+            return fin - bloque + 1
+
+    def reservar(self, cantidad):
+        """Lista de `cantidad` números nuevos, pedidos a la base de una sola vez."""
+        connection = connections[self.using]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [SECUENCIA_PEDIDOS, cantidad])
+                return [fila[0] for fila in cursor.fetchall()]
+        fin = self._reservar(cantidad)
+        return list(range(fin - cantidad + 1, fin + 1))
+
+    def _reservar(self, cantidad):
+        """Incrementa el contador en `cantidad` y devuelve el último número reservado."""
+        from .models import Secuencia
+
+        with transaction.atomic(using=self.using):
+            secuencias = Secuencia.objects.using(self.using).filter(nombre=self.nombre)
+            if not secuencias.update(valor=F('valor') + cantidad):
+                Secuencia.objects.using(self.using).create(
+                    nombre=self.nombre, valor=valor_inicial(self.using) + cantidad
+                )
+            return secuencias.values_list('valor', flat=True).get()
+
+    def reiniciar(self):
+        """Descarta el bloque en memoria (tests / después de un fork)."""
+        with self._lock:
+            self._proximo, self._fin = 1, 0
+
+
+def valor_inicial(using='default', modelo=None):
+    """Último número de pedido ya usado (para inicializar el contador)."""
+    if modelo is None:
+        from .models import Pedido as modelo
+    return modelo.objects.using(using).aggregate(maximo=Max('numero_pedido'))['maximo'] or 0
+
+
+_asignador_pedidos = Asignador('pedido', getattr(settings, 'PEDIDOS_BLOQUE_NUMEROS', 1))
+
+
+def siguiente_numero_pedido():
+    return _asignador_pedidos.siguiente()
+
+
+def reservar_numeros_pedido(cantidad):
+    return _asignador_pedidos.reservar(cantidad)
@@ -0,0 +1,72 @@
+# ======================================================
+# Sesiones en caché con la base de respaldo (SESIONES_MODO = 'cache')
+# - Igual que el backend cached_db de Django: cada request lee la
+#   sesión de la caché y solo va a django_session si no está
+# - Además no escribe si los datos no cambiaron: guardar lo mismo que
+#   ya había (ej. la misma dirección en cada checkout) no toca la base
+#   ni la caché
+# - Timeout de la caché acotado a SESIONES_CACHE_TIMEOUT: con una caché
+#   local por proceso (locmem) un login / logout hecho en otro worker
+#   se ve a lo sumo después de ese tiempo. Con varios procesos conviene
+#   una caché compartida (Redis, etc.)
+# Se activa con SESSION_ENGINE = 'productos.sesiones' (settings.py).
+# ======================================================
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+
+
+class _CacheConTope:
+    """La caché de sesiones, con un timeout máximo para cada clave."""
+
+    def __init__(self, cache, tope):
+        self._cache = cache
+        self.tope = tope
+
+    def __getattr__(self, nombre):
+        return getattr(self._cache, nombre)
+
+    def __contains__(self, clave):
+        return clave in self._cache
+
+    def set(self, clave, valor, timeout):
+        self._cache.set(clave, valor, min(timeout, self.tope))
+
+    async def aset(self, clave, valor, timeout):
+        await self._cache.aset(clave, valor, min(timeout, self.tope))
+
+
+class SessionStore(cached_db.SessionStore):
+    cache_key_prefix = 'productos.sesiones'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = _CacheConTope(self._cache, getattr(settings, 'SESIONES_CACHE_TIMEOUT', 60))
+        self._guardado = None  # datos serializados como están en la base
+
+    def _serializar(self, datos):
+        return self.serializer().dumps(datos)
+
+    def _sin_cambios(self, must_create):
+        return not must_create and self._guardado is not None and self._guardado == self._serializar(self._session)
+
+    def load(self):
+        datos = super().load()
+        self._guardado = self._serializar(datos) if datos else None
+        return datos
+
+    async def aload(self):
+        datos = await super().aload()
+        self._guardado = self._serializar(datos) if datos else None
+        return datos
+
+    def save(self, must_create=False):
+        if self._sin_cambios(must_create):
+            return
+        super().save(must_create)
+        self._guardado = self._serializar(self._session)
+
+    async def asave(self, must_create=False):
+        if self._sin_cambios(must_create):
+            return
+        await super().asave(must_create)
+        self._guardado = self._serializar(self._session)
@@ -0,0 +1,87 @@
+# ======================================================
+# Señales de la app 'productos'
+# - Mantienen sincronizado el índice de búsqueda
+# - Generan las derivadas de las imágenes subidas
+# - Mantienen los productos similares precalculados
+# - Invalidan la caché del catálogo y el resumen de pedidos
+# ======================================================
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import busqueda, cache_catalogo, imagenes, pedidos, similares
+from .models import Categoria, Pedido, Producto, ProductoImagen
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, raw=False, using='default', **kwargs):
+    if not raw:
+        busqueda.indexar([instance], using)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, using='default', **kwargs):
+    busqueda.desindexar([instance.pk], using)
+
+
+@receiver(post_save, sender=Producto)
+def refrescar_similares(sender, instance, raw=False, using='default', **kwargs):
+    if not raw:
+        similares.refrescar(instance, using)
+
+
+@receiver(pre_delete, sender=Producto)
+def recordar_listas_con_producto(sender, instance, using='default', **kwargs):
+    # Las filas que lo muestran se borran en cascada: después hay que completar esas listas
+    instance._listas_a_recalcular = list(
+        instance.similar_de.using(using).values_list('producto_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Producto)
+def recalcular_listas_sin_producto(sender, instance, using='default', **kwargs):
+    ids = getattr(instance, '_listas_a_recalcular', None)
+    if ids:
+        similares.recalcular(ids, using=using)
+
+
+@receiver(pre_save, sender=Producto)
+@receiver(pre_save, sender=ProductoImagen)
+def detectar_imagen_nueva(sender, instance, raw=False, **kwargs):
+    # Un archivo recién subido todavía no está guardado en el storage
+    instance._imagen_nueva = bool(instance.imagen) and not instance.imagen._committed
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=ProductoImagen)
+def generar_derivadas(sender, instance, raw=False, using='default', **kwargs):
+    if raw:
+        return
+    if not instance.imagen:
+        hash_imagen = ''
+    elif getattr(instance, '_imagen_nueva', False) or not instance.imagen_hash:
+        try:
+            hash_imagen = imagenes.generar_derivadas(instance.imagen.name)
+        except OSError:
+            # Archivo ausente o que Pillow no reconoce: se sirve la original
+            hash_imagen = ''
+    else:
+        return
+    if hash_imagen != instance.imagen_hash:
+        instance.imagen_hash = hash_imagen
+        sender.objects.using(using).filter(pk=instance.pk).update(imagen_hash=hash_imagen)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=ProductoImagen)
+@receiver(post_delete, sender=ProductoImagen)
+def invalidar_catalogo(sender, using='default', **kwargs):
+    cache_catalogo.invalidar(using)
+
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+def invalidar_resumen_pedidos(sender, instance, using='default', **kwargs):
+    pedidos.invalidar_resumen(instance.usuario_id, using)
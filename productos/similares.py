@@ -0,0 +1,171 @@
+# ======================================================
+# Productos similares precalculados
+# - Puntaje: palabras en común (nombre y descripción), misma
+#   categoría y precio parecido; los sin stock quedan más abajo
+# - Candidatos: misma categoría + productos que comparten palabras
+#   del nombre (índice de búsqueda)
+# - refrescar(): al guardar un producto recalcula su lista y ajusta
+#   la de sus candidatos sin recalcular todo el catálogo
+# - reconstruir(): recalcula todo (comando `recalcular_similares`)
+# ======================================================
+from django.db import transaction
+from django.db.models import Q
+
+from . import busqueda
+
+TOP = 8
+
+# Límite de candidatos por producto (categorías muy grandes)
+MAX_CANDIDATOS_CATEGORIA = 500
+MAX_CANDIDATOS_TEXTO = 50
+
+CAMPOS = ('id', 'nombre', 'descripcion', 'precio', 'descuento', 'stock', 'categoria_id')
+
+
+def _modelos(modelo, modelo_similar):
+    if modelo is None:
+        from .models import Producto as modelo
+    if modelo_similar is None:
+        from .models import ProductoSimilar as modelo_similar
+    return modelo, modelo_similar
+
+
+def _rasgos(fila):
+    """Lo necesario para comparar productos, a partir de una fila de values()."""
+    precio = float(fila['precio'])
+    if fila['descuento']:
+        precio -= precio * fila['descuento'] / 100
+    return {
+        'id': fila['id'],
+        'categoria_id': fila['categoria_id'],
+        'precio': precio,
+        'stock': fila['stock'],
+        'nombre': set(busqueda.tokenizar(fila['nombre'])),
+        'descripcion': set(busqueda.tokenizar(fila['descripcion'])),
+    }
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def puntaje(base, otro):
+    """Qué tan buen "similar" de `base` es `otro` (0 = no se muestra)."""
+    nombre = _jaccard(base['nombre'], otro['nombre'])
+    misma_categoria = base['categoria_id'] is not None and base['categoria_id'] == otro['categoria_id']
+    if not nombre and not misma_categoria:
+        return 0.0
+    valor = 0.5 * nombre + 0.15 * _jaccard(base['descripcion'], otro['descripcion'])
+    if misma_categoria:
+        valor += 0.3
+    if base['precio'] > 0 and otro['precio'] > 0:
+        valor += 0.15 * min(base['precio'], otro['precio']) / max(base['precio'], otro['precio'])
+    if not otro['stock']:
+        valor *= 0.5
+    return round(valor, 6)
+
+
+def _candidatos(fila, modelo, using):
+    """Rasgos de los productos que pueden ser similares a `fila` (sin incluirlo)."""
+    productos = modelo.objects.using(using).exclude(id=fila['id'])
+    ids = set()
+    if fila['categoria_id'] is not None:
+        ids.update(
+            productos.filter(categoria_id=fila['categoria_id'])
+            .order_by('id').values_list('id', flat=True)[:MAX_CANDIDATOS_CATEGORIA]
+        )
+    relacionados = busqueda.buscar_productos(productos, fila['nombre'], todos=False)
+    ids.update(relacionados.values_list('id', flat=True)[:MAX_CANDIDATOS_TEXTO])
+    return [_rasgos(f) for f in modelo.objects.using(using).filter(id__in=ids).values(*CAMPOS)]
+
+
+def _ranking(base, candidatos):
+    puntajes = [(puntaje(base, c), c['id']) for c in candidatos]
+    puntajes = sorted((p for p in puntajes if p[0] > 0), key=lambda p: (-p[0], p[1]))
+    return puntajes[:TOP]
+
+
+def _guardar(modelo_similar, using, listas):
+    """Reemplaza las listas {producto_id: [(puntaje, similar_id), ...]}."""
+    if not listas:
+        return
+    with transaction.atomic(using=using):
+        modelo_similar.objects.using(using).filter(producto_id__in=list(listas)).delete()
+        modelo_similar.objects.using(using).bulk_create([
+            modelo_similar(producto_id=producto_id, similar_id=similar_id, puntaje=valor, posicion=posicion)
+            for producto_id, lista in listas.items()
+            for posicion, (valor, similar_id) in enumerate(lista)
+        ])
+
+
+def recalcular(producto_ids, modelo=None, modelo_similar=None, using='default'):
+    """Recalcula desde cero la lista de cada producto indicado."""
+    modelo, modelo_similar = _modelos(modelo, modelo_similar)
+    listas = {}
+    for fila in modelo.objects.using(using).filter(id__in=list(producto_ids)).values(*CAMPOS):
+        base = _rasgos(fila)
+        listas[fila['id']] = _ranking(base, _candidatos(fila, modelo, using))
+    _guardar(modelo_similar, using, listas)
+    return len(listas)
+
+
+def refrescar(producto, using='default'):
+    """
+    Actualiza después de guardar `producto`: recalcula su lista y, en la de
+    cada candidato, lo inserta/reubica/quita con su nuevo puntaje. Solo se
+    recalcula de cero la lista (llena) de un candidato en la que bajó de
+    puntaje, porque el siguiente mejor de esa lista no está guardado.
+    """
+    modelo, modelo_similar = _modelos(None, None)
+    fila = modelo.objects.using(using).filter(id=producto.pk).values(*CAMPOS).first()
+    if fila is None:
+        return
+    base = _rasgos(fila)
+    candidatos = {c['id']: c for c in _candidatos(fila, modelo, using)}
+    listas = {producto.pk: _ranking(base, candidatos.values())}
+
+    # Listas actuales de los candidatos y de quienes hoy lo muestran
+    actuales = {}
+    similares = modelo_similar.objects.using(using)
+    vecinos = similares.filter(
+        Q(producto_id__in=list(candidatos))
+        | Q(producto_id__in=similares.filter(similar_id=producto.pk).values('producto_id'))
+    )
+    for fila_similar in vecinos.order_by('producto_id', 'posicion').values('producto_id', 'similar_id', 'puntaje'):
+        actuales.setdefault(fila_similar['producto_id'], []).append(
+            (fila_similar['puntaje'], fila_similar['similar_id'])
+        )
+
+    a_recalcular = []
+    for vecino_id in set(candidatos) | set(actuales):
+        actual = actuales.get(vecino_id, [])
+        anterior = next((p[0] for p in actual if p[1] == producto.pk), None)
+        lista = [p for p in actual if p[1] != producto.pk]
+        valor = puntaje(candidatos[vecino_id], base) if vecino_id in candidatos else 0.0
+        if valor > 0:
+            lista.append((valor, producto.pk))
+        lista = sorted(lista, key=lambda p: (-p[0], p[1]))[:TOP]
+        if anterior is not None and valor < anterior and len(actual) == TOP:
+            # Bajó en una lista llena: algún producto que quedó afuera podría superarlo
+            a_recalcular.append(vecino_id)
+        elif lista != actual:
+            listas[vecino_id] = lista
+
+    _guardar(modelo_similar, using, listas)
+    if a_recalcular:
+        recalcular(a_recalcular, using=using)
+
+
+def reconstruir(modelo=None, modelo_similar=None, using='default', lote=500, progreso=None):
+    """
+    Recalcula las listas de todo el catálogo en lotes. Acepta los modelos
+    históricos para poder usarse desde migraciones.
+    """
+    modelo, modelo_similar = _modelos(modelo, modelo_similar)
+    ids = list(modelo.objects.using(using).order_by('id').values_list('id', flat=True))
+    total = 0
+    for inicio in range(0, len(ids), lote):
+        total += recalcular(ids[inicio:inicio + lote], modelo, modelo_similar, using)
+        if progreso:
+            progreso(total, len(ids))
+    return total
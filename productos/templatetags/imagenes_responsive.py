@@ -0,0 +1,42 @@
+# ======================================================
+# Template tags de imágenes responsive
+# Uso:
+#   {% load imagenes_responsive %}
+#   {% imagen_responsive producto 'tarjeta' alt=producto.nombre %}
+# - Con derivadas: <picture> con srcset WebP + JPEG
+# - Sin derivadas (todavía no generadas): <img> con la original
+# ======================================================
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from productos import imagenes
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagen_responsive(objeto, variante='tarjeta', sizes=None, **atributos):
+    """
+    `objeto` es un Producto o ProductoImagen (tiene `imagen` e `imagen_hash`).
+    `variante` elige la imagen de `src` (fallback); `sizes` indica el ancho
+    que ocupa en la página (por defecto, el de la variante).
+    """
+    if not objeto.imagen:
+        return ''
+    atributos = {nombre.replace('_', '-'): valor for nombre, valor in atributos.items()}
+    atributos.setdefault('loading', 'lazy')
+    atributos.setdefault('decoding', 'async')
+
+    if not objeto.imagen_hash:
+        return format_html('<img src="{}"{}>', objeto.imagen.url, flatatt(atributos))
+
+    nombre, hash_imagen = objeto.imagen.name, objeto.imagen_hash
+    sizes = sizes or f"{imagenes.VARIANTES[variante]}px"
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        imagenes.srcset(nombre, hash_imagen, 'webp'), sizes,
+        imagenes.url_derivada(nombre, hash_imagen, variante),
+        imagenes.srcset(nombre, hash_imagen), sizes, flatatt(atributos),
+    )
@@ -1,3 +1,1820 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from PIL import Image
+
+from tienda import urls as tienda_urls
+
+from . import (
+    busqueda, cache_catalogo, carga_catalogo, carritos, cola_facturas, datos_sinteticos, estaticos, facetas, imagenes,
+    instrumentacion, pagos, planes, prueba_carga, prueba_sesiones, sesiones, similares, vistas_async, webhooks,
+)
+from . import facturas as facturas_mod
+from . import pedidos as pedidos_mod
+from .paginacion import ORDENES, TAMANO_PAGINA, _consulta, codificar_cursor, paginar
+from .pedidos import StockInsuficiente, crear_pedido_desde_carrito
+from .secuencias import Asignador
+from .models import (
+    Carrito, CarritoProducto, Categoria, IntentoPago, NotificacionPago, PagoProcesado, Pedido, PedidoProducto,
+    Producto, TareaFactura, Usuario, VentaDiaria, VentaDiariaCategoria, VentaDiariaProducto,
+)
+
+
+# ======================================================
+# Búsqueda de productos (índice invertido)
+# ======================================================
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Periféricos")
+        cls.silla = Producto.objects.create(
+            nombre="Silla Gamer Ergonómica", descripcion="Respaldo reclinable", precio=100
+        )
+        cls.monitor = Producto.objects.create(
+            nombre="Monitor Curvo", descripcion="Ideal para silla de oficina", precio=200,
+            categoria=cls.categoria,
+        )
+
+    def buscar(self, texto, productos=None):
+        return list(busqueda.buscar_productos(productos or Producto.objects.all(), texto))
+
+    def test_tokenizar_quita_tildes_stopwords_y_plurales(self):
+        self.assertEqual(busqueda.tokenizar("Las Sillas ergonómicas de MONITORES"),
+                         ["silla", "ergonomica", "monitor"])
+
+    def test_busqueda_insensible_a_tildes_y_plurales(self):
+        self.assertEqual(self.buscar("ergonomicas"), [self.silla])
+        self.assertEqual(self.buscar("monitóres"), [self.monitor])
+
+    def test_coincidencia_en_nombre_rankea_primero(self):
+        self.assertEqual(self.buscar("silla"), [self.silla, self.monitor])
+
+    def test_ultimo_termino_como_prefijo(self):
+        self.assertEqual(self.buscar("silla gam"), [self.silla])
+
+    def test_combina_con_filtros(self):
+        productos = Producto.objects.filter(categoria=self.categoria)
+        self.assertEqual(self.buscar("silla", productos), [self.monitor])
+
+    def test_indice_sincronizado_con_save_y_delete(self):
+        self.silla.nombre = "Escritorio"
+        self.silla.save()
+        self.assertEqual(self.buscar("escritorio"), [self.silla])
+        self.assertEqual(self.buscar("gamer"), [])
+        self.silla.delete()
+        self.assertEqual(self.buscar("escritorio"), [])
+
+    def test_respaldo_sin_terminos_usa_icontains(self):
+        self.assertEqual(self.buscar("de"), [self.monitor])
+
+
+# ======================================================
+# Paginación por cursor del catálogo
+# ======================================================
+class PaginacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Precios repetidos para ejercitar el desempate por id
+        Producto.objects.bulk_create(
+            Producto(nombre=f"Producto {i % 5}", descripcion="", precio=(i * 7) % 10) for i in range(23)
+        )
+
+    def recorrer(self, orden, tamano=4):
+        vistos, cursor = [], None
+        while True:
+            pagina = paginar(Producto.objects.all(), orden=orden, cursor=cursor, tamano=tamano)
+            vistos.extend(p.id for p in pagina.items)
+            if not pagina.siguiente:
+                return vistos, pagina
+            cursor = pagina.siguiente
+
+    def test_recorre_todo_en_orden_estable(self):
+        for orden, campos in (('id', ['id']), ('precio', ['precio_final', 'id']), ('nombre', ['nombre', 'id'])):
+            esperado = list(Producto.objects.order_by(*campos).values_list('id', flat=True))
+            vistos, _ = self.recorrer(orden)
+            self.assertEqual(vistos, esperado, orden)
+
+    def test_pagina_anterior(self):
+        primera = paginar(Producto.objects.all(), orden='precio', tamano=4)
+        segunda = paginar(Producto.objects.all(), orden='precio', cursor=primera.siguiente, tamano=4)
+        volver = paginar(Producto.objects.all(), orden='precio', cursor=segunda.anterior, tamano=4)
+        self.assertEqual([p.id for p in volver.items], [p.id for p in primera.items])
+        self.assertIsNone(primera.anterior)
+        self.assertIsNone(volver.anterior)
+
+    def test_no_usa_offset(self):
+        _, ultima = self.recorrer('precio')
+        with CaptureQueriesContext(connection) as ctx:
+            paginar(Producto.objects.all(), orden='precio', cursor=ultima.anterior, tamano=4)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('OFFSET', ctx.captured_queries[0]['sql'])
+
+    def test_pagina_profunda_busca_en_el_indice_desde_el_cursor(self):
+        # La cota del campo permite buscar en (campo, id) en vez de recorrer el índice desde el principio
+        casos = (('precio', 'productos_precio_final_idx', 'precio_final'), ('nombre', 'productos_nombre_id_idx', 'nombre'))
+        for orden, indice, campo in casos:
+            fila = Producto.objects.order_by(campo, 'id')[18]
+            for direccion in ('s', 'a'):
+                with self.subTest(orden=orden, direccion=direccion):
+                    cursor = codificar_cursor(direccion, getattr(fila, campo), fila.pk)
+                    consulta, *_ = _consulta(Producto.objects.all(), orden, cursor, 4, ORDENES)
+                    plan = planes.plan(consulta)
+                    self.assertIn(indice, plan)
+                    self.assertEqual(planes.recorridos_completos(plan, connection.vendor), [], plan)
+                    if connection.vendor == 'sqlite':
+                        self.assertIn(f'{campo}{">" if direccion == "s" else "<"}?', plan)
+
+    def test_cursor_invalido_vuelve_al_inicio(self):
+        pagina = paginar(Producto.objects.all(), cursor='no-es-un-cursor', tamano=4)
+        self.assertEqual(len(pagina.items), 4)
+        self.assertIsNone(pagina.anterior)
+
+    def test_cursor_con_valor_editado_vuelve_al_inicio(self):
+        for orden, valor in (('precio', 'x'), ('precio', 'NaN'), ('precio', None), ('nombre', None)):
+            with self.subTest(orden=orden, valor=valor):
+                cursor = codificar_cursor('s', valor, 1)
+                pagina = paginar(Producto.objects.all(), orden=orden, cursor=cursor, tamano=4)
+                self.assertEqual(len(pagina.items), 4)
+                self.assertIsNone(pagina.anterior)
+        respuesta = self.client.get(reverse('lista_productos'), {'orden': 'precio', 'cursor': codificar_cursor('s', 'x', 1)})
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_vista_lista_paginada(self):
+        response = self.client.get(reverse('lista_productos'), {'orden': 'precio', 'por_pagina': 5})
+        self.assertEqual(len(response.context['productos']), 5)
+        self.assertIn('cursor=', response.context['url_siguiente'])
+        self.assertIn('orden=precio', response.context['url_siguiente'])
+        self.assertIsNone(response.context['url_anterior'])
+
+
+class PrecioFinalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.caro_en_oferta = Producto.objects.create(nombre="Caro", descripcion="", precio=99, descuento=50)
+        cls.medio = Producto.objects.create(nombre="Medio", descripcion="", precio=60)
+        cls.barato = Producto.objects.create(nombre="Barato", descripcion="", precio=Decimal('10.50'), descuento=10)
+
+    def setUp(self):
+        cache.clear()
+
+    def listar(self, **params):
+        respuesta = self.client.get(reverse('lista_productos'), params)
+        return [p.id for p in respuesta.context['productos']]
+
+    def test_la_base_calcula_y_actualiza_el_precio_final(self):
+        self.assertEqual(Producto.objects.get(pk=self.caro_en_oferta.pk).precio_final, Decimal('49.50'))
+        self.assertEqual(Producto.objects.get(pk=self.barato.pk).precio_final, Decimal('9.45'))
+        Producto.objects.filter(pk=self.medio.pk).update(descuento=25)
+        self.assertEqual(Producto.objects.get(pk=self.medio.pk).precio_final, Decimal('45.00'))
+
+    def test_orden_por_precio_con_descuento(self):
+        self.assertEqual(self.listar(orden='precio'), [self.barato.id, self.caro_en_oferta.id, self.medio.id])
+
+    def test_filtros_de_precio_y_oferta(self):
+        self.assertEqual(self.listar(orden='precio', min='20', max='55'), [self.caro_en_oferta.id])
+        self.assertEqual(self.listar(orden='precio', oferta='1'), [self.barato.id, self.caro_en_oferta.id])
+        self.assertEqual(len(self.listar(min='no', max='-3')), 3)
+
+    def test_precio_con_descuento_despues_de_guardar(self):
+        self.medio.descuento = 10
+        self.medio.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.medio.precio_con_descuento, 54)
+
+
+class FacetasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.audio = Categoria.objects.create(nombre="Audio")
+        cls.video = Categoria.objects.create(nombre="Video")
+        for precio, descuento, stock, categoria in (
+            (1000, 0, 5, cls.audio), (3000, 10, 0, cls.audio), (30000, 20, 2, cls.audio),
+            (8000, 0, 1, cls.video), (300000, 0, 0, cls.video), (500, 0, 3, None),
+        ):
+            Producto.objects.create(nombre="Parlante", descripcion="", precio=precio, descuento=descuento,
+                                    stock=stock, categoria=categoria)
+
+    def setUp(self):
+        cache.clear()
+
+    def facetas(self, **params):
+        return self.client.get(reverse('lista_productos'), params).context['facetas']
+
+    def test_conteos_de_todas_las_facetas(self):
+        conteos = self.facetas()
+        self.assertEqual(conteos['total'], 6)
+        self.assertEqual([c['cantidad'] for c in conteos['categorias']], [3, 2])
+        self.assertEqual([r['cantidad'] for r in conteos['precios']], [3, 1, 1, 0, 0, 1])
+        self.assertEqual(conteos['stock'], {'con_stock': 4, 'sin_stock': 2})
+        self.assertEqual(conteos['oferta'], 2)
+
+    def test_cada_faceta_ignora_su_propio_filtro(self):
+        conteos = self.facetas(categoria=self.audio.id, stock='1')
+        self.assertEqual(conteos['total'], 2)
+        # Las otras categorías siguen contando (con el filtro de stock)
+        self.assertEqual([c['cantidad'] for c in conteos['categorias']], [2, 1])
+        self.assertEqual(conteos['stock'], {'con_stock': 2, 'sin_stock': 1})
+        self.assertEqual(conteos['oferta'], 1)
+
+    def test_rango_de_precio_y_busqueda_se_aplican_antes(self):
+        conteos = self.facetas(q="parlante", max='5000')
+        self.assertEqual(conteos['total'], 3)
+        self.assertIn('max=4999.99', self.facetas()['precios'][0]['url'])
+
+    def test_una_consulta_y_despues_cache(self):
+        with self.assertNumQueries(1):
+            facetas.agrupar(Producto.objects.all())
+        self.client.get(reverse('lista_productos'))
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('lista_productos'), {'categoria': self.video.id})
+        self.assertFalse([c for c in consultas.captured_queries if 'GROUP BY' in c['sql']])
+
+    def test_precalculadas_por_el_comando(self):
+        call_command('calcular_facetas', una_vez=True, stdout=io.StringIO())
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.facetas()['total'], 6)
+        self.assertFalse([c for c in consultas.captured_queries if 'GROUP BY' in c['sql']])
+
+
+# ======================================================
+# Carrito: totales en SQL y render sin N+1
+# ======================================================
+class CarritoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="comprador", password="x")
+        cls.carrito = Carrito.objects.create(usuario=cls.usuario)
+        cls.productos = Producto.objects.bulk_create(
+            Producto(nombre=f"Producto {i}", descripcion="", precio=Decimal("99.99"), descuento=i % 3 * 10, stock=10)
+            for i in range(50)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def llenar(self, cantidad_lineas):
+        CarritoProducto.objects.bulk_create(
+            CarritoProducto(carrito=self.carrito, producto=p, cantidad=2) for p in self.productos[:cantidad_lineas]
+        )
+
+    def test_total_coincide_con_subtotales(self):
+        self.llenar(50)
+        esperado = sum(
+            round(p.precio_con_descuento, 2) * 2 for p in self.productos
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(self.carrito.total(), esperado)
+        self.assertEqual(sum(item.importe for item in self.carrito.lineas()), esperado)
+
+    def test_total_carrito_vacio(self):
+        self.assertEqual(self.carrito.total(), 0)
+
+    def test_precio_entero_con_descuento_no_redondo(self):
+        # SQLite guarda 99.00 como entero: dividir por 100 en SQL truncaba a 85.00
+        producto = Producto.objects.create(nombre="Entero", descripcion="", precio=99, descuento=15, stock=5)
+        self.assertEqual(Producto.objects.get(pk=producto.pk).precio_con_descuento, Decimal('84.15'))
+        CarritoProducto.objects.create(carrito=self.carrito, producto=producto, cantidad=3)
+
+        self.assertEqual(self.carrito.total(), Decimal('252.45'))
+        self.assertEqual([l.precio_unitario for l in self.carrito.lineas()], [Decimal('84.15')])
+        self.assertEqual([pagos._item(*fila)['unit_price'] for fila in pagos._filas_preferencia(self.carrito)], [84.15])
+        pedido = crear_pedido_desde_carrito(self.usuario)
+        self.assertEqual(pedido.pedidoproducto_set.get().precio_unitario, Decimal('84.15'))
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_consultas_constantes_en_carrito_y_checkout(self):
+        self.llenar(1)
+        una_linea = [self.contar_consultas(reverse(v)) for v in ('ver_carrito', 'checkout')]
+        CarritoProducto.objects.all().delete()
+        self.llenar(50)
+        cincuenta_lineas = [self.contar_consultas(reverse(v)) for v in ('ver_carrito', 'checkout')]
+        self.assertEqual(una_linea, cincuenta_lineas)
+        self.assertLessEqual(max(cincuenta_lineas), 6)
+
+
+@override_settings(CARRITO_MODO='cache', CARRITO_VOLCADO_SEGUNDOS=300)
+class CarritoEnCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="comprador", password="x")
+        cls.mouse = Producto.objects.create(nombre="Mouse", descripcion="", precio=100, stock=2)
+        cls.teclado = Producto.objects.create(nombre="Teclado", descripcion="", precio=200, descuento=10, stock=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def escrituras(self, consultas):
+        return [c['sql'] for c in consultas.captured_queries if 'carritos_' in c['sql'] and not c['sql'].startswith('SELECT')]
+
+    def lineas_en_base(self):
+        return dict(CarritoProducto.objects.filter(carrito__usuario=self.usuario).values_list('producto_id', 'cantidad'))
+
+    def test_clics_no_escriben_en_la_base_y_el_checkout_vuelca(self):
+        with CaptureQueriesContext(connection) as consultas:
+            for producto in (self.mouse, self.mouse, self.mouse, self.teclado, self.teclado):
+                self.client.get(reverse('agregar_al_carrito', args=[producto.id]))
+            self.client.get(reverse('eliminar_del_carrito', args=[self.teclado.id]))
+        self.assertEqual(self.escrituras(consultas), [])
+        self.assertEqual(self.lineas_en_base(), {})
+
+        html = self.client.get(reverse('ver_carrito')).content.decode()
+        self.assertIn("Mouse", html)
+        self.client.get(reverse('checkout'))
+        # La foto del stock limita la cantidad igual que en modo base (stock 2)
+        self.assertEqual(self.lineas_en_base(), {self.mouse.id: 2, self.teclado.id: 1})
+        self.assertEqual(Carrito.objects.get(usuario=self.usuario).total(), Decimal("380.00"))
+
+    def test_volcado_periodico_y_pedido(self):
+        self.client.get(reverse('agregar_al_carrito', args=[self.teclado.id]))
+        self.assertIn(self.usuario.pk, carritos.pendientes())
+        call_command('volcar_carritos', '--una-vez', '--antiguedad', '0', stdout=io.StringIO())
+        self.assertEqual(self.lineas_en_base(), {self.teclado.id: 1})
+        self.assertEqual(carritos.pendientes(), {})
+
+        self.client.get(reverse('vaciar_carrito'))
+        call_command('volcar_carritos', '--una-vez', '--antiguedad', '0', stdout=io.StringIO())
+        self.assertEqual(self.lineas_en_base(), {})
+
+        self.client.get(reverse('agregar_al_carrito', args=[self.mouse.id]))
+        carritos.de(self.usuario).volcar()
+        crear_pedido_desde_carrito(self.usuario)
+        self.assertEqual(carritos.de(self.usuario).lineas(), [])
+
+    def test_pendientes_de_usuarios_concurrentes_no_se_pisan(self):
+        def marcar(desde):
+            for usuario_id in range(desde, desde + 15):
+                carritos._marcar_pendiente(usuario_id, time.time())
+
+        # 8 x 15 usuarios: dos claves cada uno, debajo del MAX_ENTRIES de locmem (300)
+        hilos = [threading.Thread(target=marcar, args=(1000 + h * 15,)) for h in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(set(carritos.pendientes()), set(range(1000, 1120)))
+
+        # Sin carrito cacheado no hay nada que volcar: salen de la lista y se compacta
+        carritos.volcar_pendientes()
+        self.assertEqual(carritos.pendientes(), {})
+        self.assertEqual(cache.get(carritos.CLAVE_PENDIENTES_INICIO), 120)
+
+    def test_dos_pestanas_no_comparten_numero_de_cambio(self):
+        self.client.get(reverse('agregar_al_carrito', args=[self.mouse.id]))
+        call_command('volcar_carritos', '--una-vez', '--antiguedad', '0', stdout=io.StringIO())
+        una, otra = carritos.de(self.usuario), carritos.de(self.usuario)
+        estado_una, estado_otra = una._estado(), otra._estado()
+        estado_una['items'][self.teclado.id] = 1
+        estado_otra['items'][self.mouse.id] = 2
+        una._guardar(estado_una)
+        otra._guardar(estado_otra)
+        self.assertNotEqual(estado_una['cambios'], estado_otra['cambios'])
+        # Gana la última escritura, y es la que se vuelca
+        call_command('volcar_carritos', '--una-vez', '--antiguedad', '0', stdout=io.StringIO())
+        self.assertEqual(self.lineas_en_base(), {self.mouse.id: 2})
+
+
+# ======================================================
+# Alta de pedidos: transaccional y sin sobreventa
+# ======================================================
+class CrearPedidoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="comprador", password="x")
+        cls.mouse = Producto.objects.create(nombre="Mouse", descripcion="", precio=100, descuento=10, stock=5)
+        cls.teclado = Producto.objects.create(nombre="Teclado", descripcion="", precio=200, stock=1)
+
+    def setUp(self):
+        self.carrito = Carrito.objects.create(usuario=self.usuario)
+
+    def test_crea_pedido_descuenta_stock_y_vacia_carrito(self):
+        CarritoProducto.objects.create(carrito=self.carrito, producto=self.mouse, cantidad=2)
+        CarritoProducto.objects.create(carrito=self.carrito, producto=self.teclado, cantidad=1)
+        pedido = crear_pedido_desde_carrito(self.usuario, "Calle 123")
+
+        self.assertEqual(pedido.total, Decimal("380.00"))
+        self.assertEqual(pedido.pedidoproducto_set.count(), 2)
+        self.mouse.refresh_from_db()
+        self.teclado.refresh_from_db()
+        self.assertEqual((self.mouse.stock, self.teclado.stock), (3, 0))
+        self.assertFalse(self.carrito.carritoproducto_set.exists())
+
+    def test_sin_stock_no_modifica_nada(self):
+        CarritoProducto.objects.create(carrito=self.carrito, producto=self.mouse, cantidad=2)
+        CarritoProducto.objects.create(carrito=self.carrito, producto=self.teclado, cantidad=2)
+        with self.assertRaises(StockInsuficiente) as ctx:
+            crear_pedido_desde_carrito(self.usuario)
+
+        self.assertEqual(ctx.exception.productos, [self.teclado])
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock, 5)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertEqual(self.carrito.carritoproducto_set.count(), 2)
+
+    def test_vista_informa_stock_insuficiente(self):
+        CarritoProducto.objects.create(carrito=self.carrito, producto=self.teclado, cantidad=3)
+        self.client.force_login(self.usuario)
+        response = self.client.post(reverse('pago_aprobado'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['status'], 'error')
+        self.assertIn("Teclado", response.json()['message'])
+
+
+class CheckoutConcurrenteTests(TransactionTestCase):
+    COMPRADORES = 30
+    STOCK = 12
+
+    def test_checkouts_simultaneos_no_sobrevenden(self):
+        producto = Producto.objects.create(nombre="Oferta", descripcion="", precio=10, stock=self.STOCK)
+        usuarios = []
+        for i in range(self.COMPRADORES):
+            usuario = Usuario.objects.create_user(username=f"comprador{i}")
+            carrito = Carrito.objects.create(usuario=usuario)
+            CarritoProducto.objects.create(carrito=carrito, producto=producto, cantidad=1)
+            usuarios.append(usuario)
+
+        resultados = []
+        largada = threading.Barrier(self.COMPRADORES)
+
+        def comprar(usuario):
+            try:
+                largada.wait()
+                crear_pedido_desde_carrito(usuario)
+                resultados.append('ok')
+            except StockInsuficiente:
+                resultados.append('sin_stock')
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar, args=(u,)) for u in usuarios]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(timeout=60)
+        duracion = time.perf_counter() - inicio
+
+        # Todos terminaron (sin bloqueos ni "database is locked") en un tiempo razonable
+        self.assertEqual(len(resultados), self.COMPRADORES)
+        self.assertLess(duracion, 30)
+        self.assertEqual(resultados.count('ok'), self.STOCK)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 0)
+        vendidos = PedidoProducto.objects.aggregate(total=Sum('cantidad'))['total']
+        self.assertEqual(vendidos, self.STOCK)
+
+
+# ======================================================
+# Números de pedido: sin colisiones con workers en paralelo
+# ======================================================
+class NumeroPedidoConcurrenteTests(TransactionTestCase):
+    HILOS = 8
+    POR_HILO = 250
+
+    def en_paralelo(self, trabajo):
+        errores = []
+
+        def correr(indice):
+            try:
+                trabajo(indice)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=correr, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(timeout=120)
+        self.assertEqual(errores, [])
+
+    def test_miles_de_pedidos_sin_numeros_repetidos(self):
+        usuario = Usuario.objects.create_user(username="mayorista")
+
+        def crear_pedidos(_):
+            for _ in range(self.POR_HILO):
+                Pedido.objects.create(usuario=usuario, total=1)
+
+        self.en_paralelo(crear_pedidos)
+        numeros = list(Pedido.objects.values_list('numero_pedido', flat=True))
+        self.assertEqual(len(numeros), self.HILOS * self.POR_HILO)
+        self.assertEqual(len(set(numeros)), len(numeros))
+
+    def test_bloques_por_worker_son_unicos_y_crecientes(self):
+        asignados = {}
+
+        def asignar(indice):
+            # Un Asignador por hilo simula un worker con su propio bloque en memoria
+            asignador = Asignador('pedido', tamano_bloque=25)
+            asignados[indice] = [asignador.siguiente() for _ in range(self.POR_HILO)]
+
+        self.en_paralelo(asignar)
+        todos = [n for numeros in asignados.values() for n in numeros]
+        self.assertEqual(len(set(todos)), self.HILOS * self.POR_HILO)
+        for numeros in asignados.values():
+            self.assertEqual(numeros, sorted(numeros))
+
+    def test_reserva_en_lote_no_se_pisa_con_los_bloques(self):
+        asignador = Asignador('pedido', tamano_bloque=10)
+        antes = asignador.siguiente()
+        reservados = Asignador('pedido').reservar(50)
+        self.assertEqual(len(set(reservados)), 50)
+        self.assertGreater(min(reservados), antes + 9)   # después del bloque del otro worker
+        self.assertGreater(Asignador('pedido').siguiente(), max(reservados))
+
+
+# ======================================================
+# Facturas en segundo plano
+# ======================================================
+class FacturasEnColaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="comprador", password="x", first_name="Ana")
+        cls.producto = Producto.objects.create(nombre="Mouse", descripcion="", precio=100, stock=5)
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        ajustes = override_settings(FACTURAS_DIR=self.directorio, FACTURAS_EN_SEGUNDO_PLANO=True)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        carrito = Carrito.objects.create(usuario=self.usuario)
+        CarritoProducto.objects.create(carrito=carrito, producto=self.producto, cantidad=2)
+        self.client.force_login(self.usuario)
+
+    def test_pago_aprobado_encola_y_el_worker_genera_el_pdf(self):
+        respuesta = self.client.post(reverse('pago_aprobado'), HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+        self.assertEqual(respuesta['status'], 'ok')
+        self.assertNotIn('pdf_url', respuesta)
+        self.assertEqual(self.client.get(respuesta['estado_url']).json()['estado'], TareaFactura.PENDIENTE)
+
+        self.assertEqual(cola_facturas.procesar_lote(), 1)
+
+        estado = self.client.get(respuesta['estado_url']).json()
+        self.assertEqual(estado['estado'], TareaFactura.TERMINADA)
+        archivo = os.path.join(self.directorio, os.path.basename(estado['pdf_url']))
+        with open(archivo, 'rb') as f:
+            self.assertEqual(f.read(4), b'%PDF')
+
+    def test_estado_de_pedido_ajeno_no_visible(self):
+        otro = Usuario.objects.create_user(username="otro")
+        pedido = Pedido.objects.create(usuario=otro, total=1)
+        response = self.client.get(reverse('estado_factura', args=[pedido.numero_pedido]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_error_reintenta_y_luego_marca_error(self):
+        pedido = Pedido.objects.create(usuario=self.usuario, total=1)
+        tarea = cola_facturas.encolar_factura(pedido)
+        # Un archivo en lugar de directorio hace fallar la escritura del PDF
+        no_directorio = os.path.join(self.directorio, 'archivo')
+        open(no_directorio, 'w').close()
+        with override_settings(FACTURAS_DIR=no_directorio):
+            for _ in range(cola_facturas.MAX_INTENTOS):
+                cola_facturas.procesar_lote()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (TareaFactura.ERROR, cola_facturas.MAX_INTENTOS))
+
+    def test_tarea_de_worker_caido_vuelve_a_la_cola_en_la_vuelta_siguiente(self):
+        pedido = Pedido.objects.create(usuario=self.usuario, total=1)
+        tarea = cola_facturas.encolar_factura(pedido)
+        self.assertEqual([t.intentos for t in cola_facturas.tomar_tareas(5)], [1])
+        # Sin terminar y antes del vencimiento nadie más la toma
+        self.assertEqual(cola_facturas.procesar_lote(), 0)
+
+        TareaFactura.objects.filter(pk=tarea.pk).update(tomada=timezone.now() - cola_facturas.VENCIMIENTO * 2)
+        self.assertEqual(cola_facturas.procesar_lote(), 1)
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (TareaFactura.TERMINADA, 2))
+
+    def test_tarea_que_siempre_tumba_al_worker_termina_en_error(self):
+        pedido = Pedido.objects.create(usuario=self.usuario, total=1)
+        tarea = cola_facturas.encolar_factura(pedido)
+        vencida = timezone.now() - cola_facturas.VENCIMIENTO * 2
+        for _ in range(cola_facturas.MAX_INTENTOS):
+            self.assertEqual(len(cola_facturas.tomar_tareas(5)), 1)
+            TareaFactura.objects.filter(pk=tarea.pk).update(tomada=vencida)
+        self.assertEqual(cola_facturas.procesar_lote(), 0)
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (TareaFactura.ERROR, cola_facturas.MAX_INTENTOS))
+
+    def test_worker_con_pool_de_procesos(self):
+        pedidos = [Pedido.objects.create(usuario=self.usuario, total=1) for _ in range(4)]
+        for pedido in pedidos:
+            cola_facturas.encolar_factura(pedido)
+        call_command('procesar_facturas', procesos=2, una_vez=True, stdout=io.StringIO())
+        self.assertEqual(TareaFactura.objects.filter(estado=TareaFactura.TERMINADA).count(), 4)
+        self.assertEqual(len(os.listdir(self.directorio)), 4)
+
+
+class RegenerarFacturasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create_user(username="comprador")
+        producto = Producto.objects.create(nombre="Mouse", descripcion="", precio=100)
+        cls.pedidos = []
+        for _ in range(5):
+            pedido = Pedido.objects.create(usuario=usuario, total=100)
+            PedidoProducto.objects.create(pedido=pedido, producto=producto, cantidad=1, precio_unitario=100)
+            cls.pedidos.append(pedido)
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_regenera_por_numero_con_pool(self):
+        salida = io.StringIO()
+        numeros = [p.numero_pedido for p in self.pedidos[:3]]
+        with override_settings(FACTURAS_DIR=self.directorio):
+            call_command('regenerar_facturas', pedidos=numeros, procesos=2, lote=2, stdout=salida)
+        self.assertEqual(
+            sorted(os.listdir(self.directorio)),
+            [f"pedido_{p.numero_pedido_formateado()}.pdf" for p in self.pedidos[:3]],
+        )
+        self.assertIn("3 facturas regeneradas", salida.getvalue())
+
+    def test_regenera_por_rango_de_fechas(self):
+        hoy = timezone.localdate().isoformat()
+        with override_settings(FACTURAS_DIR=self.directorio):
+            call_command('regenerar_facturas', '--desde', hoy, '--hasta', hoy, '--procesos', '1', stdout=io.StringIO())
+        self.assertEqual(len(os.listdir(self.directorio)), 5)
+
+
+# ======================================================
+# Derivadas de imágenes (miniatura / tarjeta / zoom)
+# ======================================================
+class DerivadasImagenesTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _imagen(self, nombre="foto.png", tamano=(1600, 800)):
+        buffer = io.BytesIO()
+        Image.new('RGBA', tamano, (200, 30, 30, 255)).save(buffer, 'PNG')
+        return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+    def _derivadas(self, objeto):
+        return os.path.join(self.media, 'img_productos', imagenes.DIRECTORIO, objeto.imagen_hash)
+
+    def test_subir_imagen_genera_derivadas_reducidas(self):
+        producto = Producto.objects.create(nombre="Silla", descripcion="", precio=1, imagen=self._imagen())
+        producto.refresh_from_db()
+        self.assertTrue(producto.imagen_hash)
+        self.assertEqual(len(os.listdir(self._derivadas(producto))), len(imagenes.VARIANTES) * len(imagenes.FORMATOS))
+        for variante, ancho in imagenes.VARIANTES.items():
+            with Image.open(os.path.join(self._derivadas(producto), f"{variante}.webp")) as derivada:
+                self.assertEqual(derivada.size, (ancho, ancho // 2))
+
+        html = self.client.get(reverse('lista_productos')).content.decode()
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f"{producto.imagen_hash}/tarjeta.jpg 400w", html)
+        html = self.client.get(reverse('detalle_producto', args=[producto.id])).content.decode()
+        self.assertIn(f"{producto.imagen_hash}/zoom.webp 1200w", html)
+
+    def test_misma_imagen_reutiliza_derivadas_y_no_agranda(self):
+        a = Producto.objects.create(nombre="A", descripcion="", precio=1, imagen=self._imagen("a.png", (100, 50)))
+        b = Producto.objects.create(nombre="B", descripcion="", precio=1, imagen=self._imagen("b.png", (100, 50)))
+        self.assertEqual(a.imagen_hash, b.imagen_hash)
+        with Image.open(os.path.join(self._derivadas(a), "zoom.jpg")) as derivada:
+            self.assertEqual(derivada.size, (100, 50))
+
+    def test_comando_completa_imagenes_existentes(self):
+        producto = Producto.objects.create(nombre="Silla", descripcion="", precio=1, imagen=self._imagen())
+        Producto.objects.filter(pk=producto.pk).update(imagen_hash='')
+        shutil.rmtree(os.path.join(self.media, 'img_productos', imagenes.DIRECTORIO))
+
+        salida = io.StringIO()
+        call_command('generar_derivadas', procesos=2, stdout=salida)
+        producto.refresh_from_db()
+        self.assertTrue(os.path.exists(os.path.join(self._derivadas(producto), "tarjeta.webp")))
+        self.assertIn("1 imágenes procesadas (0 con error)", salida.getvalue())
+
+
+# ======================================================
+# Entrega de archivos (ETag, Range, caché, offload)
+# ======================================================
+class ArchivosTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.contenido = bytes(range(256)) * 40
+        self.derivada = f"img_productos/{imagenes.DIRECTORIO}/{'a1' * 10}/tarjeta.jpg"
+        for ruta in ("img_productos/foto.jpg", self.derivada):
+            os.makedirs(os.path.join(self.media, os.path.dirname(ruta)), exist_ok=True)
+            with open(os.path.join(self.media, ruta), 'wb') as archivo:
+                archivo.write(self.contenido)
+        ajustes = override_settings(MEDIA_ROOT=self.media, FACTURAS_DIR=self.media, MEDIA_OFFLOAD='')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _get(self, ruta='img_productos/foto.jpg', **cabeceras):
+        return self.client.get(f"/media/{ruta}", **cabeceras)
+
+    def test_validadores_y_304(self):
+        respuesta = self._get()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido)
+        self.assertEqual(respuesta['Content-Type'], 'image/jpeg')
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+        self.assertEqual(respuesta['Cache-Control'], 'public, max-age=3600')
+
+        no_modificado = self._get(HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(no_modificado.status_code, 304)
+        self.assertEqual(no_modificado['ETag'], respuesta['ETag'])
+        self.assertEqual(self._get(HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304)
+
+    def test_derivadas_inmutables(self):
+        self.assertEqual(self._get(self.derivada)['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_rangos(self):
+        respuesta = self._get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(respuesta['Content-Range'], f"bytes 100-199/{len(self.contenido)}")
+        self.assertEqual(respuesta['Content-Length'], '100')
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido[100:200])
+
+        respuesta = self._get(HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(respuesta.streaming_content), self.contenido[-10:])
+
+        respuesta = self._get(HTTP_RANGE=f'bytes={len(self.contenido)}-')
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta['Content-Range'], f"bytes */{len(self.contenido)}")
+
+        # Varios tramos o un If-Range que no coincide: el archivo entero
+        self.assertEqual(self._get(HTTP_RANGE='bytes=0-1,5-6').status_code, 200)
+        self.assertEqual(self._get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"otro"').status_code, 200)
+        etag = self._get()['ETag']
+        self.assertEqual(self._get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag).status_code, 206)
+
+    def test_rutas_fuera_de_media_y_metodos(self):
+        self.assertEqual(self._get('../manage.py').status_code, 404)
+        self.assertEqual(self._get('img_productos').status_code, 404)
+        self.assertEqual(self.client.post("/media/img_productos/foto.jpg").status_code, 405)
+        respuesta = self.client.head("/media/img_productos/foto.jpg")
+        self.assertEqual((respuesta['Content-Length'], respuesta.content), (str(len(self.contenido)), b''))
+
+    def test_offload_al_servidor_de_adelante(self):
+        with override_settings(MEDIA_OFFLOAD='nginx', MEDIA_OFFLOAD_PREFIJO='/protegido/'):
+            respuesta = self._get()
+        self.assertEqual(respuesta['X-Accel-Redirect'], '/protegido/media/img_productos/foto.jpg')
+        self.assertEqual(respuesta.content, b'')
+        self.assertIn('ETag', respuesta)
+
+        with override_settings(MEDIA_OFFLOAD='sendfile'):
+            respuesta = self._get()
+        self.assertEqual(respuesta['X-Sendfile'], os.path.join(self.media, 'img_productos', 'foto.jpg'))
+
+    def test_facturas_privadas(self):
+        duenio = Usuario.objects.create_user(username="duenio", password="x")
+        pedido = Pedido.objects.create(usuario=duenio, total=10)
+        numero = pedido.numero_pedido_formateado()
+        with open(os.path.join(self.media, facturas_mod.nombre_archivo(numero)), 'wb') as archivo:
+            archivo.write(b'%PDF-1.4')
+        url = facturas_mod.url_factura(numero)
+
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(duenio)
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertEqual(respuesta['Cache-Control'], 'private, no-cache')
+
+        # Otro cliente no la ve, ni con offload (el servidor de adelante no revisa permisos)
+        self.client.force_login(Usuario.objects.create_user(username="otro", password="x"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(MEDIA_OFFLOAD='nginx'):
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertNotIn('X-Accel-Redirect', respuesta)
+
+        self.client.force_login(Usuario.objects.create_user(username="admin", password="x", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_facturas_viejas_no_se_sirven_como_estaticos(self):
+        self.assertEqual(estaticos.prefijos_privados(), ())  # FACTURAS_DIR fuera de static/ en este test
+        with override_settings(FACTURAS_DIR=os.path.join('static', 'media', 'pedidos')):
+            self.assertEqual(estaticos.prefijos_privados(), ('/static/media/pedidos/',))
+            respuesta = Client().get('/static/media/pedidos/pedido_00001.pdf')
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertEqual(Client().get('/static/css/styles.css').status_code, 200)
+
+
+# ======================================================
+# Caché del catálogo (tarjetas y categorías)
+# ======================================================
+class CacheCatalogoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Sillas")
+        cls.producto = Producto.objects.create(
+            nombre="Silla Gamer", descripcion="", precio=100, stock=50, categoria=cls.categoria
+        )
+
+    def setUp(self):
+        # La versión incrementada por un test no vuelve atrás con su rollback
+        cache.clear()
+
+    def test_segunda_visita_sale_de_la_cache(self):
+        self.client.get(reverse('lista_productos'))
+        with CaptureQueriesContext(connection) as consultas:
+            html = self.client.get(reverse('lista_productos')).content.decode()
+        self.assertIn("Silla Gamer", html)
+        self.assertIn("Sillas", html)
+        self.assertFalse(any('categorias_productos' in c['sql'] for c in consultas.captured_queries))
+        self.assertEqual(cache_catalogo.estadisticas()['aciertos'], 2)
+
+    def test_guardar_producto_o_categoria_invalida(self):
+        self.client.get(reverse('lista_productos'))
+        self.producto.nombre = "Silla Ergonómica"
+        self.producto.save()
+        self.categoria.nombre = "Asientos"
+        self.categoria.save()
+        html = self.client.get(reverse('lista_productos')).content.decode()
+        self.assertIn("Silla Ergonómica", html)
+        self.assertIn("Asientos", html)
+
+    def test_stock_descontado_sin_senales_se_refleja(self):
+        self.client.get(reverse('lista_productos'))
+        Producto.objects.filter(pk=self.producto.pk).update(stock=3)
+        self.assertIn("Quedan 3 en stock", self.client.get(reverse('lista_productos')).content.decode())
+
+    def test_precio_e_imagen_actualizados_en_lote_se_reflejan(self):
+        Producto.objects.filter(pk=self.producto.pk).update(imagen='productos/silla.jpg', imagen_hash='a1b2c3d4')
+        self.assertIn("a1b2c3d4", self.client.get(reverse('lista_productos')).content.decode())
+        Producto.objects.filter(pk=self.producto.pk).update(precio=80, descuento=25)
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.imagen_hash = 'e5f6a7b8'
+        Producto.objects.bulk_update([producto], ['imagen_hash'])
+        html = self.client.get(reverse('lista_productos')).content.decode()
+        self.assertIn("$60.00", html)
+        self.assertIn("e5f6a7b8", html)
+        self.assertNotIn("a1b2c3d4", html)
+
+
+# ======================================================
+# Admin: listados con una consulta anotada
+# ======================================================
+class AdminListadosTests(TestCase):
+    MODELOS = ('categoria', 'producto', 'carrito', 'carritoproducto', 'pedido', 'pedidoproducto')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_superuser(username="admin", password="x", email="admin@example.com")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def crear_filas(self, desde, hasta):
+        for i in range(desde, hasta):
+            categoria = Categoria.objects.create(nombre=f"Categoría {i}")
+            producto = Producto.objects.create(
+                nombre=f"Producto {i}", descripcion="", precio=100, descuento=10, stock=5, categoria=categoria
+            )
+            usuario = Usuario.objects.create(username=f"cliente{i}")
+            carrito = Carrito.objects.create(usuario=usuario)
+            CarritoProducto.objects.create(carrito=carrito, producto=producto, cantidad=2)
+            pedido = Pedido.objects.create(usuario=usuario, total=90)
+            PedidoProducto.objects.create(pedido=pedido, producto=producto, cantidad=1, precio_unitario=90)
+
+    def consultas_por_listado(self):
+        resultado = {}
+        for modelo in self.MODELOS:
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(reverse(f'admin:productos_{modelo}_changelist'))
+            self.assertEqual(respuesta.status_code, 200)
+            resultado[modelo] = len(consultas.captured_queries)
+        return resultado
+
+    def test_consultas_constantes_con_100_filas(self):
+        self.crear_filas(0, 2)
+        pocas = self.consultas_por_listado()
+        self.crear_filas(2, 100)
+        cien = self.consultas_por_listado()
+        self.assertEqual(pocas, cien)
+
+    def test_totales_calculados_en_sql(self):
+        self.crear_filas(0, 1)
+        html = self.client.get(reverse('admin:productos_carrito_changelist'), {'o': '2'}).content.decode()
+        self.assertIn("180.00", html)
+        html = self.client.get(reverse('admin:productos_carritoproducto_changelist')).content.decode()
+        self.assertIn("Carrito de cliente0 (1 productos)", html)
+
+
+# ======================================================
+# Importación / exportación masiva del catálogo
+# ======================================================
+class CargaCatalogoTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def archivo(self, nombre, contenido):
+        ruta = os.path.join(self.directorio, nombre)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        return ruta
+
+    def importar(self, ruta, *args):
+        salida, errores = io.StringIO(), io.StringIO()
+        call_command('importar_catalogo', ruta, '--lote', '2', *args, stdout=salida, stderr=errores)
+        return salida.getvalue(), errores.getvalue()
+
+    def test_importa_csv_y_actualiza_por_sku_con_jsonl(self):
+        Categoria.objects.create(nombre="Sillas")
+        salida, errores = self.importar(self.archivo('feed.csv', (
+            "sku,nombre,descripcion,precio,descuento,stock,categoria\n"
+            "S-1,Silla Gamer,Reclinable,150000,10,5,Sillas\n"
+            "M-1,Monitor 27,,300000,0,2,Monitores\n"
+            "X-1,Sin precio,,abc,0,1,Sillas\n"
+            "N-1,Precio NaN,,NaN,0,1,Sillas\n"
+            "T-1,Teclado,,50000,0,0,\n"
+        )))
+        self.assertIn("3 productos importados", salida)
+        self.assertIn("filas/s", salida)
+        self.assertIn("Línea 4", errores)
+        self.assertIn("Línea 5", errores)
+        self.assertEqual(Categoria.objects.count(), 2)
+        self.assertEqual(Producto.objects.get(sku="M-1").categoria.nombre, "Monitores")
+        self.assertIsNone(Producto.objects.get(sku="T-1").categoria)
+
+        self.importar(self.archivo('feed.jsonl', (
+            '{"sku": "S-1", "nombre": "Silla Gamer Pro", "precio": "120000.50", "stock": 8, "categoria": "Sillas"}\n'
+            '{"sku": "S-1", "nombre": "Silla Gamer Pro", "precio": "110000", "stock": 9, "categoria": "Sillas"}\n'
+        )), '--sin-similares')
+        self.assertEqual(Producto.objects.count(), 3)
+        silla = Producto.objects.get(sku="S-1")
+        self.assertEqual((silla.nombre, silla.precio, silla.stock), ("Silla Gamer Pro", Decimal("110000.00"), 9))
+        # bulk_create no dispara señales: el lote se indexa igual
+        self.assertEqual(list(busqueda.buscar_productos(Producto.objects.all(), "gamer pro")), [silla])
+
+    def test_precios_no_finitos_son_filas_invalidas(self):
+        for precio in ("NaN", "sNaN", "Infinity", "-inf"):
+            with self.subTest(precio=precio), self.assertRaises(carga_catalogo.FilaInvalida):
+                carga_catalogo.normalizar({'sku': "N-1", 'nombre': "Nan", 'precio': precio})
+
+    def test_exportar_e_importar_ida_y_vuelta(self):
+        categoria = Categoria.objects.create(nombre="Audio")
+        Producto.objects.create(sku="A-1", nombre="Auriculares", descripcion="Con \"micrófono\", USB",
+                                precio=Decimal("999.90"), descuento=5, stock=3, categoria=categoria)
+        for formato in carga_catalogo.FORMATOS:
+            ruta = os.path.join(self.directorio, f'catalogo.{formato}')
+            call_command('exportar_catalogo', ruta, stdout=io.StringIO())
+            Producto.objects.update(precio=1, descripcion="")
+            self.importar(ruta, '--sin-similares')
+            producto = Producto.objects.get()
+            self.assertEqual(producto.precio, Decimal("999.90"))
+            self.assertEqual(producto.descripcion, 'Con "micrófono", USB')
+
+
+# ======================================================
+# Agregados de ventas diarias
+# ======================================================
+class VentasDiariasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="comprador", password="x")
+        cls.sillas = Categoria.objects.create(nombre="Sillas")
+        cls.silla = Producto.objects.create(nombre="Silla", descripcion="", precio=100, stock=50, categoria=cls.sillas)
+        cls.mesa = Producto.objects.create(nombre="Mesa", descripcion="", precio=300, descuento=10, stock=50)
+
+    def comprar(self, *lineas):
+        carrito, _ = Carrito.objects.get_or_create(usuario=self.usuario)
+        for producto, cantidad in lineas:
+            CarritoProducto.objects.create(carrito=carrito, producto=producto, cantidad=cantidad)
+        return crear_pedido_desde_carrito(self.usuario)
+
+    def agregados(self):
+        return {
+            'dia': list(VentaDiaria.objects.values_list('dia', 'pedidos', 'unidades', 'ingresos')),
+            'producto': sorted(VentaDiariaProducto.objects.values_list('producto_id', 'pedidos', 'unidades', 'ingresos')),
+            'categoria': sorted(
+                VentaDiariaCategoria.objects.values_list('categoria_id', 'pedidos', 'unidades', 'ingresos'),
+                key=lambda f: f[0] or 0,
+            ),
+        }
+
+    def test_cada_pedido_suma_y_reconstruir_da_lo_mismo(self):
+        self.comprar((self.silla, 2), (self.mesa, 1))
+        self.comprar((self.silla, 1))
+        hoy = timezone.localdate()
+        incremental = self.agregados()
+        self.assertEqual(incremental['dia'], [(hoy, 2, 4, Decimal("570.00"))])
+        self.assertEqual(incremental['producto'], [
+            (self.silla.id, 2, 3, Decimal("300.00")), (self.mesa.id, 1, 1, Decimal("270.00")),
+        ])
+        self.assertEqual(incremental['categoria'], [
+            (None, 1, 1, Decimal("270.00")), (self.sillas.id, 2, 3, Decimal("300.00")),
+        ])
+
+        call_command('reconstruir_ventas', stdout=io.StringIO())
+        self.assertEqual(self.agregados(), incremental)
+        call_command('reconstruir_ventas', '--desde', str(hoy), '--hasta', str(hoy), stdout=io.StringIO())
+        self.assertEqual(self.agregados(), incremental)
+
+    def test_reporte_del_admin_lee_solo_agregados(self):
+        self.comprar((self.silla, 2))
+        admin = Usuario.objects.create_superuser(username="admin", password="x", email="admin@example.com")
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('admin:productos_ventadiaria_changelist'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, "1 pedidos")
+        self.assertContains(respuesta, "Silla")
+        self.assertFalse(any('pedidos_' in c['sql'] for c in consultas.captured_queries))
+
+
+# ======================================================
+# Historial de pedidos paginado
+# ======================================================
+@override_settings(PEDIDOS_TAMANO_PAGINA=20, SESSION_ENGINE='django.contrib.sessions.backends.db')
+class HistorialPedidosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="comprador", password="x")
+        productos = Producto.objects.bulk_create(
+            Producto(nombre=f"Producto {i}", descripcion="", precio=10, stock=0) for i in range(3)
+        )
+        pedidos = Pedido.objects.bulk_create(
+            Pedido(usuario=cls.usuario, total=30, pagado=True) for _ in range(1000)
+        )
+        # Fechas distintas y algunas repetidas (el id desempata)
+        inicio = timezone.now()
+        for i, pedido in enumerate(pedidos):
+            pedido.fecha = inicio - timezone.timedelta(minutes=i // 2)
+        Pedido.objects.bulk_update(pedidos, ['fecha'])
+        PedidoProducto.objects.bulk_create(
+            PedidoProducto(pedido=pedido, producto=producto, cantidad=1, precio_unitario=10)
+            for pedido in pedidos for producto in productos
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def test_consultas_acotadas_con_1000_pedidos(self):
+        url = reverse('historial_compras')
+        self.client.get(url)  # sesión y resumen ya cacheados
+        with self.assertNumQueries(5):
+            respuesta = self.client.get(url)
+        self.assertContains(respuesta, "1000 compras")
+        self.assertContains(respuesta, "Producto 2 (x1)", count=20)
+
+    def test_cursor_con_fecha_editada_vuelve_al_inicio(self):
+        respuesta = self.client.get(reverse('historial_compras'), {'cursor': codificar_cursor('s', 'ayer', 1)})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, "Producto 2 (x1)", count=20)
+
+    def test_recorre_todos_los_pedidos_sin_repetir(self):
+        vistos, url = [], reverse('historial_compras')
+        while url:
+            respuesta = self.client.get(url)
+            vistos += [p.pk for p in respuesta.context['pedidos']]
+            siguiente = respuesta.context['url_siguiente']
+            url = reverse('historial_compras') + siguiente if siguiente else None
+        # Misma fecha: desempata por id, también descendente
+        esperado = list(Pedido.objects.filter(usuario=self.usuario).order_by('-fecha', '-id').values_list('id', flat=True))
+        self.assertEqual(vistos, esperado)
+
+    def test_pagina_profunda_busca_en_el_indice(self):
+        url = reverse('historial_compras')
+        for _ in range(30):
+            url = reverse('historial_compras') + self.client.get(url).context['url_siguiente']
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(len(respuesta.context['pedidos']), 20)
+        sql = next(c['sql'] for c in consultas.captured_queries if 'ORDER BY' in c['sql'] and 'pedidos_usuarios' in c['sql'])
+        plan = planes.plan((sql, ()))
+        # Búsqueda por (usuario, fecha) desde el cursor y sin ordenar aparte
+        self.assertIn('pedidos_usuario_fecha_idx', plan)
+        self.assertEqual(planes.recorridos_completos(plan, connection.vendor), [], plan)
+        if connection.vendor == 'sqlite':
+            self.assertIn('usuario_id=? AND fecha<?', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_resumen_se_invalida_con_un_pedido_nuevo(self):
+        self.assertEqual(pedidos_mod.resumen_de(self.usuario)['cantidad'], 1000)
+        Pedido.objects.create(usuario=self.usuario, total=5, pagado=True)
+        self.assertEqual(pedidos_mod.resumen_de(self.usuario)['cantidad'], 1001)
+
+
+# ======================================================
+# Productos similares precalculados
+# ======================================================
+class SimilaresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sillas = Categoria.objects.create(nombre="Sillas")
+        cls.otros = Categoria.objects.create(nombre="Otros")
+        cls.roja = Producto.objects.create(
+            nombre="Silla Gamer Roja", descripcion="", precio=100, stock=5, categoria=cls.sillas
+        )
+        cls.azul = Producto.objects.create(
+            nombre="Silla Gamer Azul", descripcion="", precio=110, stock=5, categoria=cls.sillas
+        )
+        cls.taburete = Producto.objects.create(
+            nombre="Taburete", descripcion="", precio=900, stock=5, categoria=cls.sillas
+        )
+        cls.oficina = Producto.objects.create(
+            nombre="Silla de oficina", descripcion="", precio=100, stock=5, categoria=cls.otros
+        )
+        cls.mouse = Producto.objects.create(nombre="Mouse", descripcion="", precio=100, stock=5, categoria=cls.otros)
+
+    def _similares(self, producto):
+        return list(producto.similares.order_by('posicion').values_list('similar__nombre', flat=True))
+
+    def test_ordena_por_parecido_y_cruza_categorias(self):
+        self.assertEqual(self._similares(self.roja), ["Silla Gamer Azul", "Taburete", "Silla de oficina"])
+        self.assertEqual(self._similares(self.mouse), ["Silla de oficina"])
+
+    def test_se_actualiza_al_guardar_y_borrar(self):
+        nueva = Producto.objects.create(
+            nombre="Silla Gamer Roja XL", descripcion="", precio=100, stock=5, categoria=self.sillas
+        )
+        self.assertEqual(self._similares(self.roja)[0], "Silla Gamer Roja XL")
+        self.assertEqual(self._similares(self.azul)[:2], ["Silla Gamer Roja", "Silla Gamer Roja XL"])
+
+        nueva.nombre, nueva.categoria = "Teclado", self.otros
+        nueva.save()
+        self.assertNotIn("Teclado", self._similares(self.roja))
+        self.assertIn("Teclado", self._similares(self.mouse))
+
+        self.azul.delete()
+        self.assertEqual(self._similares(self.roja), ["Taburete", "Silla de oficina"])
+
+    def test_lista_llena_se_completa_al_perder_un_similar(self):
+        for i in range(similares.TOP):
+            Producto.objects.create(nombre=f"Silla {i}", descripcion="", precio=100, stock=5, categoria=self.sillas)
+        self.assertEqual(self._similares(self.roja)[0], "Silla Gamer Azul")
+        self.azul.nombre, self.azul.categoria = "Teclado", self.otros
+        self.azul.save()
+        # El que estaba noveno entra a la lista (no queda con un lugar vacío)
+        self.assertEqual(self._similares(self.roja), [f"Silla {i}" for i in range(similares.TOP)])
+
+    def test_detalle_con_consultas_fijas(self):
+        self.client.get(reverse('detalle_producto', args=[self.roja.id]))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('detalle_producto', args=[self.roja.id]))
+        self.assertContains(response, "Silla Gamer Azul")
+
+
+# ======================================================
+# Cliente de Mercado Pago contra un servidor HTTP local
+# ======================================================
+class _PasarelaFalsa(BaseHTTPRequestHandler):
+    """
+    Simula la API: POST de preferencias ('ok', 'lento' o 'error' según `modo`)
+    y GET /v1/payments/<id> (estado según `estados`, aprobado por defecto;
+    monto según `montos`).
+    """
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    modo = 'ok'
+    demora = 0.0
+    llamadas = 0
+    consultas_pago = 0
+    estados = {}
+    montos = {}
+    conexiones = set()
+    _lock = threading.Lock()
+
+    def _responder(self, estado, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        try:
+            self.send_response(estado)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente ya cortó por timeout
+
+    def do_POST(self):
+        cls = type(self)
+        with cls._lock:
+            cls.llamadas += 1
+            cls.conexiones.add(self.client_address)
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if cls.modo == 'lento':
+            time.sleep(cls.demora)
+        if cls.modo == 'error':
+            self._responder(500, {'message': 'internal_error'})
+        else:
+            self._responder(201, {'id': 'pref-1', 'sandbox_init_point': 'https://sandbox.mp/checkout/pref-1'})
+
+    def do_GET(self):
+        cls = type(self)
+        with cls._lock:
+            cls.consultas_pago += 1
+        pago_id = self.path.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+        if cls.modo == 'error':
+            self._responder(500, {'message': 'internal_error'})
+        elif cls.estados.get(pago_id) == 'inexistente':
+            self._responder(404, {'message': 'Payment not found'})
+        else:
+            self._responder(200, {
+                'id': pago_id,
+                'status': cls.estados.get(pago_id, 'approved'),
+                'external_reference': f"REF-{pago_id}",
+                'transaction_amount': cls.montos.get(pago_id),
+            })
+
+    def log_message(self, *args):
+        pass
+
+
+class _ConPasarelaFalsa:
+    """Levanta la pasarela falsa una vez por clase y apunta el cliente de pagos a ella."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _PasarelaFalsa)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.servidor.server_close)
+        cls.addClassCleanup(cls.servidor.shutdown)
+
+    def usar_pasarela_falsa(self, **ajustes):
+        _PasarelaFalsa.modo, _PasarelaFalsa.estados, _PasarelaFalsa.montos = 'ok', {}, {}
+        _PasarelaFalsa.llamadas, _PasarelaFalsa.consultas_pago, _PasarelaFalsa.conexiones = 0, 0, set()
+        ajustes = override_settings(MP_API_URL=f"http://127.0.0.1:{self.servidor.server_address[1]}", **ajustes)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        pagos.reiniciar()
+        self.addCleanup(pagos.reiniciar)
+
+
+class PagosTests(_ConPasarelaFalsa, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="comprador", email="c@x.com")
+        carrito = Carrito.objects.create(usuario=cls.usuario)
+        for i in range(5):
+            producto = Producto.objects.create(nombre=f"Producto {i}", descripcion="", precio=100, descuento=10)
+            CarritoProducto.objects.create(carrito=carrito, producto=producto, cantidad=i + 1)
+
+    def setUp(self):
+        self.usar_pasarela_falsa(MP_TIMEOUT_LECTURA=0.3, MP_DISYUNTOR_FALLOS=2, MP_DISYUNTOR_ESPERA=0.5)
+        self.client.force_login(self.usuario)
+
+    def _checkout(self):
+        return self.client.post(reverse('checkout'), {'direccion': 'Calle 1'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_checkout_reutiliza_la_conexion_y_arma_items_en_una_consulta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self._checkout()
+        self.assertEqual(respuesta.content.decode(), 'https://sandbox.mp/checkout/pref-1')
+        self.assertEqual(sum('carritos_productos' in c['sql'] for c in consultas.captured_queries), 1)
+        self._checkout()
+        self._checkout()
+        self.assertEqual(_PasarelaFalsa.llamadas, 3)
+        self.assertEqual(len(_PasarelaFalsa.conexiones), 1)
+
+    def test_checkout_informa_el_tiempo_de_la_pasarela(self):
+        self.assertIn('externo;dur=', self._checkout()['Server-Timing'])
+
+    def test_items_con_descuento(self):
+        items = pagos.items_preferencia(self.usuario.carrito)
+        self.assertEqual([i['quantity'] for i in items], [1, 2, 3, 4, 5])
+        self.assertEqual(items[0]['unit_price'], 90.0)
+
+    def test_pasarela_lenta_corta_por_timeout(self):
+        _PasarelaFalsa.modo, _PasarelaFalsa.demora = 'lento', 1.0
+        inicio = time.perf_counter()
+        respuesta = self._checkout().json()
+        self.assertLess(time.perf_counter() - inicio, 0.9)
+        self.assertTrue(respuesta['error'])
+
+    def test_disyuntor_falla_rapido_y_se_recupera(self):
+        _PasarelaFalsa.modo = 'error'
+        for _ in range(2):
+            with self.assertRaises(pagos.PasarelaNoDisponible):
+                pagos.crear_preferencia({'items': []})
+        self.assertEqual(pagos.sdk().http_client.disyuntor.estado, pagos.Disyuntor.ABIERTO)
+
+        # Abierto: no llega a la pasarela
+        respuesta = self._checkout().json()
+        self.assertTrue(respuesta['error'])
+        self.assertEqual(_PasarelaFalsa.llamadas, 2)
+
+        # Pasada la espera, una llamada de prueba exitosa lo cierra
+        _PasarelaFalsa.modo = 'ok'
+        time.sleep(0.6)
+        self.assertEqual(pagos.crear_preferencia({'items': []}), 'https://sandbox.mp/checkout/pref-1')
+        self.assertEqual(pagos.sdk().http_client.disyuntor.estado, pagos.Disyuntor.CERRADO)
+
+    def test_prueba_con_excepcion_inesperada_no_traba_el_disyuntor(self):
+        _PasarelaFalsa.modo = 'error'
+        for _ in range(2):
+            with self.assertRaises(pagos.PasarelaNoDisponible):
+                pagos.crear_preferencia({'items': []})
+        time.sleep(0.6)
+
+        # La llamada de prueba revienta antes de llegar a la pasarela (ni éxito ni fallo)
+        http = pagos.sdk().http_client
+        with self.assertRaises(TypeError):
+            http.request('POST', http.url_api + '/checkout/preferences', json=object())
+        self.assertEqual(http.disyuntor.estado, pagos.Disyuntor.SEMIABIERTO)
+
+        _PasarelaFalsa.modo = 'ok'
+        self.assertEqual(pagos.crear_preferencia({'items': []}), 'https://sandbox.mp/checkout/pref-1')
+        self.assertEqual(http.disyuntor.estado, pagos.Disyuntor.CERRADO)
+
+
+# ======================================================
+# Vistas async (ASGI): catálogo, detalle y checkout
+# ======================================================
+class _UrlsAsync:
+    """Las rutas del sitio con las vistas async, como las registra urls.py con VISTAS_ASYNC."""
+    urlpatterns = [
+        path('', vistas_async.lista_productos, name='lista_productos'),
+        path('producto/<int:producto_id>/', vistas_async.detalle_producto, name='detalle_producto'),
+        path('checkout/', vistas_async.checkout, name='checkout'),
+        *tienda_urls.urlpatterns,
+    ]
+
+
+@override_settings(ROOT_URLCONF=_UrlsAsync)
+class VistasAsyncTests(_ConPasarelaFalsa, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="comprador", email="c@x.com")
+        carrito = Carrito.objects.create(usuario=cls.usuario)
+        cls.productos = [
+            Producto.objects.create(nombre=f"Monitor {i}", descripcion="", precio=100, descuento=10, stock=5)
+            for i in range(3)
+        ]
+        CarritoProducto.objects.create(carrito=carrito, producto=cls.productos[0], cantidad=2)
+
+    def setUp(self):
+        cache.clear()
+        self.usar_pasarela_falsa(MP_DISYUNTOR_FALLOS=2, MP_DISYUNTOR_ESPERA=30)
+
+    async def _checkout(self):
+        return await self.async_client.post(
+            reverse('checkout'), {'direccion': 'Calle 1'}, headers={'X-Requested-With': 'XMLHttpRequest'},
+        )
+
+    async def test_catalogo_y_detalle(self):
+        respuesta = await self.async_client.get(reverse('lista_productos'), {'orden': 'precio'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([p.pk for p in respuesta.context['productos']], [p.pk for p in self.productos])
+        self.assertEqual(respuesta.context['facetas']['total'], 3)
+
+        respuesta = await self.async_client.get(reverse('detalle_producto', args=[self.productos[1].pk]))
+        self.assertContains(respuesta, "Monitor 1")
+        respuesta = await self.async_client.get(reverse('detalle_producto', args=[999999]))
+        self.assertEqual(respuesta.status_code, 404)
+
+    async def test_checkout_crea_el_intento_y_la_preferencia(self):
+        await self.async_client.aforce_login(self.usuario)
+        respuesta = await self._checkout()
+        self.assertEqual(respuesta.content.decode(), 'https://sandbox.mp/checkout/pref-1')
+        intento = await IntentoPago.objects.aget(usuario=self.usuario)
+        self.assertEqual((intento.direccion_envio, intento.total), ('Calle 1', Decimal('180.00')))
+        self.assertEqual(await intento.lineas.acount(), 1)
+        self.assertEqual(await self.async_client.session.aget('referencia_pago'), intento.referencia)
+        # El middleware mide también bajo async: SQL del hilo del request y la pasarela
+        self.assertIn('externo;dur=', respuesta['Server-Timing'])
+        self.assertNotIn('"0 consultas', respuesta['Server-Timing'])
+
+        respuesta = await self.async_client.get(reverse('checkout'))
+        self.assertEqual(respuesta.context['total'], Decimal('180.00'))
+
+    async def test_checkout_requiere_login(self):
+        respuesta = await self.async_client.get(reverse('checkout'))
+        self.assertEqual(respuesta.status_code, 302)
+
+    async def test_pasarela_caida_abre_el_disyuntor_compartido(self):
+        await self.async_client.aforce_login(self.usuario)
+        _PasarelaFalsa.modo = 'error'
+        for _ in range(2):
+            self.assertTrue((await self._checkout()).json()['error'])
+        self.assertEqual(pagos.sdk().http_client.disyuntor.estado, pagos.Disyuntor.ABIERTO)
+        # Abierto: ni la vía async ni la del SDK llegan a la pasarela
+        self.assertTrue((await self._checkout()).json()['error'])
+        with self.assertRaises(pagos.PasarelaNoDisponible):
+            pagos.crear_preferencia({'items': []})
+        self.assertEqual(_PasarelaFalsa.llamadas, 2)
+
+
+# ======================================================
+# Webhook de Mercado Pago (bandeja + worker idempotente)
+# ======================================================
+def _notificar(client, pago_id):
+    return client.post(
+        reverse('webhook_mercadopago') + f"?type=payment&data.id={pago_id}",
+        data=json.dumps({'type': 'payment', 'action': 'payment.updated', 'data': {'id': pago_id}}),
+        content_type='application/json',
+    )
+
+
+def _usuario_con_checkout(nombre, pago_id, cantidad=1):
+    usuario = Usuario.objects.create_user(username=nombre)
+    producto = Producto.objects.create(nombre=f"Producto {nombre}", descripcion="", precio=100, stock=cantidad)
+    carrito = Carrito.objects.create(usuario=usuario)
+    CarritoProducto.objects.create(carrito=carrito, producto=producto, cantidad=cantidad)
+    intento, _ = pedidos_mod.registrar_intento(usuario, carrito, f"REF-{pago_id}", "Calle 1")
+    _PasarelaFalsa.montos[pago_id] = float(intento.total)
+    return usuario
+
+
+class WebhookPagosTests(_ConPasarelaFalsa, TestCase):
+    def setUp(self):
+        self.usar_pasarela_falsa(FACTURAS_EN_SEGUNDO_PLANO=True)
+
+    def test_notificacion_se_guarda_y_el_worker_crea_un_solo_pedido(self):
+        usuario = _usuario_con_checkout("ana", "100")
+        for _ in range(3):
+            self.assertEqual(_notificar(self.client, "100").status_code, 200)
+        self.assertEqual(NotificacionPago.objects.count(), 3)
+
+        salida = io.StringIO()
+        call_command('procesar_pagos', una_vez=True, stdout=salida)
+        self.assertIn("3 notificaciones leídas (1 pedido)", salida.getvalue())
+        pedido = Pedido.objects.get(usuario=usuario)
+        self.assertEqual((pedido.referencia_pago, pedido.direccion_envio), ("REF-100", "Calle 1"))
+        self.assertEqual(pedido.tareas_factura.count(), 1)
+        self.assertEqual(_PasarelaFalsa.consultas_pago, 1)
+
+        # Reintentos posteriores de Mercado Pago no vuelven a consultar ni a crear nada
+        _notificar(self.client, "100")
+        call_command('procesar_pagos', una_vez=True, stdout=io.StringIO())
+        self.assertEqual(_PasarelaFalsa.consultas_pago, 1)
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_navegador_despues_del_webhook_no_duplica(self):
+        usuario = _usuario_con_checkout("ana", "200")
+        _notificar(self.client, "200")
+        webhooks.procesar_lote()
+        self.client.force_login(usuario)
+        session = self.client.session
+        session['referencia_pago'] = "REF-200"
+        session.save()
+        respuesta = self.client.post(reverse('pago_aprobado'), HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+        self.assertEqual(respuesta['status'], 'ok')
+        self.assertEqual(Pedido.objects.filter(usuario=usuario).count(), 1)
+
+    def test_pendiente_se_reevalua_y_rechazado_no_crea_pedido(self):
+        _usuario_con_checkout("ana", "300")
+        _usuario_con_checkout("beto", "301")
+        _PasarelaFalsa.estados = {"300": "pending", "301": "rejected"}
+        _notificar(self.client, "300")
+        _notificar(self.client, "301")
+        self.assertEqual(webhooks.procesar_lote(), (2, {'en_curso': 1, 'rechazado': 1}))
+
+        _PasarelaFalsa.estados["300"] = "approved"
+        _notificar(self.client, "300")
+        self.assertEqual(webhooks.procesar_lote(), (1, {'pedido': 1}))
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_pasarela_caida_no_avanza_y_replay(self):
+        _usuario_con_checkout("ana", "400")
+        _notificar(self.client, "400")
+        _PasarelaFalsa.modo = 'error'
+        with self.assertRaises(pagos.PasarelaNoDisponible):
+            webhooks.procesar_lote()
+        _PasarelaFalsa.modo = 'ok'
+        pagos.reiniciar()
+        self.assertEqual(webhooks.procesar_lote(), (1, {'pedido': 1}))
+
+        salida = io.StringIO()
+        call_command('reprocesar_pagos', '--desde', '1', stdout=salida)
+        self.assertIn("1 duplicado", salida.getvalue())
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_pedido_con_lo_cobrado_aunque_cambie_el_carrito(self):
+        usuario = _usuario_con_checkout("ana", "600", cantidad=2)
+        otro = Producto.objects.create(nombre="Agregado después", descripcion="", precio=50, stock=5)
+        CarritoProducto.objects.create(carrito=usuario.carrito, producto=otro, cantidad=1)
+        CarritoProducto.objects.filter(carrito=usuario.carrito).exclude(producto=otro).update(cantidad=1)
+        _notificar(self.client, "600")
+        self.assertEqual(webhooks.procesar_lote(), (1, {'pedido': 1}))
+
+        pedido = Pedido.objects.get(usuario=usuario)
+        self.assertEqual(pedido.total, Decimal('200.00'))
+        self.assertEqual(list(pedido.pedidoproducto_set.values_list('producto__nombre', 'cantidad')), [("Producto ana", 2)])
+        # Lo agregado en otra pestaña sigue en el carrito
+        self.assertEqual(list(usuario.carrito.carritoproducto_set.values_list('producto', flat=True)), [otro.pk])
+
+    def test_monto_distinto_no_crea_pedido(self):
+        _usuario_con_checkout("ana", "700")
+        _PasarelaFalsa.montos["700"] = 1.0
+        _notificar(self.client, "700")
+        self.assertEqual(webhooks.procesar_lote(), (1, {'monto_distinto': 1}))
+        self.assertFalse(Pedido.objects.exists())
+        self.assertIn("Pagado 1.00", PagoProcesado.objects.get(pago_id="700").detalle)
+
+    def test_notificacion_que_confirma_tarde_no_se_saltea(self):
+        _usuario_con_checkout("ana", "800")
+        _usuario_con_checkout("beto", "801")
+        _notificar(self.client, "800")
+        _notificar(self.client, "800")
+        tardia = NotificacionPago.objects.order_by('id').first()
+        tardia.delete()
+        self.assertEqual(webhooks.procesar_lote(), (1, {'pedido': 1}))
+        # Con un id menor que el ya procesado (otra transacción que confirmó después)
+        NotificacionPago.objects.create(id=tardia.id, tipo='payment', pago_id="801")
+        self.assertEqual(webhooks.procesar_lote(), (1, {'pedido': 1}))
+        self.assertEqual(webhooks.procesar_lote(), (0, {}))
+
+    def test_notificacion_tomada_por_un_worker_caido_vuelve(self):
+        _usuario_con_checkout("ana", "900")
+        _notificar(self.client, "900")
+        self.assertEqual(len(webhooks.tomar_notificaciones(10)), 1)
+        self.assertEqual(webhooks.procesar_lote(), (0, {}))
+        NotificacionPago.objects.update(tomada=timezone.now() - webhooks.VENCIMIENTO * 2)
+        self.assertEqual(webhooks.procesar_lote(), (1, {'pedido': 1}))
+
+    def test_firma_invalida_rechazada(self):
+        with override_settings(MP_WEBHOOK_SECRET='secreto'):
+            self.assertEqual(_notificar(self.client, "500").status_code, 400)
+            ts, request_id = "1700000000", "req-1"
+            firma = hmac.new(b'secreto', f"id:500;request-id:{request_id};ts:{ts};".encode(), hashlib.sha256).hexdigest()
+            respuesta = self.client.post(
+                reverse('webhook_mercadopago') + "?type=payment&data.id=500", data='{}', content_type='application/json',
+                HTTP_X_SIGNATURE=f"ts={ts},v1={firma}", HTTP_X_REQUEST_ID=request_id,
+            )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(NotificacionPago.objects.count(), 1)
+
+
+# Con los hilos compitiendo por la base hay requests lentos a propósito: sin log en la salida de los tests
+@override_settings(INSTRUMENTACION_UMBRAL_LENTO_MS=float('inf'))
+class WebhookCargaTests(_ConPasarelaFalsa, TransactionTestCase):
+    """Inunda el endpoint con notificaciones repetidas desde varios hilos."""
+    PAGOS = 10
+    HILOS = 8
+    POR_HILO = 40
+
+    def setUp(self):
+        self.usar_pasarela_falsa(FACTURAS_EN_SEGUNDO_PLANO=True)
+        for i in range(self.PAGOS):
+            _usuario_con_checkout(f"cliente{i}", str(1000 + i))
+
+    def test_notificaciones_duplicadas_concurrentes(self):
+        errores = []
+
+        def inundar(hilo):
+            cliente = Client()
+            try:
+                for n in range(self.POR_HILO):
+                    if _notificar(cliente, str(1000 + (hilo + n) % self.PAGOS)).status_code != 200:
+                        errores.append(n)
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=inundar, args=(h,)) for h in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        total = self.HILOS * self.POR_HILO
+        self.assertEqual(errores, [])
+        self.assertEqual(NotificacionPago.objects.count(), total)
+        self.assertLess(duracion, 30, f"{total} notificaciones en {duracion:.1f}s")
+
+        call_command('procesar_pagos', lote=50, una_vez=True, stdout=io.StringIO())
+        self.assertEqual(Pedido.objects.count(), self.PAGOS)
+        self.assertEqual(PagoProcesado.objects.count(), self.PAGOS)
+        # Un lote deduplica sus notificaciones y PagoProcesado las de lotes siguientes
+        self.assertEqual(_PasarelaFalsa.consultas_pago, self.PAGOS)
+
+
+# ======================================================
+# Datos sintéticos y prueba de carga
+# ======================================================
+@override_settings(INSTRUMENTACION_UMBRAL_LENTO_MS=float('inf'))
+class PruebaCargaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_generar_y_correr_la_prueba(self):
+        creados = datos_sinteticos.generar(categorias=3, productos=40, usuarios=2, carritos=1, pedidos=30,
+                                           lineas_por_pedido=3)
+        self.assertEqual(creados['pedidos'], Pedido.objects.count())
+        self.assertEqual(creados['lineas_pedido'], PedidoProducto.objects.count())
+        self.assertEqual(VentaDiaria.objects.aggregate(n=Sum('pedidos'))['n'], 30)
+        with self.assertRaises(CommandError):
+            call_command('generar_datos_benchmark', productos=1, stdout=io.StringIO())
+
+        salida = os.path.join(tempfile.mkdtemp(), 'carga.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(salida))
+        call_command('benchmark_carga', usuarios_virtuales=1, iteraciones=2, salida=salida, stdout=io.StringIO())
+        with open(salida, encoding='utf-8') as archivo:
+            resultado = json.load(archivo)
+
+        self.assertEqual(resultado['total']['errores'], 0)
+        self.assertEqual(set(resultado['pasos']), set(prueba_carga.PASOS))
+        self.assertEqual(resultado['pasos']['checkout']['requests'], 2)
+        self.assertEqual(Pedido.objects.count(), 32)
+        # Los sintéticos y los de la prueba comparten el contador de números de pedido
+        numeros = list(Pedido.objects.values_list('numero_pedido', flat=True))
+        self.assertNotIn(None, numeros)
+        self.assertEqual(len(set(numeros)), 32)
+        self.assertTrue(prueba_carga.comparar(resultado, resultado))
+
+    def test_percentil_por_rango_mas_cercano(self):
+        valores = list(range(1, 101))
+        self.assertEqual(prueba_carga.percentil(valores, 50), 50)
+        self.assertEqual(prueba_carga.percentil(valores, 99), 99)
+        self.assertEqual(prueba_carga.percentil([7], 95), 7)
+
+
+# ======================================================
+# Instrumentación por request
+# ======================================================
+class InstrumentacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="Monitores")
+        for i in range(3):
+            Producto.objects.create(nombre=f"Monitor {i}", descripcion="", precio=100, categoria=categoria)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing(self):
+        cabecera = self.client.get(reverse('lista_productos'))['Server-Timing']
+        self.assertRegex(cabecera, r'^sql;dur=[\d.]+;desc="\d+ consultas, \d+ repetidas"')
+        self.assertIn('plantillas;dur=', cabecera)
+        self.assertIn('total;dur=', cabecera)
+
+    @override_settings(INSTRUMENTACION_SERVER_TIMING=False)
+    def test_server_timing_desactivable(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('lista_productos')))
+
+    @override_settings(INSTRUMENTACION_UMBRAL_LENTO_MS=0)
+    def test_request_lento_se_registra_con_las_consultas_repetidas(self):
+        with self.assertLogs('productos.instrumentacion', 'WARNING') as logs:
+            self.client.get(reverse('lista_productos'))
+        registro = json.loads(logs.records[0].args[0])
+        self.assertEqual((registro['ruta'], registro['estado']), ('/', 200))
+        self.assertGreater(registro['consultas'], 0)
+        self.assertIn('plantillas_ms', registro)
+
+    def test_repetidas_agrupa_listas_de_parametros(self):
+        medicion = instrumentacion.Medicion()
+        medicion.sql.update({
+            'SELECT 1 WHERE id = %s': 3,
+            'SELECT 2 WHERE id IN (%s, %s)': 1,
+            'SELECT 2 WHERE id IN (%s, %s, %s)': 1,
+            'SELECT 3': 1,
+        })
+        self.assertEqual(medicion.repetidas(), [
+            ('SELECT 1 WHERE id = %s', 3), ('SELECT 2 WHERE id IN (%s, ...)', 2),
+        ])
+
+    def test_medir_fuera_de_un_request_no_hace_nada(self):
+        with instrumentacion.medir('pdf'):
+            pass
+        self.assertIsNone(instrumentacion.actual())
+
+
+# ======================================================
+# Planes de las consultas críticas (EXPLAIN)
+# ======================================================
+class PlanesTests(TestCase):
+    def test_consultas_criticas_usan_indices(self):
+        for nombre, (plan, problemas) in planes.revisar().items():
+            with self.subTest(consulta=nombre):
+                self.assertEqual(problemas, [], plan)
+
+    def test_revisa_las_consultas_que_arma_la_paginacion(self):
+        cursor = codificar_cursor('s', '1000.00', 100)
+        real = _consulta(Producto.objects.all(), 'precio', cursor, TAMANO_PAGINA, ORDENES)[0]
+        revisada = planes.CONSULTAS['catalogo_precio_siguiente'](connection)
+        self.assertEqual(str(revisada.query), str(real.query))
+
+    def test_detecta_indice_recorrido_entero_y_orden_aparte(self):
+        # Índice (precio_final, id) sin cota: lo recorre desde el principio
+        plan = planes.plan(Producto.objects.filter(stock=3).order_by('precio_final', 'id'))
+        self.assertEqual(planes.recorridos_completos(plan, connection.vendor), ['productos'])
+        # Desempate en la dirección contraria a la del índice (usuario, fecha, id)
+        plan = planes.plan(Pedido.objects.filter(usuario_id=1).order_by('-fecha', 'id')[:20])
+        if connection.vendor == 'sqlite':
+            self.assertTrue(planes.ordena_aparte(plan, 'sqlite'), plan)
+
+    def test_index_scan_sin_index_cond_en_postgresql(self):
+        plan = (
+            "Limit  (cost=0.29..1.23 rows=25 width=100)\n"
+            "  ->  Index Scan using productos_precio_final_idx on productos  (cost=0.29..8.31 rows=200 width=100)\n"
+            "        Filter: (stock = 3)"
+        )
+        self.assertEqual(planes.recorridos_completos(plan, 'postgresql'), ['productos'])
+        con_cota = plan.replace("Filter: (stock = 3)", "Index Cond: (precio_final >= 1000.00)")
+        self.assertEqual(planes.recorridos_completos(con_cota, 'postgresql'), [])
+
+    def test_detecta_un_recorrido_completo(self):
+        plan = planes.plan(Producto.objects.filter(stock=3))
+        self.assertEqual(planes.recorridos_completos(plan, connection.vendor), ['productos'])
+        planes.CONSULTAS['sin_indice'] = lambda c: Producto.objects.filter(stock=3)
+        self.addCleanup(planes.CONSULTAS.pop, 'sin_indice')
+        with self.assertRaises(CommandError):
+            call_command('revisar_planes', stdout=io.StringIO())
+
+    def test_una_linea_por_producto_en_el_carrito(self):
+        usuario = Usuario.objects.create_user(username="unico")
+        producto = Producto.objects.create(nombre="Mouse", descripcion="", precio=10, stock=5)
+        carrito = Carrito.objects.create(usuario=usuario)
+        CarritoProducto.objects.create(carrito=carrito, producto=producto)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CarritoProducto.objects.create(carrito=carrito, producto=producto)
+
+
+# ======================================================
+# Sesiones en caché con la base de respaldo
+# ======================================================
+@override_settings(SESSION_ENGINE='productos.sesiones')
+class SesionesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _consultas_sesion(self, capturadas):
+        return prueba_sesiones.clasificar(capturadas.captured_queries)
+
+    def test_no_escribe_si_los_datos_no_cambiaron(self):
+        sesion = sesiones.SessionStore()
+        sesion['direccion'] = 'Calle Falsa 123'
+        sesion.save()
+
+        otra = sesiones.SessionStore(sesion.session_key)
+        with CaptureQueriesContext(connection) as capturadas:
+            self.assertEqual(otra['direccion'], 'Calle Falsa 123')
+            otra['direccion'] = 'Calle Falsa 123'
+            otra.save()
+        self.assertEqual(self._consultas_sesion(capturadas), (0, 0))
+
+        otra['direccion'] = 'Siempre Viva 742'
+        with CaptureQueriesContext(connection) as capturadas:
+            otra.save()
+        self.assertEqual(self._consultas_sesion(capturadas), (0, 1))
+        cache.clear()
+        self.assertEqual(sesiones.SessionStore(sesion.session_key)['direccion'], 'Siempre Viva 742')
+
+    def test_sin_cache_lee_de_la_base(self):
+        sesion = sesiones.SessionStore()
+        sesion['x'] = 1
+        sesion.save()
+        sesion._cache.delete(sesion.cache_key)
+        with CaptureQueriesContext(connection) as capturadas:
+            self.assertEqual(sesiones.SessionStore(sesion.session_key)['x'], 1)
+        self.assertEqual(self._consultas_sesion(capturadas), (1, 0))
+
+    def test_timeout_de_la_cache_acotado(self):
+        sesion = sesiones.SessionStore()
+        with override_settings(SESIONES_CACHE_TIMEOUT=5):
+            self.assertEqual(sesiones.SessionStore()._cache.tope, 5)
+        self.assertEqual(sesion._cache.tope, 60)
+
+    def test_catalogo_y_login_sin_leer_la_sesion_de_la_base(self):
+        usuario = Usuario.objects.create_user(username="sesion", password="x")
+        cliente = Client()
+        cliente.force_login(usuario)
+        cliente.get(reverse('lista_productos'))
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = cliente.get(reverse('lista_productos'))
+        self.assertEqual(respuesta.wsgi_request.user, usuario)
+        self.assertEqual(self._consultas_sesion(capturadas), (0, 0))
+
+        cliente.logout()
+        self.assertFalse(cliente.get(reverse('lista_productos')).wsgi_request.user.is_authenticated)
+
+    def test_benchmark_compara_los_modos(self):
+        with self.assertRaises(ValueError):
+            prueba_sesiones.ejecutar(1)
+        datos_sinteticos.generar(categorias=2, productos=10, usuarios=1, carritos=1, pedidos=0)
+        resultado = prueba_sesiones.ejecutar(2)
+        self.assertEqual(set(resultado['modos']), set(prueba_sesiones.MODOS))
+        self.assertEqual(resultado['modos']['db']['catalogo']['lecturas_sesion'], 1)
+        self.assertEqual(resultado['modos']['cache']['catalogo']['lecturas_sesion'], 0)
+        self.assertGreaterEqual(resultado['ahorro']['cache']['carrito'], 1)
@@ -1,15 +1,19 @@
 # ================================
 # Importar Django y vistas locales
 # ================================
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, vistas_async
+
+# Bajo ASGI (VISTAS_ASYNC) catálogo, detalle y checkout usan las vistas async
+vistas = vistas_async if settings.VISTAS_ASYNC else views
 
 # ================================
 # URLs de la app 'productos'
 # ================================
 urlpatterns = [
     # Página principal: lista de productos
-    path('', views.lista_productos, name='lista_productos'),
+    path('', vistas.lista_productos, name='lista_productos'),
 
     # Carrito de compras
     path('carrito/', views.ver_carrito, name='ver_carrito'),
@@ -18,8 +22,10 @@ urlpatterns = [
     path('vaciar/', views.vaciar_carrito, name='vaciar_carrito'),
 
     # Checkout y pago aprobado
-    path('checkout/', views.checkout, name='checkout'),
+    path('checkout/', vistas.checkout, name='checkout'),
     path('pago_aprobado/', views.pago_aprobado, name='pago_aprobado'),
+    path('factura/<int:numero_pedido>/estado/', views.estado_factura, name='estado_factura'),
+    path('webhooks/mercadopago/', views.webhook_mercadopago, name='webhook_mercadopago'),
 
     # Registro y autenticación
     path('registro/', views.registro, name='registro'),
@@ -27,7 +33,7 @@ urlpatterns = [
     path('logout/', views.logout_usuario, name='logout_usuario'),
 
     # Detalle de producto
-    path('producto/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
+    path('producto/<int:producto_id>/', vistas.detalle_producto, name='detalle_producto'),
 
     # Área de usuario
     path('mi_cuenta/', views.mi_cuenta, name='mi_cuenta'),
@@ -0,0 +1,153 @@
+# ======================================================
+# Agregados de ventas por día
+# - VentaDiaria (día), VentaDiariaProducto (día x producto) y
+#   VentaDiariaCategoria (día x categoría): pedidos, unidades e
+#   ingresos (precio_unitario * cantidad de cada línea)
+# - registrar_pedido(): suma un pedido nuevo; se llama dentro de la
+#   transacción que lo crea (pedidos.py), así nunca se cuenta dos
+#   veces ni se pierde
+# - reconstruir(): recalcula un rango de días desde los pedidos
+#   (comando `reconstruir_ventas`, para backfill o correcciones)
+# - Solo cuentan los pedidos pagados; el día es el de TIME_ZONE
+# ======================================================
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import PedidoProducto, VentaDiaria, VentaDiariaCategoria, VentaDiariaProducto
+
+
+def _sumar(modelo, claves, pedidos, unidades, ingresos):
+    """UPDATE ... SET x = x + n; si la fila no existe la crea (reintenta si otro la creó antes)."""
+    incrementos = {
+        'pedidos': F('pedidos') + pedidos,
+        'unidades': F('unidades') + unidades,
+        'ingresos': F('ingresos') + ingresos,
+    }
+    if modelo.objects.filter(**claves).update(**incrementos):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, pedidos=pedidos, unidades=unidades, ingresos=ingresos)
+    except IntegrityError:
+        modelo.objects.filter(**claves).update(**incrementos)
+
+
+def registrar_pedido(pedido, lineas):
+    """
+    Suma el pedido a los agregados de su día. `lineas`: objetos con
+    producto (con categoria_id), cantidad y precio_unitario.
+    """
+    if not pedido.pagado:
+        return
+    dia = timezone.localdate(pedido.fecha)
+    por_producto, por_categoria = {}, {}
+    for linea in lineas:
+        importe = linea.precio_unitario * linea.cantidad
+        for acumulado, clave in ((por_producto, linea.producto_id), (por_categoria, linea.producto.categoria_id)):
+            unidades, ingresos = acumulado.get(clave, (0, 0))
+            acumulado[clave] = (unidades + linea.cantidad, ingresos + importe)
+
+    # Orden fijo de las filas que se actualizan: evita deadlocks entre pedidos concurrentes
+    _sumar(VentaDiaria, {'dia': dia}, 1,
+           sum(u for u, _ in por_producto.values()), sum(i for _, i in por_producto.values()))
+    for categoria_id in sorted(por_categoria, key=lambda c: (c is not None, c or 0)):
+        unidades, ingresos = por_categoria[categoria_id]
+        _sumar(VentaDiariaCategoria, {'dia': dia, 'categoria_id': categoria_id}, 1, unidades, ingresos)
+    for producto_id in sorted(por_producto):
+        unidades, ingresos = por_producto[producto_id]
+        _sumar(VentaDiariaProducto, {'dia': dia, 'producto_id': producto_id}, 1, unidades, ingresos)
+
+
+# ======================================================
+# Reconstrucción
+# ======================================================
+def _limites(desde, hasta):
+    """Rango [inicio, fin) en datetimes locales para filtrar pedido__fecha."""
+    filtro = {}
+    if desde:
+        filtro['pedido__fecha__gte'] = timezone.make_aware(datetime.datetime.combine(desde, datetime.time.min))
+    if hasta:
+        fin = hasta + datetime.timedelta(days=1)
+        filtro['pedido__fecha__lt'] = timezone.make_aware(datetime.datetime.combine(fin, datetime.time.min))
+    return filtro
+
+
+def _agrupado(lineas, *campos):
+    importe = ExpressionWrapper(
+        F('precio_unitario') * F('cantidad'), output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    return lineas.values('dia', *campos).annotate(
+        n_pedidos=Count('pedido', distinct=True),
+        n_unidades=Sum('cantidad'),
+        total=Sum(importe),
+    ).order_by()
+
+
+def reconstruir(desde=None, hasta=None, lote=2000):
+    """
+    Borra y recalcula los agregados de los días [desde, hasta] (todos si no
+    se indican) con tres consultas agrupadas. Devuelve la cantidad de días.
+    """
+    filtro_dias = {}
+    if desde:
+        filtro_dias['dia__gte'] = desde
+    if hasta:
+        filtro_dias['dia__lte'] = hasta
+    lineas = PedidoProducto.objects.filter(
+        pedido__pagado=True, **_limites(desde, hasta)
+    ).annotate(dia=TruncDate('pedido__fecha'))
+
+    tablas = (
+        (VentaDiaria, _agrupado(lineas), lambda fila: {}),
+        (VentaDiariaCategoria, _agrupado(lineas, 'producto__categoria'),
+         lambda fila: {'categoria_id': fila['producto__categoria']}),
+        (VentaDiariaProducto, _agrupado(lineas, 'producto'), lambda fila: {'producto_id': fila['producto']}),
+    )
+    filas_creadas = {}
+    with transaction.atomic():
+        for modelo, filas, claves in tablas:
+            modelo.objects.filter(**filtro_dias).delete()
+            nuevas = []
+            filas_creadas[modelo] = 0
+            for fila in filas.iterator(chunk_size=lote):
+                nuevas.append(modelo(
+                    dia=fila['dia'], pedidos=fila['n_pedidos'], unidades=fila['n_unidades'],
+                    ingresos=fila['total'], **claves(fila),
+                ))
+                if len(nuevas) >= lote:
+                    modelo.objects.bulk_create(nuevas)
+                    filas_creadas[modelo] += len(nuevas)
+                    nuevas = []
+            modelo.objects.bulk_create(nuevas)
+            filas_creadas[modelo] += len(nuevas)
+    return filas_creadas[VentaDiaria]
+
+
+# ======================================================
+# Consultas del reporte (solo tablas de agregados)
+# ======================================================
+def resumen(desde, hasta, top=10):
+    """Totales por día, totales del período y ranking de productos y categorías."""
+    rango = {'dia__gte': desde, 'dia__lte': hasta}
+    por_dia = list(VentaDiaria.objects.filter(**rango).order_by('dia').values('dia', 'pedidos', 'unidades', 'ingresos'))
+    ranking = {'total_unidades': Sum('unidades'), 'total_ingresos': Sum('ingresos')}
+    productos = list(
+        VentaDiariaProducto.objects.filter(**rango).values('producto_id', 'producto__nombre')
+        .annotate(**ranking).order_by('-total_ingresos', 'producto_id')[:top]
+    )
+    categorias = list(
+        VentaDiariaCategoria.objects.filter(**rango).values('categoria_id', 'categoria__nombre')
+        .annotate(**ranking).order_by('-total_ingresos')
+    )
+    return {
+        'por_dia': por_dia,
+        'pedidos': sum(d['pedidos'] for d in por_dia),
+        'unidades': sum(d['unidades'] for d in por_dia),
+        'ingresos': sum((d['ingresos'] for d in por_dia), 0),
+        'productos': productos,
+        'categorias': categorias,
+    }
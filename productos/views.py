@@ -1,24 +1,30 @@
 # ======================================================
 # Imports necesarios para vistas y utilidades de Django
 # ======================================================
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.admin.models import LogEntry, CHANGE
 from django.contrib.contenttypes.models import ContentType
-from .models import Producto, Carrito, CarritoProducto, Categoria, Pedido, PedidoProducto
+from .models import Producto, Carrito, CarritoProducto, Categoria, Pedido, PedidoProducto, ProductoSimilar
 from .forms import RegistroForm
-import mercadopago
+from . import cache_catalogo, carritos, facetas, pagos, webhooks
+from .busqueda import buscar_productos
+from .paginacion import ORDENES, ORDENES_PEDIDOS, paginar, tamano_pagina
+from .pedidos import (
+    CarritoVacio, PedidoYaCreado, StockInsuficiente, crear_pedido_desde_carrito, registrar_intento, resumen_de,
+)
+from .cola_facturas import programar_factura
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
-from django.utils import timezone
-import io
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 
 # ======================================================
@@ -54,10 +60,31 @@ def ver_datos_usuario(request):
     return render(request, 'productos/ver_datos_usuario.html', {'user': request.user})
 
 
+def _historial(request, template):
+    """
+    Página de pedidos del usuario (más nuevos primero, paginada por cursor)
+    con sus líneas y productos precargados: 3 consultas sin importar cuántos
+    pedidos tenga. La cantidad total sale del resumen cacheado.
+    """
+    pedidos = Pedido.objects.filter(usuario=request.user).prefetch_related('pedidoproducto_set__producto')
+    pagina = paginar(
+        pedidos,
+        orden='fecha',
+        cursor=request.GET.get('cursor'),
+        tamano=getattr(settings, 'PEDIDOS_TAMANO_PAGINA', 20),
+        ordenes=ORDENES_PEDIDOS,
+    )
+    return render(request, template, {
+        'pedidos': pagina.items,
+        'resumen': resumen_de(request.user),
+        'url_siguiente': _url_con_cursor(request, pagina.siguiente),
+        'url_anterior': _url_con_cursor(request, pagina.anterior),
+    })
+
+
 @login_required
 def historial_compras(request):
-    pedidos = request.user.pedido_set.order_by('-fecha').all()
-    return render(request, 'productos/historial_compras.html', {'pedidos': pedidos})
+    return _historial(request, 'productos/historial_compras.html')
 
 
 # ======================================================
@@ -65,27 +92,121 @@ def historial_compras(request):
 # - Detalle de producto, lista de productos
 # ======================================================
 def detalle_producto(request, producto_id):
-    producto = get_object_or_404(Producto, id=producto_id)
-    productos_similares = Producto.objects.filter(categoria=producto.categoria).exclude(id=producto.id)[:8]
+    producto = get_object_or_404(Producto.objects.prefetch_related('imagenes'), id=producto_id)
+    # Similares precalculados (similares.py): una consulta por el índice (producto, posicion)
+    productos_similares = [
+        fila.similar
+        for fila in ProductoSimilar.objects.filter(producto=producto).select_related('similar').order_by('posicion')
+    ]
     return render(request, 'productos/detalle_producto.html', {
         'producto': producto,
         'productos_similares': productos_similares,
     })
 
 
-def lista_productos(request):
-    query = request.GET.get('q')
-    categoria_id = request.GET.get('categoria')
+def _precio_filtro(valor):
+    """Precio de los filtros ?min= / ?max=; None si falta o no es un número válido."""
+    try:
+        precio = Decimal(valor.replace(',', '.'))
+    except (AttributeError, InvalidOperation):
+        return None
+    return precio if precio.is_finite() and precio >= 0 else None
+
+
+def _filtros_catalogo(request):
+    """Búsqueda, categoría, orden, rango de precio y facetas elegidas en el listado."""
+    return {
+        'query': request.GET.get('q'),
+        'categoria': facetas.entero(request.GET.get('categoria')),
+        'orden': request.GET.get('orden') or 'relevancia',
+        'precio_min': _precio_filtro(request.GET.get('min')),
+        'precio_max': _precio_filtro(request.GET.get('max')),
+        'con_stock': bool(request.GET.get('stock')),
+        'oferta': bool(request.GET.get('oferta')),
+    }
 
+
+def _consulta_catalogo(filtros):
+    """
+    (productos para las facetas, productos del listado, orden). Las facetas
+    se cuentan antes de aplicar los filtros que son facetas, ver facetas.py.
+    """
     productos = Producto.objects.all()
-    categorias = Categoria.objects.all()
 
-    if query:
-        productos = productos.filter(Q(nombre__icontains=query) | Q(descripcion__icontains=query))
-    if categoria_id:
-        productos = productos.filter(categoria_id=categoria_id)
+    if filtros['query']:
+        productos = buscar_productos(productos, filtros['query'])
+    # Filtros por precio con descuento (columna precio_final, indexada)
+    if filtros['precio_min'] is not None:
+        productos = productos.filter(precio_final__gte=filtros['precio_min'])
+    if filtros['precio_max'] is not None:
+        productos = productos.filter(precio_final__lte=filtros['precio_max'])
+    para_facetas = productos
+    if filtros['categoria'] is not None:
+        productos = productos.filter(categoria_id=filtros['categoria'])
+    if filtros['con_stock']:
+        productos = productos.filter(stock__gt=0)
+    if filtros['oferta']:
+        productos = productos.filter(descuento__gt=0)
+    # Sin búsqueda (o sin índice) no hay ranking: se ordena por id
+    orden = filtros['orden']
+    if orden not in ORDENES or (orden == 'relevancia' and 'relevancia' not in productos.query.annotations):
+        orden = 'id'
+    return para_facetas, productos, orden
+
+
+def _contexto_catalogo(request, filtros, orden, pagina, grupos, categorias, tarjetas):
+    conteos = facetas.contar(grupos, categorias, filtros['categoria'], filtros['con_stock'], filtros['oferta'])
+    for rango in conteos['precios']:
+        # El rango es [desde, hasta) y el filtro ?max= incluye el tope
+        hasta = rango['hasta'] and Decimal(rango['hasta']) - Decimal('0.01')
+        rango['url'] = _url_con_filtros(request, min=rango['desde'], max=hasta)
+    return {
+        'productos': pagina.items,
+        'tarjetas': tarjetas,
+        'facetas': conteos,
+        'orden': orden,
+        'precio_min': filtros['precio_min'],
+        'precio_max': filtros['precio_max'],
+        'url_siguiente': _url_con_cursor(request, pagina.siguiente),
+        'url_anterior': _url_con_cursor(request, pagina.anterior),
+    }
 
-    return render(request, 'productos/lista.html', {'productos': productos, 'categorias': categorias})
+
+def lista_productos(request):
+    filtros = _filtros_catalogo(request)
+    para_facetas, productos, orden = _consulta_catalogo(filtros)
+    # Conteos de las facetas: una consulta agrupada (o la caché)
+    grupos = facetas.grupos(para_facetas, filtros['query'], filtros['precio_min'], filtros['precio_max'])
+    pagina = paginar(
+        productos,
+        orden=orden,
+        cursor=request.GET.get('cursor'),
+        tamano=tamano_pagina(request.GET.get('por_pagina')),
+    )
+    return render(request, 'productos/lista.html', _contexto_catalogo(
+        request, filtros, orden, pagina, grupos, cache_catalogo.categorias(), cache_catalogo.tarjetas(pagina.items),
+    ))
+
+
+def _url_con_filtros(request, **filtros):
+    """Querystring actual con otros filtros (None los quita), desde la primera página."""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    for nombre, valor in filtros.items():
+        if valor is None:
+            params.pop(nombre, None)
+        else:
+            params[nombre] = valor
+    return f"?{params.urlencode()}"
+
+
+def _url_con_cursor(request, cursor):
+    """Querystring actual (búsqueda, filtros, orden) apuntando a otro cursor."""
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f"?{params.urlencode()}"
 
 
 # ======================================================
@@ -94,48 +215,35 @@ def lista_productos(request):
 # ======================================================
 @login_required
 def agregar_al_carrito(request, producto_id):
-    producto = get_object_or_404(Producto, id=producto_id)
-    if producto.stock <= 0:
+    # Modo base o caché según CARRITO_MODO (ver carritos.py)
+    carrito = carritos.de(request.user)
+    stock = carrito.stock(producto_id)
+    if stock is None:
+        raise Http404("Producto inexistente")
+    if stock <= 0:
         return redirect('lista_productos')
 
-    carrito, _ = Carrito.objects.get_or_create(usuario=request.user)
-    carrito_producto, created = CarritoProducto.objects.get_or_create(carrito=carrito, producto=producto)
-
-    if not created:
-        if carrito_producto.cantidad < producto.stock:
-            carrito_producto.cantidad += 1
-            carrito_producto.save()
-    
+    carrito.agregar(producto_id, stock)
     return redirect(request.META.get('HTTP_REFERER', 'lista_productos'))
 
 
 @login_required
 def ver_carrito(request):
-    carrito, _ = Carrito.objects.get_or_create(usuario=request.user)
-    total = carrito.total()
-    return render(request, 'productos/carrito.html', {'carrito': carrito, 'total': total})
+    carrito = carritos.de(request.user)
+    items = carrito.lineas()
+    total = carrito.total(items)
+    return render(request, 'productos/carrito.html', {'carrito': carrito, 'items': items, 'total': total})
 
 
 @login_required
 def eliminar_del_carrito(request, producto_id):
-    carrito, _ = Carrito.objects.get_or_create(usuario=request.user)
-    producto = get_object_or_404(Producto, id=producto_id)
-    item = CarritoProducto.objects.filter(carrito=carrito, producto=producto).first()
-
-    if item:
-        if item.cantidad > 1:
-            item.cantidad -= 1
-            item.save()
-        else:
-            item.delete()
-    
+    carritos.de(request.user).quitar(producto_id)
     return redirect('ver_carrito')
 
 
 @login_required
 def vaciar_carrito(request):
-    carrito, _ = Carrito.objects.get_or_create(usuario=request.user)
-    carrito.carritoproducto_set.all().delete()
+    carritos.de(request.user).vaciar()
     return redirect('ver_carrito')
 
 
@@ -143,76 +251,73 @@ def vaciar_carrito(request):
 # Vistas de checkout con Mercado Pago
 # - Crea preferencia de pago y devuelve URL
 # ======================================================
+def _referencia_pago():
+    return f"ORDER_{int(time.time())}_{uuid.uuid4().hex[:12]}"
+
+
+def _datos_preferencia(request, usuario, items, external_reference):
+    return {
+        "items": items,
+        "payer": {"email": usuario.email},
+        "external_reference": external_reference,
+        "back_urls": {
+            "success": request.build_absolute_uri("/checkout/success/manual/"),
+            "failure": request.build_absolute_uri("/checkout/failure/"),
+            "pending": request.build_absolute_uri("/checkout/pending/"),
+        },
+    }
+
+
+def _error_de_pago(e):
+    if isinstance(e, pagos.PasarelaNoDisponible):
+        return JsonResponse({'error': True, 'message': f'{e} Intentá de nuevo en unos minutos.'})
+    if isinstance(e, pagos.ErrorPago):
+        return JsonResponse({'error': True, 'message': f'Error de MercadoPago: {e}'})
+    return JsonResponse({'error': True, 'message': f'Error interno: {str(e)}'})
+
+
+def _lineas_y_total(carrito):
+    lineas = carrito.lineas()
+    return lineas, carrito.total() if lineas else 0
+
+
 @login_required
 def checkout(request):
+    # En modo caché el carrito se escribe en la base acá: la preferencia y el
+    # pedido (navegador o webhook) se arman desde carritos_productos
+    carritos.de(request.user).volcar()
     carrito, _ = Carrito.objects.get_or_create(usuario=request.user)
-    total = carrito.total()
 
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         direccion = request.POST.get('direccion', '')
         request.session['direccion_envio'] = direccion
 
-        sdk = mercadopago.SDK(settings.MP_ACCESS_TOKEN)
-
-        items = []
-        for item in carrito.carritoproducto_set.all():
-            items.append({
-                "title": item.producto.nombre,
-                "quantity": item.cantidad,
-                "unit_price": float(item.producto.precio_con_descuento),
-                "currency_id": "ARS",
-            })
-
-        import random
-        import time
-        external_reference = f"ORDER_{int(time.time())}_{random.randint(1000,9999)}"
-        
-        preference_data = {
-            "items": items,
-            "payer": {"email": request.user.email},
-            "external_reference": external_reference,
-            "back_urls": {
-                "success": request.build_absolute_uri("/checkout/success/manual/"),
-                "failure": request.build_absolute_uri("/checkout/failure/"),
-                "pending": request.build_absolute_uri("/checkout/pending/"),
-            },
-        }
+        external_reference = _referencia_pago()
+        # Con esto el webhook puede armar el pedido aunque el usuario no vuelva al sitio;
+        # el pedido lleva estas mismas líneas aunque el carrito cambie después
+        _, lineas = registrar_intento(request.user, carrito, external_reference, direccion)
+        items = pagos.items_de_lineas(lineas)
+        request.session['referencia_pago'] = external_reference
 
+        # Cliente compartido con timeouts y disyuntor (ver pagos.py)
         try:
-            preference_response = sdk.preference().create(preference_data)
-            preference = preference_response.get("response", {})
-            url = preference.get("sandbox_init_point")
-            if not url:
-                error_info = preference_response.get("cause", [])
-                return JsonResponse({'error': True, 'message': f'Error de MercadoPago: {error_info}'})
-            
-            return HttpResponse(url)
-            
+            return HttpResponse(pagos.crear_preferencia(
+                _datos_preferencia(request, request.user, items, external_reference)
+            ))
         except Exception as e:
-            return JsonResponse({'error': True, 'message': f'Error interno: {str(e)}'})
+            return _error_de_pago(e)
 
-    return render(request, 'productos/checkout.html', {'carrito': carrito, 'total': total})
+    lineas, total = _lineas_y_total(carrito)
+    return render(request, 'productos/checkout.html', {'carrito': carrito, 'items': lineas, 'total': total})
 
 
 # ======================================================
 # Vista de pago aprobado / checkout exitoso
-# - Crea Pedido y PedidoProducto
-# - Reduce stock de productos
-# - Genera PDF de factura
+# - Crea Pedido y PedidoProducto en una transacción (ver pedidos.py)
+# - Reduce stock de productos (falla si no alcanza)
+# - Encola la factura PDF (la genera `procesar_facturas`)
 # - Muestra la página de pago aprobado
 # ======================================================
-from reportlab.platypus import Paragraph, Spacer, Table, TableStyle, SimpleDocTemplate
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_LEFT
-import io
-from django.utils import timezone
-from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.shortcuts import render
-from .models import Carrito, Pedido, PedidoProducto
-
 @login_required
 def pago_aprobado(request):
     carrito, _ = Carrito.objects.get_or_create(usuario=request.user)
@@ -220,88 +325,41 @@ def pago_aprobado(request):
 
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         try:
-            if not carrito.carritoproducto_set.exists():
-                return JsonResponse({'status': 'error', 'message': 'No hay productos en el carrito.'})
-
-            # Crear el pedido
-            pedido = Pedido.objects.create(
-                usuario=request.user,
-                total=carrito.total(),
-                pagado=True,
-                direccion_envio=direccion
+            pedido = crear_pedido_desde_carrito(
+                request.user, direccion, referencia_pago=request.session.get('referencia_pago')
             )
 
-            # Crear los items del pedido y actualizar stock
-            for item in carrito.carritoproducto_set.all():
-                PedidoProducto.objects.create(
-                    pedido=pedido,
-                    producto=item.producto,
-                    cantidad=item.cantidad,
-                    precio_unitario=item.producto.precio_con_descuento
-                )
-                producto = item.producto
-                producto.stock -= item.cantidad
-                if producto.stock < 0:
-                    producto.stock = 0
-                producto.save()
-
-            # Vaciar carrito y limpiar sesión
-            carrito.carritoproducto_set.all().delete()
+            # Limpiar sesión
             if 'direccion_envio' in request.session:
                 del request.session['direccion_envio']
+            request.session.pop('referencia_pago', None)
+
+            respuesta = {
+                'status': 'ok',
+                'message': 'Pedido generado correctamente.',
+                'estado_url': reverse('estado_factura', args=[pedido.numero_pedido]),
+            }
+            # En segundo plano el PDF lo genera el worker; la página consulta estado_url
+            pdf_url = programar_factura(pedido)
+            if pdf_url:
+                respuesta['pdf_url'] = pdf_url
+            return JsonResponse(respuesta)
+
+        except PedidoYaCreado as e:
+            # El webhook de Mercado Pago llegó antes: el pedido (y su factura) ya existen
+            carritos.olvidar(request.user.pk)
+            request.session.pop('direccion_envio', None)
+            request.session.pop('referencia_pago', None)
+            return JsonResponse({
+                'status': 'ok',
+                'message': 'Pedido generado correctamente.',
+                'estado_url': reverse('estado_factura', args=[e.pedido.numero_pedido]),
+            })
 
-            # Generar PDF de factura
-            buffer = io.BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4)
-            elements = []
-            styles = getSampleStyleSheet()
-
-            fecha_local = timezone.localtime(pedido.fecha)
-            fecha_str = fecha_local.strftime("%d/%m/%Y %H:%M")
-
-            elements.append(Paragraph(f"Factura - Pedido #{pedido.numero_pedido_formateado()}", styles['Title']))
-            elements.append(Spacer(1, 12))
-            elements.append(Paragraph(f"<b>Cliente:</b> {pedido.usuario.first_name} {pedido.usuario.last_name}", styles['Normal']))
-            elements.append(Paragraph(f"<b>Email:</b> {pedido.usuario.email}", styles['Normal']))
-            elements.append(Paragraph(f"<b>Dirección:</b> {pedido.direccion_envio}", styles['Normal']))
-            elements.append(Paragraph(f"<b>Fecha:</b> {fecha_str}", styles['Normal']))
-            elements.append(Spacer(1, 12))
-
-            # Estilo para las celdas de la tabla con wrap
-            cell_style = ParagraphStyle(name='cell_style', fontName='Helvetica', fontSize=10, leading=12, alignment=TA_LEFT)
-
-            # Datos de la tabla
-            data = [['Producto', 'Cantidad', 'Precio Unitario', 'Subtotal']]
-            for item in pedido.pedidoproducto_set.all():
-                subtotal = item.cantidad * item.precio_unitario
-                producto_parrafo = Paragraph(item.producto.nombre, cell_style)  # Wrap para nombres largos
-                data.append([producto_parrafo, str(item.cantidad), f"${item.precio_unitario:.2f}", f"${subtotal:.2f}"])
-            data.append(['', '', 'Total:', f"${pedido.total:.2f}"])
-
-            # Crear la tabla
-            table = Table(data, colWidths=[200, 60, 100, 100], repeatRows=1)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-                ('TEXTCOLOR',(0,0),(-1,0),colors.black),
-                ('ALIGN',(1,1),(-1,-1),'CENTER'),
-                ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
-                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0,0), (-1,0), 12),
-                ('BACKGROUND', (0,-1), (-1,-1), colors.lightgrey),
-                ('FONTNAME', (0,-1), (-1,-1), 'Helvetica-Bold'),
-            ]))
-            elements.append(table)
-
-            # Construir el PDF
-            doc.build(elements)
-            buffer.seek(0)
-
-            pdf_filename = f"pedido_{pedido.numero_pedido_formateado()}.pdf"
-            with open(f"static/media/pedidos/{pdf_filename}", "wb") as f:
-                f.write(buffer.getbuffer())
-
-            return JsonResponse({'status': 'ok', 'message': 'Pedido generado correctamente.', 'pdf_url': f"/static/media/pedidos/{pdf_filename}"})
-
+        except CarritoVacio:
+            return JsonResponse({'status': 'error', 'message': 'No hay productos en el carrito.'})
+        except StockInsuficiente as e:
+            return JsonResponse({'status': 'error', 'message': str(e)})
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': 'Ocurrió un error al generar el pedido.'})
 
@@ -309,6 +367,30 @@ def pago_aprobado(request):
     return render(request, "productos/pago_aprobado.html", {'carrito': carrito})
 
 
+@login_required
+def estado_factura(request, numero_pedido):
+    """Estado de la factura de un pedido propio; pago_aprobado.html la consulta hasta tener el PDF."""
+    pedido = get_object_or_404(Pedido, numero_pedido=numero_pedido, usuario=request.user)
+    tarea = pedido.tareas_factura.order_by('-id').first()
+    if tarea is None:
+        return JsonResponse({'estado': 'sin_factura', 'pdf_url': None})
+    return JsonResponse({'estado': tarea.estado, 'pdf_url': tarea.pdf_url or None})
+
+
+# ======================================================
+# Webhook de Mercado Pago
+# - Solo guarda la notificación (ver webhooks.py); el pedido lo
+#   crea el worker `procesar_pagos`
+# ======================================================
+@csrf_exempt
+@require_POST
+def webhook_mercadopago(request):
+    try:
+        webhooks.registrar(request)
+    except webhooks.NotificacionInvalida as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'ok'})
+
 
 # ======================================================
 # Vistas de autenticación
@@ -350,7 +432,6 @@ def logout_usuario(request):
 # ======================================================
 @login_required
 def historial_pedidos(request):
-    pedidos = Pedido.objects.filter(usuario=request.user).order_by('-fecha')
-    return render(request, 'productos/historial.html', {'pedidos': pedidos})
+    return _historial(request, 'productos/historial.html')
 
 
@@ -0,0 +1,100 @@
+# ======================================================
+# Vistas async de catálogo, detalle y checkout (servidor ASGI)
+# - Las registra urls.py cuando VISTAS_ASYNC=True (lo activa
+#   tienda/asgi.py); bajo WSGI siguen las de views.py
+# - Consultas con el ORM async (aget, async for, acreate...) y la
+#   preferencia de pago con httpx (pagos.acrear_preferencia): mientras
+#   un checkout espera a Mercado Pago, el worker atiende otros requests
+# - Lo que sigue siendo sync (búsqueda, facetas y caché del catálogo,
+#   carrito en caché, plantillas que leen request.user) corre con
+#   sync_to_async, en el hilo del request
+# Misma lógica y mismas plantillas que las vistas sync de views.py.
+# ======================================================
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
+from django.shortcuts import aget_object_or_404, render
+
+from . import cache_catalogo, carritos, facetas, pagos
+from .models import Carrito, Producto, ProductoSimilar
+from .paginacion import apaginar, tamano_pagina
+from .pedidos import registrar_intento
+from .views import (
+    _consulta_catalogo, _contexto_catalogo, _datos_preferencia, _error_de_pago, _filtros_catalogo, _lineas_y_total,
+    _referencia_pago,
+)
+
+# render() en un hilo: el context processor de auth y los tags de imágenes pueden consultar la base
+arender = sync_to_async(render)
+
+
+async def _usuario(request):
+    # request.user es perezoso y sync: se reemplaza por el usuario ya cargado
+    request.user = await request.auser()
+    return request.user
+
+
+# ======================================================
+# Catálogo y detalle
+# ======================================================
+async def lista_productos(request):
+    filtros = _filtros_catalogo(request)
+    # buscar_productos consulta la base la primera vez (¿existe el índice?)
+    para_facetas, productos, orden = await sync_to_async(_consulta_catalogo)(filtros)
+    grupos = await sync_to_async(facetas.grupos)(
+        para_facetas, filtros['query'], filtros['precio_min'], filtros['precio_max'],
+    )
+    pagina = await apaginar(
+        productos,
+        orden=orden,
+        cursor=request.GET.get('cursor'),
+        tamano=tamano_pagina(request.GET.get('por_pagina')),
+    )
+    categorias = await sync_to_async(cache_catalogo.categorias)()
+    tarjetas = await sync_to_async(cache_catalogo.tarjetas)(pagina.items)
+    return await arender(request, 'productos/lista.html', _contexto_catalogo(
+        request, filtros, orden, pagina, grupos, categorias, tarjetas,
+    ))
+
+
+async def detalle_producto(request, producto_id):
+    producto = await aget_object_or_404(Producto.objects.prefetch_related('imagenes'), id=producto_id)
+    productos_similares = [
+        fila.similar
+        async for fila in ProductoSimilar.objects.filter(producto=producto).select_related('similar').order_by('posicion')
+    ]
+    return await arender(request, 'productos/detalle_producto.html', {
+        'producto': producto,
+        'productos_similares': productos_similares,
+    })
+
+
+# ======================================================
+# Checkout
+# ======================================================
+@login_required
+async def checkout(request):
+    usuario = await _usuario(request)
+    await sync_to_async(carritos.de(usuario).volcar)()
+    carrito, _ = await Carrito.objects.aget_or_create(usuario=usuario)
+
+    if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        direccion = request.POST.get('direccion', '')
+        await request.session.aset('direccion_envio', direccion)
+
+        external_reference = _referencia_pago()
+        # Con esto el webhook puede armar el pedido aunque el usuario no vuelva al sitio;
+        # el pedido lleva estas mismas líneas aunque el carrito cambie después
+        _, lineas = await sync_to_async(registrar_intento)(usuario, carrito, external_reference, direccion)
+        items = pagos.items_de_lineas(lineas)
+        await request.session.aset('referencia_pago', external_reference)
+
+        try:
+            return HttpResponse(await pagos.acrear_preferencia(
+                _datos_preferencia(request, usuario, items, external_reference)
+            ))
+        except Exception as e:
+            return _error_de_pago(e)
+
+    lineas, total = await sync_to_async(_lineas_y_total)(carrito)
+    return await arender(request, 'productos/checkout.html', {'carrito': carrito, 'items': lineas, 'total': total})
@@ -0,0 +1,184 @@
+# ======================================================
+# Webhook de Mercado Pago
+# - registrar(): el endpoint solo inserta la notificación en la
+#   bandeja (NotificacionPago) y responde; nada de consultas extra
+# - procesar_lote(): el worker (`procesar_pagos`) toma notificaciones
+#   no procesadas (SKIP LOCKED en PostgreSQL, como cola_facturas) y
+#   las marca al terminar; no hay cursor por id, así una notificación
+#   con id menor que confirma tarde no se saltea. Deduplica por id de pago,
+#   confirma el estado con la API y crea el pedido (idempotente por
+#   external_reference, ver pedidos.py) con las líneas guardadas en el
+#   checkout; si el monto pagado no es el total de ese checkout no se
+#   crea y queda para revisión
+# - procesar_pagos(): también la usa `reprocesar_pagos` (replay)
+# ======================================================
+import hashlib
+import hmac
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import pagos
+from .cola_facturas import programar_factura
+from .models import IntentoPago, NotificacionPago, PagoProcesado
+from .pedidos import CarritoVacio, PedidoYaCreado, StockInsuficiente, crear_pedido_desde_carrito
+
+# Notificaciones tomadas hace más que esto sin terminar (worker caído) vuelven a la bandeja
+VENCIMIENTO = timedelta(minutes=5)
+
+APROBADO = 'approved'
+# Estados que todavía pueden cambiar: se espera la próxima notificación
+EN_CURSO = frozenset({'pending', 'in_process', 'authorized'})
+
+
+class NotificacionInvalida(Exception):
+    pass
+
+
+# ======================================================
+# Recepción
+# ======================================================
+def firma_valida(request, pago_id):
+    """
+    Valida el header x-signature ("ts=...,v1=...") con MP_WEBHOOK_SECRET.
+    Sin secreto configurado (desarrollo) no se valida.
+    """
+    secreto = getattr(settings, 'MP_WEBHOOK_SECRET', '')
+    if not secreto:
+        return True
+    partes = dict(
+        parte.strip().split('=', 1)
+        for parte in request.headers.get('x-signature', '').split(',') if '=' in parte
+    )
+    if 'ts' not in partes or 'v1' not in partes:
+        return False
+    manifiesto = f"id:{pago_id};request-id:{request.headers.get('x-request-id', '')};ts:{partes['ts']};"
+    esperado = hmac.new(secreto.encode(), manifiesto.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(esperado, partes['v1'])
+
+
+def registrar(request):
+    """Guarda la notificación tal como llegó (un INSERT). Lanza NotificacionInvalida."""
+    cuerpo = request.body.decode('utf-8', errors='replace')
+    try:
+        datos = json.loads(cuerpo) if cuerpo else {}
+    except ValueError:
+        raise NotificacionInvalida("JSON inválido")
+    if not isinstance(datos, dict):
+        raise NotificacionInvalida("Se esperaba un objeto JSON")
+
+    # Mercado Pago manda el tipo y el id en la URL y/o en el cuerpo
+    tipo = request.GET.get('type') or request.GET.get('topic') or datos.get('type') or datos.get('topic') or ''
+    pago_id = request.GET.get('data.id') or request.GET.get('id') or (datos.get('data') or {}).get('id') or ''
+    pago_id = str(pago_id)
+    if not firma_valida(request, pago_id):
+        raise NotificacionInvalida("Firma inválida")
+    return NotificacionPago.objects.create(tipo=str(tipo)[:30], pago_id=pago_id[:64], cuerpo=cuerpo)
+
+
+# ======================================================
+# Procesamiento
+# ======================================================
+def resolver_pago(pago_id):
+    """
+    Consulta el pago y, si está aprobado, crea su pedido. Devuelve el
+    resultado ('pedido', 'duplicado', 'rechazado', 'en_curso', 'sin_intento',
+    'sin_pedido', 'monto_distinto'). Los errores de la pasarela se propagan.
+    """
+    pago = pagos.consultar_pago(pago_id)
+    if pago['estado'] in EN_CURSO:
+        return 'en_curso'
+
+    pedido, detalle = None, ''
+    if pago['estado'] != APROBADO:
+        resultado = 'rechazado'
+    else:
+        intento = IntentoPago.objects.select_related('usuario').filter(referencia=pago['referencia']).first()
+        if intento is None:
+            # No es un checkout de este sitio (o se borró): no se marca, se puede reprocesar
+            return 'sin_intento'
+        if intento.total is not None and pago['monto'] != intento.total:
+            # Se cobró otra cosa que lo del checkout: queda registrado para revisión manual
+            resultado = 'monto_distinto'
+            detalle = f"Pagado {pago['monto']}, total del checkout {intento.total}"
+        else:
+            try:
+                pedido = crear_pedido_desde_carrito(intento.usuario, intento.direccion_envio, intento.referencia)
+                programar_factura(pedido)
+                resultado = 'pedido'
+            except PedidoYaCreado as e:
+                pedido, resultado = e.pedido, 'duplicado'
+            except (CarritoVacio, StockInsuficiente) as e:
+                # Pago aprobado sin pedido posible: queda registrado para revisión manual
+                resultado, detalle = 'sin_pedido', (str(e) or type(e).__name__)[:255]
+
+    PagoProcesado.objects.update_or_create(
+        pago_id=pago_id,
+        defaults={'referencia': pago['referencia'], 'estado': pago['estado'], 'pedido': pedido, 'detalle': detalle},
+    )
+    return resultado
+
+
+def procesar_pagos(pago_ids, forzar=False):
+    """
+    Resuelve cada pago una sola vez (aunque venga repetido). Sin `forzar`
+    saltea los que ya figuran en PagoProcesado. Devuelve {resultado: cantidad}.
+    PasarelaNoDisponible se propaga para reintentar más tarde.
+    """
+    pago_ids = list(dict.fromkeys(p for p in pago_ids if p))
+    if not forzar:
+        hechos = set(PagoProcesado.objects.filter(pago_id__in=pago_ids).values_list('pago_id', flat=True))
+        pago_ids = [p for p in pago_ids if p not in hechos]
+    resumen = {}
+    for pago_id in pago_ids:
+        try:
+            resultado = resolver_pago(pago_id)
+        except pagos.PasarelaNoDisponible:
+            raise
+        except pagos.ErrorPago:
+            # Pago desconocido o rechazado por la API: no frena la bandeja (se puede reprocesar)
+            resultado = 'error'
+        resumen[resultado] = resumen.get(resultado, 0) + 1
+    return resumen
+
+
+def tomar_notificaciones(cantidad):
+    """
+    Marca como tomadas hasta `cantidad` notificaciones sin procesar (las
+    tomadas por un worker que no terminó vuelven pasado VENCIMIENTO) y
+    devuelve [(id, tipo, pago_id)].
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        pendientes = NotificacionPago.objects.filter(
+            Q(tomada__isnull=True) | Q(tomada__lt=ahora - VENCIMIENTO), procesada=False,
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            pendientes = pendientes.select_for_update(skip_locked=True)
+        notificaciones = list(pendientes.values_list('id', 'tipo', 'pago_id')[:cantidad])
+        NotificacionPago.objects.filter(id__in=[n[0] for n in notificaciones]).update(tomada=ahora)
+    return notificaciones
+
+
+def procesar_lote(cantidad=200):
+    """
+    Procesa las próximas `cantidad` notificaciones de la bandeja y devuelve
+    (notificaciones leídas, resumen). Si la pasarela no responde se propaga
+    PasarelaNoDisponible y las notificaciones se liberan: el lote se repite
+    en la próxima vuelta (es idempotente).
+    """
+    notificaciones = tomar_notificaciones(cantidad)
+    if not notificaciones:
+        return 0, {}
+    ids = [id_ for id_, _, _ in notificaciones]
+    try:
+        resumen = procesar_pagos([pago_id for _, tipo, pago_id in notificaciones if tipo == 'payment'])
+    except pagos.PasarelaNoDisponible:
+        NotificacionPago.objects.filter(id__in=ids).update(tomada=None)
+        raise
+    NotificacionPago.objects.filter(id__in=ids).update(procesada=True)
+    return len(notificaciones), resumen
@@ -4,6 +4,19 @@ Archivo ASGI del proyecto.
 ASGI = Asynchronous Server Gateway Interface.
 Permite que Django trabaje con conexiones asíncronas
 (WebSockets, HTTP/2, chat en tiempo real, etc.)
+
+Bajo ASGI el catálogo, el detalle y el checkout usan las vistas async
+(productos/vistas_async.py): mientras un checkout espera a Mercado Pago,
+el worker sigue atendiendo otros requests.
+
+Servidor recomendado (uvicorn dentro de gunicorn, que maneja los workers):
+    gunicorn tienda.asgi:application -k uvicorn.workers.UvicornWorker -w 4 \
+        --bind 0.0.0.0:8000 --timeout 30 --graceful-timeout 20 \
+        --max-requests 2000 --max-requests-jitter 200
+Desarrollo / un solo proceso:
+    uvicorn tienda.asgi:application --port 8000
+Las conexiones a la base no se reutilizan entre requests (CONN_MAX_AGE
+en 0, el valor por defecto): bajo ASGI cada request usa su propio hilo.
 """
 
 import os
@@ -11,6 +24,8 @@ from django.core.asgi import get_asgi_application
 
 # Define qué archivo de configuración (settings.py) se usará
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tienda.settings')
+# Vistas async para catálogo, detalle y checkout (ver settings.VISTAS_ASYNC)
+os.environ.setdefault('VISTAS_ASYNC', 'True')
 
 # Crea la aplicación ASGI para que el servidor web se comunique con Django
 application = get_asgi_application()
@@ -39,8 +39,9 @@ INSTALLED_APPS = [
 # === MIDDLEWARE ===
 # Capas que procesan cada petición/respuesta
 MIDDLEWARE = [
+    'productos.instrumentacion.MedicionMiddleware',  # Server-Timing y log de requests lentos (va primero: mide todo)
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Permite servir archivos estáticos en producción
+    'productos.estaticos.EstaticosMiddleware',  # WhiteNoise: archivos estáticos en producción (sync y async)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',   # Protege contra ataques CSRF en formularios
@@ -52,13 +53,16 @@ MIDDLEWARE = [
 # === CONFIGURACIÓN DE URLs Y WSGI ===
 ROOT_URLCONF = 'tienda.urls'         # Archivo principal de rutas (urls.py)
 WSGI_APPLICATION = 'tienda.wsgi.application'  # Servidor WSGI (para producción con Gunicorn, etc.)
+# Catálogo, detalle y checkout async (productos/vistas_async.py). Lo activa
+# tienda/asgi.py: solo tiene sentido bajo un servidor ASGI (uvicorn)
+VISTAS_ASYNC = os.environ.get('VISTAS_ASYNC', 'False') == 'True'
 
 
 # === TEMPLATES ===
 # Define dónde están los archivos HTML y cómo se renderizan
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'productos.instrumentacion.PlantillasMedidas',  # DjangoTemplates que mide el tiempo de render
         'DIRS': [],      # Directorios extra de templates (aquí está vacío)
         'APP_DIRS': True, # Busca templates dentro de cada app
         'OPTIONS': {
@@ -78,6 +82,52 @@ DATABASES = {
     'default': dj_database_url.config(default=f'sqlite:///{BASE_DIR / "db.sqlite3"}')
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Las transacciones toman el lock de escritura al empezar: los checkouts
+    # concurrentes esperan su turno en vez de fallar con "database is locked"
+    DATABASES['default'].setdefault('OPTIONS', {}).update({'transaction_mode': 'IMMEDIATE', 'timeout': 20})
+    # Base de tests en archivo (no en memoria) para que los tests de concurrencia
+    # puedan abrir varias conexiones a la misma base
+    DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_db.sqlite3'}
+
+
+# === CACHÉ ===
+# locmem por defecto (por proceso); con varios workers conviene uno compartido, ej:
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'tienda'),
+    }
+}
+CATALOGO_CACHE = 'default'                                                 # Alias usado por cache_catalogo.py
+CATALOGO_CACHE_TIMEOUT = int(os.environ.get('CATALOGO_CACHE_TIMEOUT', 3600))  # Segundos
+
+
+# === CARRITO ===
+# 'db' = cada clic escribe en la base; 'cache' = el carrito vive en la caché y
+# se vuelca a la base en el checkout, al pasar CARRITO_VOLCADO_SEGUNDOS o con
+# `python manage.py volcar_carritos` (ver productos/carritos.py).
+# En modo 'cache' con varios procesos usar una caché compartida y persistente.
+CARRITO_MODO = os.environ.get('CARRITO_MODO', 'db')
+CARRITO_CACHE = 'default'
+CARRITO_CACHE_TIMEOUT = int(os.environ.get('CARRITO_CACHE_TIMEOUT', 7 * 24 * 3600))   # Segundos
+CARRITO_STOCK_TIMEOUT = int(os.environ.get('CARRITO_STOCK_TIMEOUT', 60))              # Foto del stock
+CARRITO_VOLCADO_SEGUNDOS = int(os.environ.get('CARRITO_VOLCADO_SEGUNDOS', 300))       # Máximo sin volcar
+
+
+# === SESIONES ===
+# 'db' = backend por defecto de Django: cada request autenticado lee django_session;
+# 'cache' = se leen de la caché (SESSION_CACHE_ALIAS) con la base de respaldo y no
+# se escriben si los datos no cambiaron (ver productos/sesiones.py).
+# Con caché local (locmem) y varios procesos, un logout en otro worker tarda hasta
+# SESIONES_CACHE_TIMEOUT segundos en verse: en producción, una caché compartida.
+SESIONES_MODO = os.environ.get('SESIONES_MODO', 'db')
+if SESIONES_MODO == 'cache':
+    SESSION_ENGINE = 'productos.sesiones'
+SESSION_CACHE_ALIAS = 'default'
+SESIONES_CACHE_TIMEOUT = int(os.environ.get('SESIONES_CACHE_TIMEOUT', 60))
+
 
 # === VALIDACIÓN DE CONTRASEÑAS ===
 # Reglas que se aplican al crear o cambiar contraseñas
@@ -105,6 +155,13 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # === ARCHIVOS MULTIMEDIA (subidos por usuarios, ej: imágenes de productos) ===
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Entrega (productos/archivos.py): segundos de caché de las imágenes originales
+# (las derivadas, direccionadas por contenido, son inmutables por un año)
+MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 3600))
+# '' = Django manda los bytes; 'nginx' = X-Accel-Redirect a MEDIA_OFFLOAD_PREFIJO
+# (locations internal, ver archivos.py); 'sendfile' = X-Sendfile (Apache)
+MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD', '')
+MEDIA_OFFLOAD_PREFIJO = os.environ.get('MEDIA_OFFLOAD_PREFIJO', '/protegido/')
 
 # Opciones extra de WhiteNoise para servir archivos en producción
 WHITENOISE_USE_FINDERS = True
@@ -125,3 +182,51 @@ AUTH_USER_MODEL = 'productos.Usuario'  # Usa un modelo de usuario personalizado
 # Tokens de prueba (sandbox). En producción deben ir en variables de entorno.
 MP_ACCESS_TOKEN = os.environ.get('MP_ACCESS_TOKEN', 'APP_USR-659340762835775-091415-d107d619602a205f2ceef439eb3bbfb4-2669198849')
 MP_PUBLIC_KEY = os.environ.get('MP_PUBLIC_KEY', 'APP_USR-f00f52bd-6145-4161-8a5f-21feda075d81')
+# Cliente compartido (productos/pagos.py): timeouts en segundos y disyuntor
+MP_API_URL = os.environ.get('MP_API_URL', 'https://api.mercadopago.com')
+MP_TIMEOUT_CONEXION = float(os.environ.get('MP_TIMEOUT_CONEXION', 3))
+MP_TIMEOUT_LECTURA = float(os.environ.get('MP_TIMEOUT_LECTURA', 10))
+MP_DISYUNTOR_FALLOS = int(os.environ.get('MP_DISYUNTOR_FALLOS', 5))    # Fallos seguidos que lo abren
+MP_DISYUNTOR_ESPERA = float(os.environ.get('MP_DISYUNTOR_ESPERA', 30))  # Segundos abierto antes de reintentar
+MP_WEBHOOK_SECRET = os.environ.get('MP_WEBHOOK_SECRET', '')  # Clave secreta del webhook (valida x-signature)
+
+
+# === CATÁLOGO ===
+# Productos por página en el listado (paginación por cursor) y máximo que puede pedirse con ?por_pagina=
+CATALOGO_TAMANO_PAGINA = int(os.environ.get('CATALOGO_TAMANO_PAGINA', 24))
+CATALOGO_TAMANO_PAGINA_MAX = 96
+# Conteos de facetas del listado (productos/facetas.py): segundos en caché.
+# Con catálogos grandes, `python manage.py calcular_facetas` los mantiene precalculados.
+FACETAS_CACHE_TIMEOUT = int(os.environ.get('FACETAS_CACHE_TIMEOUT', 300))
+
+
+# === PEDIDOS ===
+# Números de pedido que cada proceso reserva de una vez. 1 = estrictamente
+# correlativos entre workers; valores mayores ahorran una consulta por pedido
+# a cambio de huecos y de que el orden sea creciente solo dentro de cada worker.
+PEDIDOS_BLOQUE_NUMEROS = int(os.environ.get('PEDIDOS_BLOQUE_NUMEROS', 1))
+
+# Pedidos por página en los historiales (paginación por cursor)
+PEDIDOS_TAMANO_PAGINA = int(os.environ.get('PEDIDOS_TAMANO_PAGINA', 20))
+
+# Facturas PDF: True = se encolan y las genera `python manage.py procesar_facturas`;
+# False = se generan dentro del request (útil en desarrollo sin worker)
+FACTURAS_EN_SEGUNDO_PLANO = os.environ.get('FACTURAS_EN_SEGUNDO_PLANO', 'True') == 'True'
+
+
+# === INSTRUMENTACIÓN ===
+# Por request: consultas SQL, repetidas, plantillas, llamadas externas y PDFs
+# (productos/instrumentacion.py). Header Server-Timing y log de requests lentos.
+INSTRUMENTACION_SERVER_TIMING = os.environ.get('INSTRUMENTACION_SERVER_TIMING', 'True') == 'True'
+INSTRUMENTACION_UMBRAL_LENTO_MS = float(os.environ.get('INSTRUMENTACION_UMBRAL_LENTO_MS', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'productos.instrumentacion': {'handlers': ['consola'], 'level': 'WARNING', 'propagate': False},
+    },
+}
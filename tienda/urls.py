@@ -1,14 +1,16 @@
+import re
+
 # Importa las configuraciones definidas en settings.py
 from django.conf import settings
 
-# Importa una función que permite servir archivos estáticos (imágenes, PDFs, etc.)
-from django.conf.urls.static import static
-
 # Importa la interfaz de administración de Django
 from django.contrib import admin
 
 # Importa funciones para definir las rutas (URLs) del proyecto
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+# Entrega de imágenes y facturas (ETag, Range, caché, X-Accel-Redirect)
+from productos import archivos, facturas
 
 
 urlpatterns = [
@@ -16,5 +18,10 @@ urlpatterns = [
     path('', include('productos.urls')),       # Rutas principales de la app productos
 ]
 
-# Permite mostrar archivos multimedia (imágenes, PDFs, etc.)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Archivos multimedia (imágenes de productos) y facturas PDF, también en
+# producción (static() de Django solo servía con DEBUG). Ver productos/archivos.py
+urlpatterns += [
+    re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<ruta>.+)$', archivos.media, name='archivo_media'),
+    re_path(rf'^{re.escape(facturas.url_base().lstrip("/"))}(?P<ruta>[^/]+\.pdf)$', archivos.factura,
+            name='archivo_factura'),
+]